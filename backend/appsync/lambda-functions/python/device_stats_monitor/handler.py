@@ -19,144 +19,770 @@ under the License.
 
 """Lambda handler for device-stats-monitor."""
 import os
-import json
 import time
 import datetime
-from typing import Any, Dict, List, Optional
+import string
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
-import boto3
-import requests
+from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from shared_lib.powertools import logger, tracer, metrics
+from shared_lib.aws_clients import lazy_client, lazy_resource
+from shared_lib.pagination import iter_items, with_throttle_retry
+from shared_lib.fleet_counters import FLEET_COUNTERS_TABLE, reconcile_fleet_counters
+from shared_lib.stats_history import HISTORY_DISTRIBUTIONS, build_history_record
+from shared_lib.sketches import ExactCounts, SpaceSaving, top_k
+from shared_lib.stats_records import decode_distribution, encode_distribution, encode_stats_item, to_pointer_item
 
-# Initialize IoT client
-iot_client = boto3.client('iot')
-cloudwatch = boto3.client('cloudwatch')
-dynamodb = boto3.resource('dynamodb')
+# Count dynamic thing groups with a per-group get_statistics query; the
+# fleet index thingGroupNames field only lists static group memberships
+INCLUDE_DYNAMIC_GROUPS = os.environ.get("INCLUDE_DYNAMIC_GROUPS", "false").lower() == "true"
 
-def search_things(query_string: str) -> Dict[str, Any]:
+# "scan" counts client-side from a full fleet scan; "index" uses fleet index
+# aggregations and scans only for statistics the index can't compute
+STATS_AGGREGATION_BACKEND = os.environ.get("STATS_AGGREGATION_BACKEND", "scan")
+
+# Concurrent get_statistics/get_buckets_aggregation calls for the index backend
+AGGREGATION_WORKERS = 8
+
+# Largest terms aggregation the fleet index allows
+TERMS_MAX_BUCKETS = 10000
+
+# Single-valued attribute distributions and the indexed field behind each
+INDEX_ATTRIBUTE_FIELDS = {
+    "brandNameDistribution": "attributes.brandName",
+    "countryDistribution": "attributes.country",
+    "productTypeDistribution": "attributes.productType",
+    "deviceTypeDistribution": "attributes.deviceType"
+}
+
+# Everything an aggregation backend is expected to produce
+STATISTIC_NAMES = [
+    "registeredDevices",
+    "connectedDevices",
+    "brandNameDistribution",
+    "countryDistribution",
+    "productTypeDistribution",
+    "disconnectDistribution",
+    "groupDistribution",
+    "deviceTypeDistribution",
+    "versionDistribution"
+]
+
+# "exact" counts every group and firmware version; "topk" keeps the
+# DISTRIBUTION_TOP_K largest and folds the rest into an "Other" bucket, so
+# the stats record stays small at any cardinality
+DISTRIBUTION_MODE = os.environ.get("DISTRIBUTION_MODE", "exact")
+DISTRIBUTION_TOP_K = int(os.environ.get("DISTRIBUTION_TOP_K", "100"))
+
+# Keys tracked by the Space-Saving sketches while counting in topk mode;
+# larger than K so the reported top K are accurate
+TOPK_SKETCH_CAPACITY = DISTRIBUTION_TOP_K * 10
+
+# Things per search_index page, the most the fleet index returns
+SEARCH_PAGE_SIZE = 250
+
+# Disjoint thingName prefix shards the fleet scan is split into; 1 scans
+# sequentially with a single query. Only a sequential scan is checkpointed,
+# so fleets too large to scan in one invocation need SCAN_SHARDS=1
+SCAN_SHARDS = int(os.environ.get("SCAN_SHARDS", "1"))
+
+# Shards scanned at the same time
+SCAN_MAX_WORKERS = int(os.environ.get("SCAN_MAX_WORKERS", "8"))
+
+# Stats table key of the sequential scan's checkpoint item; it has no
+# status attribute, so it never shows up in the latest record index
+SCAN_CHECKPOINT_KEY = "SCAN_CHECKPOINT"
+
+# Remaining invocation time at which a sequential scan saves its progress
+# and stops, leaving the rest of the pass to the next scheduled run
+SCAN_CHECKPOINT_MARGIN_MS = int(os.environ.get("SCAN_CHECKPOINT_MARGIN_MS", "30000"))
+
+# Age after which an unfinished pass is abandoned and a new one started,
+# well within the lifetime of search_index pagination tokens
+SCAN_PASS_MAX_AGE_SECONDS = int(os.environ.get("SCAN_PASS_MAX_AGE_SECONDS", "3600"))
+
+# "emf" writes fleet metrics as Embedded Metric Format log lines; "api"
+# sends them with put_metric_data
+METRICS_PUBLISHING = os.environ.get("METRICS_PUBLISHING", "emf")
+
+# CloudWatch namespace the dashboard reads fleet metrics from
+FLEET_METRICS_NAMESPACE = "IoTFleetMetrics"
+
+# Per-dimension breakdowns: dimension name to the distribution and metric behind it
+METRIC_BREAKDOWNS = {
+    "BrandName": ("brandNameDistribution", "iotconnectivitydashboard-device-count"),
+    "Country": ("countryDistribution", "iotconnectivitydashboard-device-count"),
+    "ProductType": ("productTypeDistribution", "iotconnectivitydashboard-device-count"),
+    "DeviceType": ("deviceTypeDistribution", "iotconnectivitydashboard-device-count"),
+    "ThingGroup": ("groupDistribution", "iotconnectivitydashboard-device-count"),
+    "FirmwareVersion": ("versionDistribution", "iotconnectivitydashboard-device-count"),
+    "DisconnectReason": ("disconnectDistribution", "iotconnectivitydashboard-disconnected-device-count")
+}
+
+# Comma-separated METRIC_BREAKDOWNS dimensions to publish; every value is a
+# separate custom metric, so only enable the ones alarms or charts need
+METRIC_DIMENSIONS = [
+    dimension.strip()
+    for dimension in os.environ.get("METRIC_DIMENSIONS", "").split(",")
+    if dimension.strip() in METRIC_BREAKDOWNS
+]
+
+# Largest number of values published per breakdown dimension
+METRIC_DIMENSION_MAX_VALUES = int(os.environ.get("METRIC_DIMENSION_MAX_VALUES", "50"))
+
+# Most datums put_metric_data accepts in one request
+PUT_METRIC_DATA_BATCH_SIZE = 1000
+
+# History table for stats snapshots, unset to keep only the latest records
+STATS_HISTORY_TABLE = os.environ.get("STATS_HISTORY_TABLE")
+
+# Days history records are kept
+HISTORY_RETENTION_DAYS = int(os.environ.get("HISTORY_RETENTION_DAYS", "90"))
+
+# Last history record written by this container, the base of the next delta
+_last_history_record: Optional[Dict[str, Any]] = None
+
+# Minimum time between fleet counter reconciliations; events keep the
+# counters current in between, so a slower cadence only delays drift fixes
+COUNTER_RECONCILE_INTERVAL_SECONDS = int(os.environ.get("COUNTER_RECONCILE_INTERVAL_SECONDS", "900"))
+
+# When this container last reconciled the fleet counters
+_last_reconciled_at: Optional[float] = None
+
+# AWS clients, created on first use
+iot_client = lazy_client('iot')
+cloudwatch = lazy_client('cloudwatch')
+dynamodb = lazy_resource('dynamodb')
+
+def search_things(query_string: str) -> Iterator[Dict[str, Any]]:
     """
-    Search for things in IoT Core.
+    Stream things matching a query from IoT Core.
+    
+    Pages are fetched as the caller iterates, so only one page of documents
+    is held in memory at a time.
     
     Args:
         query_string: Query string to search for
         
     Returns:
-        Search results
+        Iterator over the matching fleet index documents
     """
     logger.debug("Searching for things", extra={"query": query_string})
     
+    found = 0
     try:
-        # Initialize variables for pagination
-        things = []
-        next_token = None
-        
-        # Paginate through results
-        while True:
-            # Prepare search parameters
-            params = {
-                "indexName": "AWS_Things",
-                "queryString": query_string,
-                "maxResults": 250
-            }
-            
-            if next_token:
-                params["nextToken"] = next_token
-            
-            # Execute search
-            response = iot_client.search_index(**params)
-            
-            # Add things to list
-            things.extend(response.get("things", []))
+        for thing in iter_items(
+            iot_client.search_index,
+            "things",
+            indexName="AWS_Things",
+            queryString=query_string,
+            maxResults=SEARCH_PAGE_SIZE
+        ):
+            found += 1
+            yield thing
+    
+    except Exception as e:
+        logger.error(f"Error searching for things: {str(e)}")
+        raise
+    
+    logger.debug(f"Found {found} things")
+
+def get_dynamic_group_counts() -> Dict[str, int]:
+    """
+    Get the member count of every dynamic thing group.
+    
+    Dynamic group membership is defined by a fleet index query, so each
+    group costs one describe_thing_group and one get_statistics call.
+    
+    Returns:
+        Dictionary of dynamic group name to member count
+    """
+    counts = {}
+    
+    for group in iter_items(iot_client.list_thing_groups, "thingGroups", maxResults=250):
+        group_name = group.get("groupName")
+        try:
+            description = iot_client.describe_thing_group(thingGroupName=group_name)
+            query_string = description.get("queryString")
+            if not query_string:
+                # Static group, already counted from thingGroupNames
+                continue
             
-            # Check if there are more results
-            next_token = response.get("nextToken")
-            if not next_token:
-                break
+            statistics = iot_client.get_statistics(
+                indexName=description.get("indexName", "AWS_Things"),
+                queryString=query_string,
+                aggregationField="thingId"
+            )
+            counts[group_name] = statistics.get("statistics", {}).get("count", 0)
+        except Exception as e:
+            logger.warning(f"Error getting size of thing group {group_name}: {str(e)}")
+    
+    logger.debug("Got dynamic group counts", extra={"groups": len(counts)})
+    return counts
+
+def count_fleet(things: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Count fleet statistics over a stream of fleet index documents.
+    
+    Args:
+        things: Fleet index documents, consumed once
+        
+    Returns:
+        Statistics for every name in STATISTIC_NAMES
+    """
+    registered_devices = 0
+    connected_devices = 0
+    
+    # Initialize distribution dictionaries
+    brand_name_distribution = {}
+    country_distribution = {}
+    product_type_distribution = {}
+    disconnect_distribution = {}
+    device_type_distribution = {}
+    
+    # Distributions whose cardinality can grow with the fleet
+    group_counts = new_distribution_counter()
+    firmware_counts = new_distribution_counter()
+    
+    # Count things as pages stream in; connectivity comes with every
+    # document, so one scan covers all counts
+    for thing in things:
+        registered_devices += 1
+        connectivity = thing.get("connectivity", {})
+        
+        # Same match as the index query connectivity.connected:true
+        if connectivity.get("connected", False) is True:
+            connected_devices += 1
+        
+        # Disconnect reason distribution
+        if connectivity.get("connected", False) is False:
+            disconnect_reason = connectivity.get("disconnectReason", "Unknown")
+            disconnect_distribution[disconnect_reason] = disconnect_distribution.get(disconnect_reason, 0) + 1
+        
+        # Extract attributes
+        attributes = thing.get("attributes", {})
+        
+        # Brand name distribution
+        brand_name = attributes.get("brandName", "Unknown")
+        brand_name_distribution[brand_name] = brand_name_distribution.get(brand_name, 0) + 1
+        
+        # Country distribution
+        country = attributes.get("country", "Unknown")
+        country_distribution[country] = country_distribution.get(country, 0) + 1
+        
+        # Product type distribution
+        product_type = attributes.get("productType", "Unknown")
+        product_type_distribution[product_type] = product_type_distribution.get(product_type, 0) + 1
+        
+        # Device type distribution
+        device_type = attributes.get("deviceType", "Unknown")
+        device_type_distribution[device_type] = device_type_distribution.get(device_type, 0) + 1
+        
+        # Firmware version distribution
+        firmware_version = attributes.get("firmwareVersion", "Unknown")
+        if firmware_version != "Unknown":
+            firmware_counts.add(firmware_version)
+        
+        # Group distribution from the indexed group memberships
+        for group_name in thing.get("thingGroupNames") or []:
+            group_counts.add(group_name)
+    
+    return {
+        "registeredDevices": registered_devices,
+        "connectedDevices": connected_devices,
+        "brandNameDistribution": brand_name_distribution,
+        "countryDistribution": country_distribution,
+        "productTypeDistribution": product_type_distribution,
+        "disconnectDistribution": disconnect_distribution,
+        "groupDistribution": group_counts.counts,
+        "deviceTypeDistribution": device_type_distribution,
+        "versionDistribution": {"Firmware": firmware_counts.counts}
+    }
+
+def new_distribution_counter() -> Any:
+    """Counter for a high-cardinality distribution in the configured DISTRIBUTION_MODE."""
+    if DISTRIBUTION_MODE == "topk":
+        return SpaceSaving(TOPK_SKETCH_CAPACITY)
+    return ExactCounts()
+
+def bound_distributions(statistics: Dict[str, Any], k: int) -> Dict[str, Any]:
+    """
+    Fold all but the k largest group and firmware buckets into the "Other" bucket.
+    
+    Does nothing in exact mode.
+    
+    Args:
+        statistics: Statistics to bound, updated in place
+        k: Largest number of buckets kept per distribution
+        
+    Returns:
+        The updated statistics
+    """
+    if DISTRIBUTION_MODE == "topk":
+        statistics["groupDistribution"] = top_k(statistics["groupDistribution"], k)
+        firmware = statistics["versionDistribution"]
+        firmware["Firmware"] = top_k(firmware.get("Firmware", {}), k)
+    return statistics
+
+def merge_fleet_counts(total: Dict[str, Any], part: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Add one set of counts into another, recursing into distributions.
+    
+    Args:
+        total: Counts to add into, updated in place
+        part: Counts to add
+        
+    Returns:
+        The updated total
+    """
+    for key, value in part.items():
+        if isinstance(value, dict):
+            merge_fleet_counts(total.setdefault(key, {}), value)
+        else:
+            total[key] = total.get(key, 0) + value
+    return total
+
+def shard_queries(shard_count: int) -> List[str]:
+    """
+    Split the fleet into disjoint search_index queries by thingName prefix.
+    
+    Leading digits and letters are dealt round-robin to all shards but the
+    last, with both cases of a letter kept in the same shard. The last shard
+    is the complement of the others, so the shards cover every thing name
+    exactly once whatever characters it starts with.
+    
+    Args:
+        shard_count: Number of shards, capped at one per prefix group plus one
         
-        logger.debug(f"Found {len(things)} things")
-        return {"things": things}
+    Returns:
+        One query string per shard
+    """
+    prefix_groups = [[digit] for digit in string.digits]
+    prefix_groups += [[letter, letter.upper()] for letter in string.ascii_lowercase]
+    shard_count = max(1, min(shard_count, len(prefix_groups) + 1))
+    if shard_count == 1:
+        return ["*"]
+    
+    prefix_shards: List[List[str]] = [[] for _ in range(shard_count - 1)]
+    for i, group in enumerate(prefix_groups):
+        prefix_shards[i % len(prefix_shards)].extend(group)
+    
+    queries = [" OR ".join(f"thingName:{prefix}*" for prefix in shard) for shard in prefix_shards]
+    all_prefixes = " OR ".join(f"thingName:{prefix}*" for shard in prefix_shards for prefix in shard)
+    return queries + [f"NOT ({all_prefixes})"]
+
+def scan_shard(query_string: str) -> Dict[str, Any]:
+    """
+    Count one shard of the fleet, backing off while search_index is throttled.
+    
+    Args:
+        query_string: Shard query
+        
+    Returns:
+        Statistics for the shard's things
+    """
+    search_index = with_throttle_retry(iot_client.search_index)
+    return count_fleet(iter_items(
+        search_index,
+        "things",
+        indexName="AWS_Things",
+        queryString=query_string,
+        maxResults=SEARCH_PAGE_SIZE
+    ))
+
+def scan_fleet_statistics(context: Optional[LambdaContext] = None) -> Optional[Dict[str, Any]]:
+    """
+    Compute counts and distributions client-side from a full fleet scan.
+    
+    Given the Lambda context, a sequential scan is checkpointed and may span
+    several invocations; see resumable_scan. With SCAN_SHARDS above one the
+    fleet is scanned as disjoint thingName prefix shards in parallel, and the
+    merged registered count is checked against get_statistics. If they
+    disagree, the shards did not partition the fleet and a single sequential
+    scan is used instead. Sharded scans are not checkpointed and must finish
+    within one invocation.
+    
+    Args:
+        context: Lambda context of the invocation running the scan
+        
+    Returns:
+        Statistics for every name in STATISTIC_NAMES, or None if the scan
+        was checkpointed before the pass completed
+    """
+    queries = shard_queries(SCAN_SHARDS)
+    if len(queries) == 1:
+        if context is not None:
+            return resumable_scan(context)
+        return count_fleet(search_things("*"))
+    
+    if context is not None:
+        logger.warning("Sharded fleet scans are not checkpointed; set SCAN_SHARDS=1 for resumable scans", extra={
+            "shards": len(queries)
+        })
+    
+    logger.debug("Scanning fleet in shards", extra={"shards": len(queries)})
+    with ThreadPoolExecutor(max_workers=min(SCAN_MAX_WORKERS, len(queries))) as executor:
+        expected = executor.submit(count_things, "*")
+        shards = [executor.submit(scan_shard, query) for query in queries]
+        
+        statistics = {}
+        for shard in shards:
+            bound_distributions(merge_fleet_counts(statistics, shard.result()), TOPK_SKETCH_CAPACITY)
+        
+        try:
+            expected_count = expected.result()
+        except Exception as e:
+            logger.warning(f"Could not verify sharded scan total: {str(e)}")
+            return statistics
+    
+    if statistics["registeredDevices"] != expected_count:
+        logger.warning("Sharded scan total does not match fleet count, rescanning sequentially", extra={
+            "shardTotal": statistics["registeredDevices"],
+            "fleetCount": expected_count
+        })
+        metrics.add_metric(name="ShardedScanCountMismatch", unit=MetricUnit.Count, value=1)
+        return count_fleet(search_things("*"))
+    
+    return statistics
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+def _is_conditional_check_failure(error: Exception) -> bool:
+    response = getattr(error, "response", None) or {}
+    return response.get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+def claim_scan_pass(table: Any, owner: str, lease_expires: int) -> Optional[Dict[str, Any]]:
+    """
+    Take over the unfinished scan pass, or start the next one.
+    
+    The checkpoint item carries the pass's generation number and a lease
+    held by the invocation working on it. Claims are conditional on both,
+    so only one invocation at a time can advance a pass, and a new pass
+    only starts once the previous generation completed or was abandoned.
+    
+    Args:
+        table: Device stats table
+        owner: Request ID of this invocation
+        lease_expires: Time in epoch milliseconds the lease runs out
+        
+    Returns:
+        Checkpoint with "generation", "nextToken" and partial "counts",
+        or None if another invocation holds the pass
+    """
+    from boto3.dynamodb.conditions import Attr
+    
+    now = _now_ms()
+    item = table.get_item(Key={"recordTime": SCAN_CHECKPOINT_KEY}, ConsistentRead=True).get("Item")
+    
+    try:
+        if (
+            item
+            and item.get("scanStatus") == "RUNNING"
+            and now - int(item["startedAt"]) < SCAN_PASS_MAX_AGE_SECONDS * 1000
+        ):
+            table.update_item(
+                Key={"recordTime": SCAN_CHECKPOINT_KEY},
+                UpdateExpression="SET leaseOwner = :owner, leaseExpires = :lease",
+                ConditionExpression=Attr("generation").eq(item["generation"]) & Attr("leaseExpires").lt(now),
+                ExpressionAttributeValues={":owner": owner, ":lease": lease_expires}
+            )
+            logger.info("Resuming fleet scan", extra={"generation": int(item["generation"])})
+            return {
+                "generation": int(item["generation"]),
+                "nextToken": item.get("nextToken"),
+                "counts": decode_distribution(item["counts"])
+            }
+        
+        generation = int(item["generation"]) + 1 if item else 1
+        if item:
+            condition = Attr("generation").eq(item["generation"]) & Attr("leaseExpires").lt(now)
+        else:
+            condition = Attr("recordTime").not_exists()
+        counts = count_fleet([])
+        table.put_item(
+            Item={
+                "recordTime": SCAN_CHECKPOINT_KEY,
+                "generation": generation,
+                "scanStatus": "RUNNING",
+                "startedAt": now,
+                "leaseOwner": owner,
+                "leaseExpires": lease_expires,
+                "counts": encode_distribution(counts),
+                "ttl": int(time.time()) + (86400 * 30)  # 30 days TTL
+            },
+            ConditionExpression=condition
+        )
+        logger.info("Starting fleet scan", extra={"generation": generation})
+        return {"generation": generation, "nextToken": None, "counts": counts}
     
     except Exception as e:
-        logger.error(f"Error searching for things: {str(e)}")
+        if _is_conditional_check_failure(e):
+            logger.info("Fleet scan is held by another invocation")
+            return None
         raise
 
-def get_device_stats() -> Dict[str, Any]:
+def release_scan_pass(
+    table: Any,
+    generation: int,
+    owner: str,
+    next_token: Optional[str] = None,
+    counts: Optional[Dict[str, Any]] = None
+) -> bool:
+    """
+    Save a scan pass's progress and give up its lease.
+    
+    Args:
+        table: Device stats table
+        generation: Generation of the pass
+        owner: Request ID of this invocation
+        next_token: Token to resume from, or None when the pass is complete
+        counts: Partial counts, when the pass is not complete
+        
+    Returns:
+        True if saved, False if this invocation no longer held the pass
+    """
+    from boto3.dynamodb.conditions import Attr
+    
+    if next_token:
+        update = "SET nextToken = :token, #counts = :counts, leaseExpires = :released, updatedAt = :now"
+        values = {":token": next_token, ":counts": encode_distribution(counts)}
+    else:
+        update = "SET scanStatus = :complete, leaseExpires = :released, updatedAt = :now REMOVE nextToken, #counts"
+        values = {":complete": "COMPLETE"}
+    
+    try:
+        table.update_item(
+            Key={"recordTime": SCAN_CHECKPOINT_KEY},
+            UpdateExpression=update,
+            ConditionExpression=Attr("generation").eq(generation) & Attr("leaseOwner").eq(owner),
+            ExpressionAttributeNames={"#counts": "counts"},
+            ExpressionAttributeValues={**values, ":released": 0, ":now": _now_ms()}
+        )
+        return True
+    except Exception as e:
+        if _is_conditional_check_failure(e):
+            logger.warning("Lost fleet scan to another invocation", extra={"generation": generation})
+            return False
+        raise
+
+def resumable_scan(context: LambdaContext) -> Optional[Dict[str, Any]]:
+    """
+    Run a sequential fleet scan that can span several invocations.
+    
+    Pages are counted from where the current pass left off. When the
+    invocation nears its timeout, the nextToken and partial counts are
+    saved to the stats table and the rest is left to the next scheduled
+    run. Only the invocation that finishes the pass returns statistics.
+    
+    Args:
+        context: Lambda context of this invocation
+        
+    Returns:
+        Statistics for every name in STATISTIC_NAMES, or None if the pass
+        was checkpointed or is held by another invocation
+    """
+    table_name = os.environ.get("DEVICE_STATS_TABLE")
+    if not table_name:
+        raise ValueError("DEVICE_STATS_TABLE environment variable is not set")
+    table = dynamodb.Table(table_name)
+    
+    owner = context.aws_request_id
+    checkpoint = claim_scan_pass(table, owner, _now_ms() + context.get_remaining_time_in_millis())
+    if checkpoint is None:
+        return None
+    
+    generation = checkpoint["generation"]
+    counts = checkpoint["counts"]
+    params = {
+        "indexName": "AWS_Things",
+        "queryString": "*",
+        "maxResults": SEARCH_PAGE_SIZE
+    }
+    next_token = checkpoint["nextToken"]
+    search_index = with_throttle_retry(iot_client.search_index)
+    
+    while True:
+        if next_token:
+            params["nextToken"] = next_token
+        response = search_index(**params)
+        bound_distributions(merge_fleet_counts(counts, count_fleet(response.get("things", []))), TOPK_SKETCH_CAPACITY)
+        
+        next_token = response.get("nextToken")
+        if not next_token:
+            break
+        
+        if context.get_remaining_time_in_millis() < SCAN_CHECKPOINT_MARGIN_MS:
+            release_scan_pass(table, generation, owner, next_token, counts)
+            logger.info("Checkpointed fleet scan", extra={
+                "generation": generation,
+                "scanned": counts["registeredDevices"]
+            })
+            metrics.add_metric(name="FleetScanCheckpointed", unit=MetricUnit.Count, value=1)
+            return None
+    
+    if not release_scan_pass(table, generation, owner):
+        return None
+    
+    logger.info("Completed fleet scan", extra={"generation": generation})
+    return counts
+
+def count_things(query_string: str) -> int:
+    """
+    Count things matching a query with the fleet index.
+    
+    Args:
+        query_string: Query string to count
+        
+    Returns:
+        Number of matching things
+    """
+    response = iot_client.get_statistics(
+        indexName="AWS_Things",
+        queryString=query_string,
+        aggregationField="thingId"
+    )
+    count = response.get("statistics", {}).get("count")
+    if count is None:
+        raise ValueError(f"No count returned for query {query_string}")
+    return count
+
+def get_terms_buckets(field: str, query_string: str = "*") -> Dict[str, int]:
+    """
+    Count things per value of an indexed field with a terms aggregation.
+    
+    Args:
+        field: Indexed field to aggregate on (e.g. "attributes.country")
+        query_string: Query selecting the things to aggregate
+        
+    Returns:
+        Dictionary of field value to thing count
+    """
+    response = iot_client.get_buckets_aggregation(
+        indexName="AWS_Things",
+        queryString=query_string,
+        aggregationField=field,
+        bucketsAggregationType={"termsAggregation": {"maxBuckets": TERMS_MAX_BUCKETS}}
+    )
+    return {bucket["keyValue"]: bucket["count"] for bucket in response.get("buckets", [])}
+
+def aggregate_fleet_statistics_in_index(context: Optional[LambdaContext] = None) -> Dict[str, Any]:
+    """
+    Compute counts and distributions server-side with fleet index aggregations.
+    
+    Every count and distribution is one get_statistics or
+    get_buckets_aggregation call, issued concurrently, so the cost does not
+    depend on fleet size. Things without a value for a single-valued field
+    are counted as "Unknown", matching the scan backend. Statistics whose
+    call fails (typically a field that is not an indexed custom field) are
+    left out so the caller can fall back to a scan for them.
+    
+    Args:
+        context: Lambda context, unused; aggregations finish in one invocation
+        
+    Returns:
+        The statistics that could be computed in the index
+    """
+    tasks = {
+        "registeredDevices": (count_things, ("*",)),
+        "connectedDevices": (count_things, ("connectivity.connected:true",)),
+        "disconnectReasons": (get_terms_buckets, ("connectivity.disconnectReason", "NOT connectivity.connected:true")),
+        "versionDistribution": (get_terms_buckets, ("attributes.firmwareVersion",)),
+        "groupDistribution": (get_terms_buckets, ("thingGroupNames",)),
+        **{name: (get_terms_buckets, (field,)) for name, field in INDEX_ATTRIBUTE_FIELDS.items()}
+    }
+    
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(AGGREGATION_WORKERS, len(tasks))) as executor:
+        futures = {name: executor.submit(func, *args) for name, (func, args) in tasks.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.warning(f"Index aggregation for {name} failed, falling back to scan: {str(e)}")
+    
+    stats = {
+        name: results[name] for name in ("registeredDevices", "connectedDevices", "groupDistribution")
+        if name in results
+    }
+    if "versionDistribution" in results:
+        stats["versionDistribution"] = {"Firmware": results["versionDistribution"]}
+    
+    # "Unknown" needs the device totals, so these depend on both counts
+    if "registeredDevices" not in results or "connectedDevices" not in results:
+        return stats
+    
+    registered_devices = results["registeredDevices"]
+    disconnected_devices = registered_devices - results["connectedDevices"]
+    
+    if "disconnectReasons" in results:
+        stats["disconnectDistribution"] = _with_unknown(results["disconnectReasons"], disconnected_devices)
+    for name in INDEX_ATTRIBUTE_FIELDS:
+        if name in results:
+            stats[name] = _with_unknown(results[name], registered_devices)
+    
+    return stats
+
+def _with_unknown(buckets: Dict[str, int], total: int) -> Dict[str, int]:
+    """Add an "Unknown" bucket for things the aggregation had no value for."""
+    missing = total - sum(buckets.values())
+    if missing > 0:
+        buckets["Unknown"] = buckets.get("Unknown", 0) + missing
+    return buckets
+
+# Aggregation backends by STATS_AGGREGATION_BACKEND value
+AGGREGATION_BACKENDS = {
+    "scan": scan_fleet_statistics,
+    "index": aggregate_fleet_statistics_in_index
+}
+
+def get_device_stats(context: Optional[LambdaContext] = None) -> Optional[Dict[str, Any]]:
     """
     Get device statistics from IoT Core.
     
+    Args:
+        context: Lambda context, lets a long fleet scan span invocations
+        
     Returns:
-        Device statistics
+        Device statistics, or None if the fleet scan has not completed yet
     """
-    logger.debug("Getting device statistics")
+    logger.debug("Getting device statistics", extra={"backend": STATS_AGGREGATION_BACKEND})
     
     try:
-        # Get all things
-        all_things_result = search_things("*")
-        all_things = all_things_result.get("things", [])
+        statistics = AGGREGATION_BACKENDS[STATS_AGGREGATION_BACKEND](context)
+        if statistics is None:
+            return None
+        
+        # Anything the backend could not compute comes from a client-side scan
+        missing = [name for name in STATISTIC_NAMES if name not in statistics]
+        if missing:
+            logger.info("Computing statistics with a fleet scan", extra={"statistics": missing})
+            scanned = scan_fleet_statistics(context)
+            if scanned is None:
+                return None
+            statistics.update({name: scanned[name] for name in missing})
+        
+        # Dynamic group sizes, one query per group rather than per device
+        if INCLUDE_DYNAMIC_GROUPS:
+            statistics["groupDistribution"].update(get_dynamic_group_counts())
         
-        # Get connected things
-        connected_things_result = search_things("connectivity.connected:true")
-        connected_things = connected_things_result.get("things", [])
+        # Keep the record size bounded however many groups and versions exist
+        bound_distributions(statistics, DISTRIBUTION_TOP_K)
+        group_distribution = statistics["groupDistribution"]
         
-        # Calculate counts
-        registered_devices = len(all_things)
-        connected_devices = len(connected_things)
+        registered_devices = statistics["registeredDevices"]
+        connected_devices = statistics["connectedDevices"]
         disconnected_devices = registered_devices - connected_devices
         
-        # Initialize distribution dictionaries
-        brand_name_distribution = {}
-        country_distribution = {}
-        product_type_distribution = {}
-        disconnect_distribution = {}
-        group_distribution = {}
-        device_type_distribution = {}
-        version_distribution = {"Firmware": {}}
-        
-        # Process all things
-        for thing in all_things:
-            # Extract attributes
-            attributes = thing.get("attributes", {})
-            
-            # Brand name distribution
-            brand_name = attributes.get("brandName", "Unknown")
-            brand_name_distribution[brand_name] = brand_name_distribution.get(brand_name, 0) + 1
-            
-            # Country distribution
-            country = attributes.get("country", "Unknown")
-            country_distribution[country] = country_distribution.get(country, 0) + 1
-            
-            # Product type distribution
-            product_type = attributes.get("productType", "Unknown")
-            product_type_distribution[product_type] = product_type_distribution.get(product_type, 0) + 1
-            
-            # Device type distribution
-            device_type = attributes.get("deviceType", "Unknown")
-            device_type_distribution[device_type] = device_type_distribution.get(device_type, 0) + 1
-            
-            # Firmware version distribution
-            firmware_version = attributes.get("firmwareVersion", "Unknown")
-            if firmware_version != "Unknown":
-                version_distribution["Firmware"][firmware_version] = version_distribution["Firmware"].get(firmware_version, 0) + 1
-            
-            # Group distribution
-            thing_name = thing.get("thingName", "")
-            if thing_name:
-                try:
-                    # Get thing groups for this thing
-                    groups_response = iot_client.list_thing_groups_for_thing(thingName=thing_name)
-                    for group in groups_response.get("thingGroups", []):
-                        group_name = group.get("groupName", "Unknown")
-                        group_distribution[group_name] = group_distribution.get(group_name, 0) + 1
-                except Exception as e:
-                    logger.warning(f"Error getting groups for thing {thing_name}: {str(e)}")
-        
-        # Process disconnected things for disconnect reason
-        for thing in all_things:
-            if thing.get("connectivity", {}).get("connected", False) is False:
-                disconnect_reason = thing.get("connectivity", {}).get("disconnectReason", "Unknown")
-                disconnect_distribution[disconnect_reason] = disconnect_distribution.get(disconnect_reason, 0) + 1
+        brand_name_distribution = statistics["brandNameDistribution"]
+        country_distribution = statistics["countryDistribution"]
+        product_type_distribution = statistics["productTypeDistribution"]
+        disconnect_distribution = statistics["disconnectDistribution"]
+        device_type_distribution = statistics["deviceTypeDistribution"]
+        version_distribution = statistics["versionDistribution"]
         
         # Create device stats object
         current_time = datetime.datetime.now().isoformat()
@@ -166,13 +792,13 @@ def get_device_stats() -> Dict[str, Any]:
             "registeredDevices": registered_devices,
             "connectedDevices": connected_devices,
             "disconnectedDevices": disconnected_devices,
-            "brandNameDistribution": json.dumps(brand_name_distribution),
-            "countryDistribution": json.dumps(country_distribution),
-            "productTypeDistribution": json.dumps(product_type_distribution),
-            "disconnectDistribution": json.dumps(disconnect_distribution),
-            "groupDistribution": json.dumps(group_distribution),
-            "deviceTypeDistribution": json.dumps(device_type_distribution),
-            "versionDistribution": json.dumps(version_distribution),
+            "brandNameDistribution": brand_name_distribution,
+            "countryDistribution": country_distribution,
+            "productTypeDistribution": product_type_distribution,
+            "disconnectDistribution": disconnect_distribution,
+            "groupDistribution": group_distribution,
+            "deviceTypeDistribution": device_type_distribution,
+            "versionDistribution": version_distribution,
             "ttl": int(time.time()) + (86400 * 30)  # 30 days TTL
         }
         
@@ -183,6 +809,112 @@ def get_device_stats() -> Dict[str, Any]:
         logger.error(f"Error getting device statistics: {str(e)}")
         raise
 
+def build_metric_data(device_stats: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Build the fleet metric datums for a stats snapshot.
+    
+    The four fleet totals carry the AggregationType=count dimension the
+    dashboard queries. Each METRIC_DIMENSIONS breakdown adds one datum per
+    bucket of its distribution, limited to the largest
+    METRIC_DIMENSION_MAX_VALUES buckets.
+    
+    Args:
+        device_stats: Device statistics
+        
+    Returns:
+        Metric datums in put_metric_data format
+    """
+    # Calculate disconnect rate
+    registered_devices = device_stats.get("registeredDevices", 0)
+    disconnected_devices = device_stats.get("disconnectedDevices", 0)
+    disconnect_rate = (disconnected_devices / registered_devices * 100) if registered_devices > 0 else 0
+    
+    # Metric names and dimension kept for frontend compatibility
+    count_dimensions = [{'Name': 'AggregationType', 'Value': 'count'}]
+    metric_data = [
+        {
+            'MetricName': 'iotconnectivitydashboard-connected-device-count',
+            'Value': device_stats.get("connectedDevices", 0),
+            'Unit': 'Count',
+            'Dimensions': count_dimensions
+        },
+        {
+            'MetricName': 'iotconnectivitydashboard-disconnected-device-count',
+            'Value': disconnected_devices,
+            'Unit': 'Count',
+            'Dimensions': count_dimensions
+        },
+        {
+            'MetricName': 'iotconnectivitydashboard-disconnection-rate',
+            'Value': disconnect_rate,
+            'Unit': 'Percent',
+            'Dimensions': count_dimensions
+        },
+        {
+            'MetricName': 'iotconnectivitydashboard-all-device-count',
+            'Value': registered_devices,
+            'Unit': 'Count',
+            'Dimensions': count_dimensions
+        }
+    ]
+    
+    for dimension in METRIC_DIMENSIONS:
+        distribution_name, metric_name = METRIC_BREAKDOWNS[dimension]
+        distribution = device_stats.get(distribution_name) or {}
+        if distribution_name == "versionDistribution":
+            distribution = distribution.get("Firmware", {})
+        
+        buckets = sorted(distribution.items(), key=lambda bucket: bucket[1], reverse=True)
+        for value, count in buckets[:METRIC_DIMENSION_MAX_VALUES]:
+            if value:
+                metric_data.append({
+                    'MetricName': metric_name,
+                    'Value': count,
+                    'Unit': 'Count',
+                    'Dimensions': [{'Name': dimension, 'Value': str(value)[:1024]}]
+                })
+    
+    return metric_data
+
+def emit_metric_data(metric_data: List[Dict[str, Any]]) -> None:
+    """
+    Emit metric datums as CloudWatch Embedded Metric Format log lines.
+    
+    Datums sharing a dimension set go into one EMF document. Each document
+    uses its own EphemeralMetrics, since Metrics instances share one metric
+    set with the handler's own metrics and their namespace.
+    
+    Args:
+        metric_data: Metric datums in put_metric_data format
+    """
+    from aws_lambda_powertools.metrics import EphemeralMetrics
+    
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for datum in metric_data:
+        key = tuple((dimension['Name'], dimension['Value']) for dimension in datum['Dimensions'])
+        groups.setdefault(key, []).append(datum)
+    
+    for dimensions, datums in groups.items():
+        emf = EphemeralMetrics(namespace=FLEET_METRICS_NAMESPACE)
+        for name, value in dimensions:
+            emf.add_dimension(name=name, value=value)
+        for datum in datums:
+            emf.add_metric(name=datum['MetricName'], unit=MetricUnit(datum['Unit']), value=datum['Value'])
+        emf.flush_metrics()
+
+def put_metric_data(metric_data: List[Dict[str, Any]]) -> None:
+    """
+    Send metric datums with put_metric_data, in batches within the API limit.
+    
+    Args:
+        metric_data: Metric datums in put_metric_data format
+    """
+    for i in range(0, len(metric_data), PUT_METRIC_DATA_BATCH_SIZE):
+        cloudwatch.put_metric_data(
+            Namespace=FLEET_METRICS_NAMESPACE,
+            MetricData=metric_data[i:i + PUT_METRIC_DATA_BATCH_SIZE]
+        )
+
 def publish_metrics(device_stats: Dict[str, Any]) -> None:
     """
     Publish device statistics to CloudWatch.
@@ -190,69 +922,18 @@ def publish_metrics(device_stats: Dict[str, Any]) -> None:
     Args:
         device_stats: Device statistics
     """
-    logger.debug("Publishing metrics to CloudWatch")
+    logger.debug("Publishing metrics to CloudWatch", extra={"mode": METRICS_PUBLISHING})
     
     try:
-        # Calculate disconnect rate
-        registered_devices = device_stats.get("registeredDevices", 0)
-        disconnected_devices = device_stats.get("disconnectedDevices", 0)
-        disconnect_rate = (disconnected_devices / registered_devices * 100) if registered_devices > 0 else 0
-        
-        # Create metric data with correct names and namespace for frontend compatibility
-        metric_data = [
-            {
-                'MetricName': 'iotconnectivitydashboard-connected-device-count',
-                'Value': device_stats.get("connectedDevices", 0),
-                'Unit': 'Count',
-                'Dimensions': [
-                    {
-                        'Name': 'AggregationType',
-                        'Value': 'count'
-                    }
-                ]
-            },
-            {
-                'MetricName': 'iotconnectivitydashboard-disconnected-device-count',
-                'Value': device_stats.get("disconnectedDevices", 0),
-                'Unit': 'Count',
-                'Dimensions': [
-                    {
-                        'Name': 'AggregationType',
-                        'Value': 'count'
-                    }
-                ]
-            },
-            {
-                'MetricName': 'iotconnectivitydashboard-disconnection-rate',
-                'Value': disconnect_rate,
-                'Unit': 'Percent',
-                'Dimensions': [
-                    {
-                        'Name': 'AggregationType',
-                        'Value': 'count'
-                    }
-                ]
-            },
-            {
-                'MetricName': 'iotconnectivitydashboard-all-device-count',
-                'Value': device_stats.get("registeredDevices", 0),
-                'Unit': 'Count',
-                'Dimensions': [
-                    {
-                        'Name': 'AggregationType',
-                        'Value': 'count'
-                    }
-                ]
-            }
-        ]
+        metric_data = build_metric_data(device_stats)
         
-        # Put metric data to IoTFleetMetrics namespace
-        cloudwatch.put_metric_data(
-            Namespace='IoTFleetMetrics',
-            MetricData=metric_data
-        )
+        # EMF is picked up from the function's logs, with no API call in the job
+        if METRICS_PUBLISHING == "api":
+            put_metric_data(metric_data)
+        else:
+            emit_metric_data(metric_data)
         
-        logger.debug("Published metrics to CloudWatch")
+        logger.debug("Published metrics to CloudWatch", extra={"count": len(metric_data)})
     
     except Exception as e:
         logger.error(f"Error publishing metrics to CloudWatch: {str(e)}")
@@ -265,6 +946,8 @@ def save_device_stats_to_dynamodb(device_stats: Dict[str, Any]) -> None:
     Args:
         device_stats: Device statistics
     """
+    from boto3.dynamodb.conditions import Attr
+    
     logger.debug("Saving device statistics directly to DynamoDB")
     
     try:
@@ -276,15 +959,94 @@ def save_device_stats_to_dynamodb(device_stats: Dict[str, Any]) -> None:
         # Get DynamoDB table
         table = dynamodb.Table(table_name)
         
-        # Put item in table
-        response = table.put_item(Item=device_stats)
+        # Put item in table, with distributions as native maps
+        item = encode_stats_item(device_stats)
+        response = table.put_item(Item=item)
         
         logger.debug("Saved device statistics to DynamoDB", extra={"response": response})
+        
+        # Point the fixed-key latest item at this snapshot, never at an older one
+        try:
+            table.put_item(
+                Item=to_pointer_item(item),
+                ConditionExpression=(
+                    Attr("latestRecordTime").not_exists()
+                    | Attr("latestRecordTime").lt(device_stats["recordTime"])
+                )
+            )
+        except Exception as e:
+            if not _is_conditional_check_failure(e):
+                raise
+            logger.warning("Latest stats pointer already holds a newer snapshot")
     
     except Exception as e:
         logger.error(f"Error saving device statistics to DynamoDB: {str(e)}")
         # Don't raise exception to continue with the rest of the function
 
+def save_history_record(device_stats: Dict[str, Any]) -> None:
+    """
+    Append a stats snapshot to the history table.
+    
+    Distributions are delta-encoded against the record this container wrote
+    before; the first record after a cold start or a failed write is a
+    keyframe.
+    
+    Args:
+        device_stats: Device statistics
+    """
+    global _last_history_record
+    logger.debug("Saving device statistics history record")
+    
+    try:
+        distributions = {name: device_stats[name] for name in HISTORY_DISTRIBUTIONS}
+        record = build_history_record(
+            device_stats,
+            distributions,
+            _last_history_record,
+            int(time.time()) + (86400 * HISTORY_RETENTION_DAYS)
+        )
+        
+        dynamodb.Table(STATS_HISTORY_TABLE).put_item(Item=record)
+        _last_history_record = {"recordTime": record["recordTime"], "distributions": distributions}
+        
+        logger.debug("Saved history record", extra={"keyframe": "distributions" in record})
+    
+    except Exception as e:
+        _last_history_record = None
+        logger.error(f"Error saving device statistics history record: {str(e)}")
+        # Don't raise exception to continue with the rest of the function
+
+def reconcile_counters(device_stats: Dict[str, Any]) -> None:
+    """
+    Correct the event-driven fleet counters that drifted from this scan.
+    
+    Runs at most once per COUNTER_RECONCILE_INTERVAL_SECONDS per container.
+    
+    Args:
+        device_stats: Device statistics
+    """
+    global _last_reconciled_at
+    
+    if _last_reconciled_at is not None and time.time() - _last_reconciled_at < COUNTER_RECONCILE_INTERVAL_SECONDS:
+        logger.debug("Skipping fleet counter reconciliation")
+        return
+    
+    logger.debug("Reconciling fleet counters")
+    
+    try:
+        corrected = reconcile_fleet_counters(FLEET_COUNTERS_TABLE, device_stats)
+        _last_reconciled_at = time.time()
+        
+        if corrected:
+            logger.warning(f"Corrected {corrected} drifted fleet counters")
+            metrics.add_metric(name="FleetCounterDrift", unit=MetricUnit.Count, value=corrected)
+        
+        logger.debug("Reconciled fleet counters", extra={"corrected": corrected})
+    
+    except Exception as e:
+        logger.error(f"Error reconciling fleet counters: {str(e)}")
+        # Don't raise exception to continue with the rest of the function
+
 @tracer.capture_lambda_handler
 @logger.inject_lambda_context(log_event=True)
 @metrics.log_metrics(capture_cold_start_metric=True)
@@ -301,7 +1063,14 @@ def lambda_handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, A
     """
     try:
         # Get device statistics
-        device_stats = get_device_stats()
+        device_stats = get_device_stats(context)
+        
+        # Publish only complete passes; a checkpointed scan resumes on the next run
+        if device_stats is None:
+            return {
+                "statusCode": 202,
+                "body": "Device statistics scan in progress"
+            }
         
         # Publish metrics to CloudWatch
         publish_metrics(device_stats)
@@ -309,6 +1078,14 @@ def lambda_handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, A
         # Save device statistics directly to DynamoDB instead of using AppSync
         save_device_stats_to_dynamodb(device_stats)
         
+        # Append the snapshot to the trend history
+        if STATS_HISTORY_TABLE:
+            save_history_record(device_stats)
+        
+        # Correct any drift in the event-driven counters
+        if FLEET_COUNTERS_TABLE:
+            reconcile_counters(device_stats)
+        
         return {
             "statusCode": 200,
             "body": "Device statistics updated successfully"
@@ -0,0 +1,239 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Lambda handler for fleet-event-counter."""
+import random
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from aws_lambda_powertools.metrics import MetricUnit
+from aws_lambda_powertools.utilities.typing import LambdaContext
+
+from shared_lib.powertools import logger, tracer, metrics
+from shared_lib.aws_clients import lazy_client
+from shared_lib.fleet_counters import FLEET_COUNTERS_TABLE, counter_deltas, thing_state_key
+from shared_lib.iot_utils import search_thing_document
+from shared_lib.pagination import with_throttle_retry
+
+# Attempts at the conditional state write before an event is given up on
+MAX_UPDATE_ATTEMPTS = 5
+
+# Upper bounds in seconds of the jittered delay before retrying a state write
+# that lost to a concurrent event for the same thing
+RETRY_BASE_DELAY_SECONDS = 0.05
+RETRY_MAX_DELAY_SECONDS = 1.0
+
+# DynamoDB client, created on first use
+dynamodb_client = lazy_client('dynamodb')
+
+def parse_event(event: Dict[str, Any]) -> Optional[Tuple[str, str, int, Dict[str, Any]]]:
+    """
+    Turn an IoT presence or registry event into a state change.
+    
+    Args:
+        event: Event published on $aws/events/presence/... or
+            $aws/events/thing/..., as forwarded by the IoT rule
+        
+    Returns:
+        Tuple of thing name, event source ("presence" or "registry"),
+        event timestamp and the state fields it sets, or None for events
+        that don't affect the counters
+    """
+    event_type = event.get("eventType")
+    timestamp = event.get("timestamp")
+    
+    if event_type in ("connected", "disconnected") and event.get("clientId") and timestamp:
+        # Thing names double as client IDs, as the fleet index assumes
+        changes = {"connected": event_type == "connected"}
+        changes["disconnectReason"] = event.get("disconnectReason") if event_type == "disconnected" else None
+        return event["clientId"], "presence", timestamp, changes
+    
+    if event_type == "THING_EVENT" and event.get("thingName") and timestamp:
+        operation = event.get("operation")
+        if operation == "DELETED":
+            return event["thingName"], "registry", timestamp, {"exists": False}
+        if operation in ("CREATED", "UPDATED"):
+            return event["thingName"], "registry", timestamp, {
+                "exists": True,
+                "attributes": event.get("attributes") or {}
+            }
+    
+    return None
+
+def state_from_document(document: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Build the initial state of a thing from its fleet index document.
+    
+    Things seen for the first time are assumed to be counted the way the
+    last full scan counted them, which is what the index reports.
+    
+    Args:
+        document: The thing's search_index document, or None if not indexed
+        
+    Returns:
+        Thing state, with version 0 for a state that is not stored yet
+    """
+    document = document or {}
+    connectivity = document.get("connectivity") or {}
+    return {
+        "exists": bool(document),
+        "connected": connectivity.get("connected") is True,
+        "disconnectReason": connectivity.get("disconnectReason"),
+        "attributes": document.get("attributes") or {},
+        "presenceTime": connectivity.get("timestamp") or 0,
+        "registryTime": 0,
+        "version": 0
+    }
+
+def get_thing_state(thing_name: str) -> Dict[str, Any]:
+    """
+    Get the last counted state of a thing.
+    
+    Args:
+        thing_name: The IoT thing name
+        
+    Returns:
+        Stored thing state, or one built from the fleet index
+    """
+    from boto3.dynamodb.types import TypeDeserializer
+    
+    response = dynamodb_client.get_item(
+        TableName=FLEET_COUNTERS_TABLE,
+        Key={key: {"S": value} for key, value in thing_state_key(thing_name).items()},
+        ConsistentRead=True
+    )
+    item = response.get("Item")
+    if not item:
+        return state_from_document(search_thing_document(thing_name))
+    
+    deserializer = TypeDeserializer()
+    return {key: deserializer.deserialize(value) for key, value in item.items()}
+
+def apply_counter_deltas(deltas: Dict[Tuple[str, str], int]) -> None:
+    """
+    Add deltas to the counter items.
+    
+    Each counter is a separate unconditional ADD, so events for different
+    things never conflict, however many of them move the same counter.
+    
+    Args:
+        deltas: Dictionary of (pk, sk) counter key to delta
+    """
+    update_item = with_throttle_retry(dynamodb_client.update_item)
+    for (pk, sk), delta in deltas.items():
+        update_item(
+            TableName=FLEET_COUNTERS_TABLE,
+            Key={"pk": {"S": pk}, "sk": {"S": sk}},
+            UpdateExpression="ADD #count :delta",
+            ExpressionAttributeNames={"#count": "count"},
+            ExpressionAttributeValues={":delta": {"N": str(delta)}}
+        )
+
+def apply_event(thing_name: str, source: str, timestamp: int, changes: Dict[str, Any]) -> bool:
+    """
+    Apply a state change to a thing, then to the counters.
+    
+    The state item is written only if its version is unchanged since it was
+    read, so concurrent events for one thing are applied one at a time and
+    each state change moves the counters once. Events not newer than the
+    last one applied from the same source are duplicates or arrived out of
+    order and are dropped.
+    
+    The counters are updated after the state write rather than in the same
+    transaction, so a reconnect storm does not serialize the fleet on the
+    hot fleet count items. Deltas lost to a failure between the two writes
+    are corrected by the monitor's next reconciliation.
+    
+    Args:
+        thing_name: The IoT thing name
+        source: "presence" or "registry"
+        timestamp: Event timestamp in milliseconds
+        changes: State fields set by the event
+        
+    Returns:
+        True if the event was applied, False if it was dropped
+    """
+    from boto3.dynamodb.types import TypeSerializer
+    
+    serializer = TypeSerializer()
+    time_field = f"{source}Time"
+    
+    for attempt in range(MAX_UPDATE_ATTEMPTS):
+        old_state = get_thing_state(thing_name)
+        if timestamp <= old_state.get(time_field, 0):
+            return False
+        
+        version = int(old_state.get("version", 0))
+        new_state = {**old_state, **changes, time_field: timestamp, "version": version + 1}
+        
+        put = {
+            "TableName": FLEET_COUNTERS_TABLE,
+            "Item": {
+                key: serializer.serialize(value)
+                for key, value in {**new_state, **thing_state_key(thing_name)}.items()
+            }
+        }
+        if version:
+            put["ConditionExpression"] = "#version = :version"
+            put["ExpressionAttributeNames"] = {"#version": "version"}
+            put["ExpressionAttributeValues"] = {":version": {"N": str(version)}}
+        else:
+            put["ConditionExpression"] = "attribute_not_exists(pk)"
+        
+        try:
+            with_throttle_retry(dynamodb_client.put_item)(**put)
+        except dynamodb_client.exceptions.ConditionalCheckFailedException:
+            logger.debug(f"State of {thing_name} changed concurrently, retrying", extra={"attempt": attempt + 1})
+            time.sleep(random.uniform(0, min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2 ** attempt)))
+            continue
+        
+        apply_counter_deltas(counter_deltas(old_state, new_state))
+        return True
+    
+    raise RuntimeError(f"Could not apply {source} event for {thing_name} after {MAX_UPDATE_ATTEMPTS} attempts")
+
+@tracer.capture_lambda_handler
+@logger.inject_lambda_context(log_event=True)
+@metrics.log_metrics(capture_cold_start_metric=True)
+def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
+    """
+    Handle an IoT presence or registry event forwarded by an IoT rule.
+    
+    Args:
+        event: IoT lifecycle event
+        context: Lambda context
+        
+    Returns:
+        Whether the event was applied to the counters
+    """
+    parsed = parse_event(event)
+    if not parsed:
+        logger.debug("Ignoring event", extra={"eventType": event.get("eventType")})
+        return {"applied": False}
+    
+    thing_name, source, timestamp, changes = parsed
+    applied = apply_event(thing_name, source, timestamp, changes)
+    
+    metric_name = "FleetEventApplied" if applied else "FleetEventDropped"
+    metrics.add_metric(name=metric_name, unit=MetricUnit.Count, value=1)
+    logger.debug("Processed event", extra={"thingName": thing_name, "source": source, "applied": applied})
+    return {"applied": applied}
+
+# Entry point for AWS Lambda
+lambda_handler = handler
@@ -18,32 +18,448 @@ under the License.
 """
 
 """Lambda handler for get-cloudwatch-metric-data resolver."""
+import os
 import datetime
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-import boto3
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from shared_lib.powertools import logger, tracer, metrics
+from shared_lib.aws_clients import lazy_client, lazy_resource
 from shared_lib.appsync_utils import create_response, create_error_response
+from shared_lib.pagination import iter_items
+from shared_lib.downsampling import lttb
 
-# Initialize CloudWatch client
-cloudwatch_client = boto3.client('cloudwatch')
+# CloudWatch client, created on first use
+cloudwatch_client = lazy_client('cloudwatch')
+
+# DynamoDB resource, created on first use
+dynamodb = lazy_resource('dynamodb')
+
+# Namespace the stats monitor publishes fleet metrics to
+FLEET_METRICS_NAMESPACE = "IoTFleetMetrics"
+
+# Period in seconds when the query doesn't give one
+DEFAULT_PERIOD = 24 * 60 * 60  # 1 day
+
+# Periods auto mode picks from, smallest first; fixed steps keep the series
+# cache reusable as the time range moves
+AUTO_PERIODS = [60, 300, 900, 1800, 3600, 3 * 3600, 6 * 3600, 12 * 3600, 24 * 3600, 7 * 24 * 3600]
+
+# Data older than each age in seconds is only kept by CloudWatch at a period
+# that is a multiple of the given one, oldest first
+PERIOD_RETENTION = [(63 * 24 * 3600, 3600), (15 * 24 * 3600, 300)]
+
+# Largest maxPoints accepted
+MAX_POINTS = 2000
+
+# Requested periods must be whole minutes, the granularity of fleet metrics
+PERIOD_GRANULARITY_SECONDS = 60
+
+# Start of the series when the query doesn't give one
+DEFAULT_START_TIME = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Table of completed metric buckets shared by all containers; without it
+# the series cache is kept in memory only
+METRIC_SERIES_CACHE_TABLE = os.environ.get("METRIC_SERIES_CACHE_TABLE")
+
+# Seconds after its end at which a bucket is complete and never fetched
+# again; allows for metrics delivered late through EMF
+SERIES_SETTLE_SECONDS = int(os.environ.get("SERIES_SETTLE_SECONDS", "300"))
+
+# Buckets stored per cache chunk item
+CHUNK_BUCKETS = 1000
+
+# Series a warm container keeps in memory; the least recently used ones are
+# dropped first and read back from the cache table when needed again
+MAX_CACHED_SERIES = int(os.environ.get("MAX_CACHED_SERIES", "32"))
+
+# Completed buckets per series, kept between invocations of a warm container.
+# Each series holds the start of the range read from the cache table and its
+# chunks by start time; a chunk has every bucket in [coveredFrom,
+# coveredUntil), with points only for buckets that have data.
+_series_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+TimeRange = Tuple[int, int]
+
+def fetch_metric_data(
+    metric_names: List[str],
+    period: int,
+    start_time: datetime.datetime,
+    end_time: datetime.datetime,
+    expression: Optional[str] = None
+) -> Iterator[Tuple[str, datetime.datetime, float]]:
+    """
+    Fetch metric data points from CloudWatch, following every page.
+    
+    Args:
+        metric_names: List of metric names to retrieve
+        period: Period in seconds for each datapoint
+        start_time: Start time for the query
+        end_time: End time for the query
+        expression: Optional expression for metric math
+        
+    Returns:
+        Iterator over (label, timestamp, value) data points
+    """
+    # Build metric data queries
+    metric_data_queries = []
+    
+    # Add metric queries
+    for i, metric_name in enumerate(metric_names):
+        metric_data_queries.append({
+            'Id': f'm{i+1}',
+            'Label': metric_name,
+            'ReturnData': not expression,
+            'MetricStat': {
+                'Metric': {
+                    'Namespace': FLEET_METRICS_NAMESPACE,
+                    'MetricName': metric_name,
+                    'Dimensions': [
+                        {
+                            'Name': 'AggregationType',
+                            'Value': 'count'
+                        }
+                    ]
+                },
+                'Period': period,
+                'Stat': 'Maximum'
+            }
+        })
+    
+    # Add expression if provided
+    if expression:
+        metric_data_queries.append({
+            'Id': 'e1',
+            'Label': 'expression',
+            'Expression': expression
+        })
+    
+    for metric in iter_items(
+        cloudwatch_client.get_metric_data,
+        'MetricDataResults',
+        token_key='NextToken',
+        StartTime=start_time,
+        EndTime=end_time,
+        MetricDataQueries=metric_data_queries
+    ):
+        timestamps = metric.get('Timestamps', [])
+        values = metric.get('Values', [])
+        
+        if len(timestamps) != len(values):
+            raise ValueError('Timestamps and Values length mismatch')
+        
+        for timestamp, value in zip(timestamps, values):
+            yield metric.get('Label', ''), timestamp, value
+
+def _to_datetime(seconds: int) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc)
+
+def _series_key(metric_name: str, period: int) -> str:
+    return f"{metric_name}#{period}"
+
+def _cached_series(key: str) -> Dict[str, Any]:
+    """
+    Get the in-memory cache of a series, evicting least recently used series.
+    
+    Args:
+        key: Series key
+        
+    Returns:
+        The series' cache entry
+    """
+    cached = _series_cache.get(key)
+    if cached is None:
+        cached = _series_cache[key] = {"loadedFrom": None, "chunks": {}}
+        while len(_series_cache) > MAX_CACHED_SERIES:
+            evicted, _ = _series_cache.popitem(last=False)
+            logger.debug("Evicted cached metric series", extra={"series": evicted})
+    _series_cache.move_to_end(key)
+    return cached
+
+def merge_chunk(old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Merge two views of the same cache chunk.
+    
+    Args:
+        old: Chunk known so far, if any
+        new: Chunk with newly fetched buckets
+        
+    Returns:
+        Chunk covering both, or the later one if their coverage doesn't touch
+    """
+    if old is None:
+        return new
+    if new["coveredFrom"] > old["coveredUntil"] or old["coveredFrom"] > new["coveredUntil"]:
+        # One range can't describe disjoint coverage; keep the later one
+        return new if new["coveredUntil"] > old["coveredUntil"] else old
+    return {
+        "coveredFrom": min(old["coveredFrom"], new["coveredFrom"]),
+        "coveredUntil": max(old["coveredUntil"], new["coveredUntil"]),
+        "points": {**old["points"], **new["points"]}
+    }
+
+def missing_ranges(chunks: Dict[int, Dict[str, Any]], period: int, start: int, end: int) -> List[TimeRange]:
+    """
+    Find the parts of a time range the cached chunks don't cover.
+    
+    Args:
+        chunks: Cached chunks of one series by start time
+        period: Period in seconds of the series
+        start: Start of the range, aligned to the period
+        end: End of the range, aligned to the period
+        
+    Returns:
+        Uncovered (start, end) ranges in time order
+    """
+    span = period * CHUNK_BUCKETS
+    ranges = []
+    for chunk_start in range(start // span * span, end, span):
+        range_start, range_end = max(start, chunk_start), min(end, chunk_start + span)
+        chunk = chunks.get(chunk_start)
+        if chunk is None or chunk["coveredUntil"] <= range_start or chunk["coveredFrom"] >= range_end:
+            ranges.append((range_start, range_end))
+            continue
+        if range_start < chunk["coveredFrom"]:
+            ranges.append((range_start, chunk["coveredFrom"]))
+        if chunk["coveredUntil"] < range_end:
+            ranges.append((chunk["coveredUntil"], range_end))
+    return ranges
+
+def coalesce_ranges(ranges: List[TimeRange]) -> List[TimeRange]:
+    """
+    Merge overlapping and adjacent time ranges.
+    
+    Args:
+        ranges: (start, end) ranges in any order
+        
+    Returns:
+        Disjoint ranges in time order
+    """
+    merged: List[TimeRange] = []
+    for range_start, range_end in sorted(ranges):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+        else:
+            merged.append((range_start, range_end))
+    return merged
+
+def load_chunks(key: str, period: int, start: int, end: int) -> Dict[int, Dict[str, Any]]:
+    """
+    Read the stored chunks of a series overlapping a time range.
+    
+    Args:
+        key: Series key
+        period: Period in seconds of the series
+        start: Start of the range
+        end: End of the range
+        
+    Returns:
+        Chunks by start time
+    """
+    from boto3.dynamodb.conditions import Key
+    
+    span = period * CHUNK_BUCKETS
+    table = dynamodb.Table(METRIC_SERIES_CACHE_TABLE)
+    items = iter_items(
+        table.query,
+        "Items",
+        token_key="LastEvaluatedKey",
+        start_key="ExclusiveStartKey",
+        KeyConditionExpression=Key("series").eq(key) & Key("chunkStart").between(
+            start // span * span, (end - 1) // span * span
+        )
+    )
+    return {
+        int(item["chunkStart"]): {
+            "coveredFrom": int(item["coveredFrom"]),
+            "coveredUntil": int(item["coveredUntil"]),
+            "points": {int(timestamp): float(value) for timestamp, value in item["points"].items()}
+        }
+        for item in items
+    }
+
+def save_chunks(key: str, chunks: Dict[int, Dict[str, Any]]) -> None:
+    """
+    Store chunks of a series.
+    
+    Writes are unconditional: buckets never change once complete, so a
+    concurrent writer can at worst store less coverage, which costs another
+    container a refetch of that range.
+    
+    Args:
+        key: Series key
+        chunks: Chunks by start time
+    """
+    with dynamodb.Table(METRIC_SERIES_CACHE_TABLE).batch_writer() as batch:
+        for chunk_start, chunk in chunks.items():
+            batch.put_item(Item={
+                "series": key,
+                "chunkStart": chunk_start,
+                "coveredFrom": chunk["coveredFrom"],
+                "coveredUntil": chunk["coveredUntil"],
+                "points": {str(timestamp): Decimal(str(value)) for timestamp, value in chunk["points"].items()}
+            })
+
+def get_cached_series(
+    metric_names: List[str],
+    period: int,
+    start_time: datetime.datetime,
+    end_time: datetime.datetime
+) -> List[Dict[str, Any]]:
+    """
+    Get metric data points, fetching from CloudWatch only what isn't cached.
+    
+    Completed buckets come from the in-memory cache, then the cache table.
+    CloudWatch is asked for any range neither covers plus the open tail of
+    buckets that may still change, which once the cache is warm is a single
+    small get_metric_data call.
+    
+    Args:
+        metric_names: List of metric names to retrieve
+        period: Period in seconds for each datapoint
+        start_time: Start time for the query
+        end_time: End time for the query
+        
+    Returns:
+        List of metric data points, newest first per metric
+    """
+    start = int(start_time.timestamp()) // period * period
+    now = int(end_time.timestamp())
+    settled = max(start, (now - SERIES_SETTLE_SECONDS) // period * period)
+    span = period * CHUNK_BUCKETS
+    
+    series = {
+        name: _cached_series(_series_key(name, period))
+        for name in metric_names
+    }
+    
+    # Pick up what other containers stored for any range not read yet
+    if METRIC_SERIES_CACHE_TABLE and start < settled:
+        for name, cached in series.items():
+            if cached["loadedFrom"] is not None and cached["loadedFrom"] <= start:
+                continue
+            load_end = settled if cached["loadedFrom"] is None else cached["loadedFrom"]
+            for chunk_start, chunk in load_chunks(_series_key(name, period), period, start, load_end).items():
+                cached["chunks"][chunk_start] = merge_chunk(cached["chunks"].get(chunk_start), chunk)
+            cached["loadedFrom"] = start
+    
+    completed_ranges = coalesce_ranges([
+        missing
+        for cached in series.values()
+        for missing in missing_ranges(cached["chunks"], period, start, settled)
+    ])
+    fetch_ranges = coalesce_ranges(completed_ranges + [(settled, now)])
+    logger.debug("Fetching uncached metric ranges", extra={"ranges": fetch_ranges})
+    
+    fetched: Dict[str, Dict[int, float]] = {name: {} for name in metric_names}
+    for range_start, range_end in fetch_ranges:
+        for label, timestamp, value in fetch_metric_data(
+            metric_names, period, _to_datetime(range_start), _to_datetime(range_end)
+        ):
+            fetched.setdefault(label, {})[int(timestamp.timestamp())] = value
+    
+    # Store the newly completed buckets, including the ones without data
+    for name, cached in series.items():
+        changed = {}
+        for range_start, range_end in completed_ranges:
+            for chunk_start in range(range_start // span * span, range_end, span):
+                covered_from, covered_until = max(range_start, chunk_start), min(range_end, chunk_start + span)
+                chunk = merge_chunk(cached["chunks"].get(chunk_start), {
+                    "coveredFrom": covered_from,
+                    "coveredUntil": covered_until,
+                    "points": {
+                        timestamp: value for timestamp, value in fetched[name].items()
+                        if covered_from <= timestamp < covered_until
+                    }
+                })
+                cached["chunks"][chunk_start] = changed[chunk_start] = chunk
+        if changed and METRIC_SERIES_CACHE_TABLE:
+            save_chunks(_series_key(name, period), changed)
+    
+    results = []
+    for name, cached in series.items():
+        points = {
+            timestamp: value
+            for chunk in cached["chunks"].values()
+            for timestamp, value in chunk["points"].items()
+            if start <= timestamp < settled
+        }
+        points.update((timestamp, value) for timestamp, value in fetched[name].items() if timestamp >= start)
+        for timestamp in sorted(points, reverse=True):
+            results.append({
+                'metric': name,
+                'timestamp': _to_datetime(timestamp).isoformat(),
+                'value': points[timestamp]
+            })
+    return results
+
+def choose_period(start_time: datetime.datetime, end_time: datetime.datetime, max_points: int) -> int:
+    """
+    Pick the smallest period that keeps a series within max_points.
+    
+    Only periods CloudWatch still has data at for the start of the range
+    are considered.
+    
+    Args:
+        start_time: Start time for the query
+        end_time: End time for the query, now
+        max_points: Largest number of data points per metric
+        
+    Returns:
+        Period in seconds, the largest AUTO_PERIODS one if none is enough
+    """
+    span = (end_time - start_time).total_seconds()
+    multiple = next((multiple for age, multiple in PERIOD_RETENTION if span > age), 60)
+    for period in AUTO_PERIODS:
+        if period % multiple == 0 and span / period <= max_points:
+            return period
+    return AUTO_PERIODS[-1]
+
+def downsample_series(results: List[Dict[str, Any]], max_points: int) -> List[Dict[str, Any]]:
+    """
+    Downsample each metric's data points with LTTB.
+    
+    Args:
+        results: Data points, newest first per metric
+        max_points: Largest number of data points to keep per metric
+        
+    Returns:
+        The kept data points, in the same order
+    """
+    series: Dict[str, List[Dict[str, Any]]] = {}
+    for point in results:
+        series.setdefault(point['metric'], []).append(point)
+    
+    downsampled = []
+    for points in series.values():
+        points.reverse()
+        xs = [datetime.datetime.fromisoformat(point['timestamp']).timestamp() for point in points]
+        ys = [point['value'] for point in points]
+        downsampled.extend(points[i] for i in reversed(lttb(xs, ys, max_points)))
+    return downsampled
 
 def get_connectivity_metrics(
     metric_names: List[str],
-    period: Optional[int] = 24 * 60 * 60,  # 1 day
+    period: Optional[int] = None,
     start_time: Optional[datetime.datetime] = None,
-    expression: Optional[str] = None
+    expression: Optional[str] = None,
+    max_points: Optional[int] = None
 ) -> List[Dict[str, Any]]:
     """
     Get connectivity metrics from CloudWatch.
     
     Args:
         metric_names: List of metric names to retrieve
-        period: Period in seconds for each datapoint
+        period: Period in seconds for each datapoint; picked from max_points
+            if not given, or one day without either
         start_time: Start time for the query
-        expression: Optional expression for metric math
+        expression: Optional expression for metric math, which bypasses
+            the series cache
+        max_points: Largest number of data points per metric; longer series
+            are downsampled with LTTB
         
     Returns:
         List of metric data points
@@ -52,83 +468,36 @@ def get_connectivity_metrics(
     
     # Set default start time if not provided
     if not start_time:
-        start_time = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+        start_time = DEFAULT_START_TIME
     
     end_time = datetime.datetime.now(datetime.timezone.utc)
-    results = []
-    next_token = None
+    
+    if not period:
+        period = choose_period(start_time, end_time, max_points) if max_points else DEFAULT_PERIOD
+        logger.debug(f"Using period {period}")
     
     try:
-        while True:
-            # Build metric data queries
-            metric_data_queries = []
-            
-            # Add metric queries
-            for i, metric_name in enumerate(metric_names):
-                metric_data_queries.append({
-                    'Id': f'm{i+1}',
-                    'Label': metric_name,
-                    'ReturnData': not expression,
-                    'MetricStat': {
-                        'Metric': {
-                            'Namespace': 'IoTFleetMetrics',
-                            'MetricName': metric_name,
-                            'Dimensions': [
-                                {
-                                    'Name': 'AggregationType',
-                                    'Value': 'count'
-                                }
-                            ]
-                        },
-                        'Period': period,
-                        'Stat': 'Maximum'
-                    }
-                })
-            
-            # Add expression if provided
-            if expression:
-                metric_data_queries.append({
-                    'Id': 'e1',
-                    'Label': 'expression',
-                    'Expression': expression
-                })
-            
-            # Build request parameters
-            params = {
-                'StartTime': start_time,
-                'EndTime': end_time,
-                'MetricDataQueries': metric_data_queries
-            }
-            
-            if next_token:
-                params['NextToken'] = next_token
-            
-            # Get metric data
-            result = cloudwatch_client.get_metric_data(**params)
-            next_token = result.get('NextToken')
-            
-            # Process results
-            for metric in result.get('MetricDataResults', []):
-                timestamps = metric.get('Timestamps', [])
-                values = metric.get('Values', [])
-                
-                if len(timestamps) != len(values):
-                    raise ValueError('Timestamps and Values length mismatch')
-                
-                for i, timestamp in enumerate(timestamps):
-                    results.append({
-                        'metric': metric.get('Label', ''),
-                        'timestamp': timestamp.isoformat(),
-                        'value': values[i] if i < len(values) else 0
-                    })
-            
-            if not next_token:
-                break
+        if expression:
+            results = [
+                {
+                    'metric': label,
+                    'timestamp': timestamp.isoformat(),
+                    'value': value
+                }
+                for label, timestamp, value in fetch_metric_data(
+                    metric_names, period, start_time, end_time, expression
+                )
+            ]
+        else:
+            results = get_cached_series(metric_names, period, start_time, end_time)
     
     except Exception as e:
         logger.error(f"Error getting CloudWatch metrics: {str(e)}")
         raise
     
+    if max_points:
+        results = downsample_series(results, max_points)
+    
     logger.debug("Got connectivity metrics", extra={"count": len(results)})
     return results
 
@@ -151,6 +520,15 @@ def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
         metric_type = event.get("arguments", {}).get("type")
         period = event.get("arguments", {}).get("period")
         start_str = event.get("arguments", {}).get("start")
+        max_points = event.get("arguments", {}).get("maxPoints")
+        
+        if period is not None and (period < PERIOD_GRANULARITY_SECONDS or period % PERIOD_GRANULARITY_SECONDS):
+            return create_error_response(ValueError(f"period must be a multiple of {PERIOD_GRANULARITY_SECONDS} seconds"))
+        
+        if max_points is not None:
+            if max_points < 1:
+                return create_error_response(ValueError("maxPoints must be at least 1"))
+            max_points = min(max_points, MAX_POINTS)
         
         # Parse start time if provided
         start_time = None
@@ -165,7 +543,8 @@ def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
                     'iotconnectivitydashboard-disconnected-device-count'
                 ],
                 period,
-                start_time
+                start_time,
+                max_points=max_points
             )
             return create_response(data)
         
@@ -176,7 +555,8 @@ def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
                     'iotconnectivitydashboard-disconnection-rate'
                 ],
                 period,
-                start_time
+                start_time,
+                max_points=max_points
             )
             return create_response(data)
         
@@ -18,60 +18,159 @@ under the License.
 """
 
 """Lambda handler for get-device resolver."""
-import json
-from typing import Any, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-import boto3
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from shared_lib.powertools import logger, tracer, metrics, add_monitoring_details
 from shared_lib.appsync_utils import create_response, create_error_response
-from shared_lib.iot_utils import describe_thing, get_fleet_index_details, get_thing_groups, get_device_connection_status
+from shared_lib.projection import FieldProjection
+from shared_lib.iot_utils import (
+    INDEX_NOT_ENABLED,
+    connection_status_from_document,
+    connection_status_from_shadow_state,
+    describe_thing,
+    fleet_index_details_from_document,
+    get_index_status,
+    get_thing_groups,
+    get_thing_shadow_state,
+    search_thing_document,
+    search_thing_documents
+)
 
-def get_device_details(thing_name: str) -> Dict[str, Any]:
-    """Get device details from IoT Core.
+# Work each Device field depends on; unrequested work is skipped
+DEVICE_FIELD_DEPENDENCIES = {
+    "thingName": [],
+    "attributes": ["describe_thing"],
+    "deviceType": ["describe_thing"],
+    "connected": ["connection_status", "shadow"],
+    "disconnectReason": ["fleet_index"],
+    "lastConnectedAt": ["fleet_index"],
+    "deviceGroups": ["thing_groups"],
+    "firmwareType": ["fleet_index", "describe_thing"],
+    "firmwareVersion": ["fleet_index", "describe_thing"]
+}
+
+# Upper bound on AWS calls issued concurrently for one device
+DEVICE_FETCH_WORKERS = 4
+
+# Upper bound on AWS calls issued concurrently for a BatchInvoke request
+BATCH_FETCH_WORKERS = 10
+
+def _fetch_index_document(thing_name: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """Get the fleet index status and the thing's index document.
     
     Args:
         thing_name: The IoT thing name
         
     Returns:
-        Device information dictionary
+        Tuple of (index status or None if unknown, document or None)
     """
-    logger.debug("Getting thing details", extra={"thingName": thing_name})
+    try:
+        index_status = get_index_status("AWS_Things")
+    except Exception as e:
+        logger.warning(f"Could not check fleet index status: {str(e)}")
+        index_status = None
     
-    # Get basic thing data
-    thing_data = describe_thing(thing_name)
+    if index_status == INDEX_NOT_ENABLED:
+        return index_status, None
     
-    # Get connectivity status from fleet indexing
     try:
-        index_details = get_fleet_index_details(thing_name)
-        logger.debug(f"Fleet index details for {thing_name}: {json.dumps(index_details)}")
+        return index_status, search_thing_document(thing_name)
     except Exception as e:
-        logger.warning(f"Error getting fleet index details: {str(e)}")
-        index_details = {}
+        logger.warning(f"Error searching fleet index for {thing_name}: {str(e)}")
+        return index_status, None
+
+def _fetch_shadow_state(thing_name: str) -> Optional[Dict[str, Any]]:
+    """Get the thing's classic shadow, or None if it can't be read.
     
-    # Get thing groups
-    device_groups = get_thing_groups(thing_name)
+    Args:
+        thing_name: The IoT thing name
+        
+    Returns:
+        Parsed shadow document or None
+    """
+    try:
+        return get_thing_shadow_state(thing_name)
+    except Exception as e:
+        logger.debug(f"Could not get shadow for {thing_name}: {str(e)}")
+        return None
+
+def fetch_device_sources(thing_name: str, projection: FieldProjection) -> Dict[str, Any]:
+    """Issue each AWS call the projection needs once, concurrently.
     
-    # Get connection status using the consistent function
-    connected_value = get_device_connection_status(thing_name)
+    The index document and the shadow are fetched a single time and shared
+    by the fleet-index and connection-status derivations.
     
-    # Direct check of IoT registry for debugging
-    try:
-        # Get the device connection status directly from IoT Core
-        iot_client = boto3.client('iot-data')
-        response = iot_client.get_thing_shadow(thingName=thing_name)
-        shadow_state = json.loads(response["payload"].read())
-        shadow_connected = shadow_state.get("state", {}).get("reported", {}).get("connected", None)
-        logger.debug(f"Shadow connection status for {thing_name}: {shadow_connected}")
+    Args:
+        thing_name: The IoT thing name
+        projection: Requested fields
         
-        # If we couldn't get connection status from fleet index but have it in shadow
-        if connected_value is False and shadow_connected is not None:
-            logger.info(f"Using shadow connection status for {thing_name} as fallback")
-            connected_value = bool(shadow_connected)
-    except Exception as e:
-        logger.debug(f"Could not get shadow connection status: {str(e)}")
-        shadow_connected = None
+    Returns:
+        Dictionary with "thing", "index_status", "document", "groups" and
+        "shadow" entries for the calls that were made
+    """
+    tasks = {}
+    if projection.needs("describe_thing"):
+        tasks["thing"] = (describe_thing, thing_name)
+    if projection.needs("fleet_index") or projection.needs("connection_status"):
+        tasks["index"] = (_fetch_index_document, thing_name)
+    if projection.needs("thing_groups"):
+        tasks["groups"] = (get_thing_groups, thing_name)
+    if projection.needs("shadow"):
+        tasks["shadow"] = (_fetch_shadow_state, thing_name)
+    
+    sources: Dict[str, Any] = {"thing": {}, "index_status": None, "document": None, "groups": [], "shadow": None}
+    if not tasks:
+        return sources
+    
+    with ThreadPoolExecutor(max_workers=min(DEVICE_FETCH_WORKERS, len(tasks))) as executor:
+        futures = {key: executor.submit(func, arg) for key, (func, arg) in tasks.items()}
+        results = {key: future.result() for key, future in futures.items()}
+    
+    if "thing" in results:
+        sources["thing"] = results["thing"]
+    if "index" in results:
+        sources["index_status"], sources["document"] = results["index"]
+    if "groups" in results:
+        sources["groups"] = results["groups"]
+    if "shadow" in results:
+        sources["shadow"] = results["shadow"]
+    return sources
+
+def build_device_details(thing_name: str, sources: Dict[str, Any]) -> Dict[str, Any]:
+    """Derive the Device fields from fetched sources.
+    
+    Args:
+        thing_name: The IoT thing name
+        sources: Output of fetch_device_sources
+        
+    Returns:
+        Device information dictionary
+    """
+    thing_data = sources["thing"]
+    document = sources["document"]
+    shadow_state = sources["shadow"]
+    
+    # Get connectivity status from fleet indexing
+    index_details = {}
+    if document and sources["index_status"] == "ACTIVE":
+        index_details = fleet_index_details_from_document(document)
+    
+    # Get connection status the same way get_device_connection_status does
+    if document:
+        connected_value = connection_status_from_document(document)
+    elif shadow_state is not None:
+        connected_value = connection_status_from_shadow_state(thing_name, shadow_state)
+    else:
+        connected_value = False
+    
+    # If we couldn't get connection status from fleet index but have it in shadow
+    shadow_connected = (shadow_state or {}).get("state", {}).get("reported", {}).get("connected", None)
+    if connected_value is False and shadow_connected is not None:
+        logger.info(f"Using shadow connection status for {thing_name} as fallback")
+        connected_value = bool(shadow_connected)
     
     # Log the connection status for debugging
     logger.debug(f"Final connection status for {thing_name}: {connected_value} (shadow: {shadow_connected})")
@@ -89,37 +188,143 @@ def get_device_details(thing_name: str) -> Dict[str, Any]:
             firmware_version = attributes.get("firmwareVersion")
     
     # Combine the data
-    details = {
+    return {
         "thingName": thing_name,
         "attributes": thing_data.get("attributes", {}),
         "deviceType": thing_data.get("thingTypeName", "unknown"),
         "connected": connected_value,  # Use the consistent connection status
         "disconnectReason": index_details.get("disconnectReason"),
         "lastConnectedAt": index_details.get("timestamp"),
-        "deviceGroups": device_groups,
+        "deviceGroups": sources["groups"],
         "firmwareType": firmware_type,
         "firmwareVersion": firmware_version
     }
+
+def get_device_details(thing_name: str, projection: Optional[FieldProjection] = None) -> Dict[str, Any]:
+    """Get device details from IoT Core.
+    
+    Args:
+        thing_name: The IoT thing name
+        projection: Requested fields; all fields are resolved when omitted
+        
+    Returns:
+        Device information dictionary
+    """
+    if projection is None:
+        projection = FieldProjection(None, DEVICE_FIELD_DEPENDENCIES)
+    logger.debug("Getting thing details", extra={"thingName": thing_name, "projection": repr(projection)})
+    
+    details = build_device_details(thing_name, fetch_device_sources(thing_name, projection))
     
     logger.debug("Got device details", extra={"thingName": thing_name, "connected": details["connected"]})
     return details
 
+def fetch_device_sources_batch(thing_names: List[str], projection: FieldProjection) -> Dict[str, Dict[str, Any]]:
+    """Fetch the sources of many devices with coalesced AWS calls.
+    
+    Duplicate names are fetched once, index documents for the whole batch
+    come from OR-ed search_index queries, and the per-thing calls
+    (describe_thing, thing groups, shadow) run concurrently.
+    
+    Args:
+        thing_names: The IoT thing names
+        projection: Requested fields, shared by every item of the batch
+        
+    Returns:
+        Dictionary of thing name to the sources for that thing
+    """
+    names = list(dict.fromkeys(thing_names))
+    sources = {
+        name: {"thing": {}, "index_status": None, "document": None, "groups": [], "shadow": None}
+        for name in names
+    }
+    
+    if projection.needs("fleet_index") or projection.needs("connection_status"):
+        index_status, documents = None, {}
+        try:
+            index_status = get_index_status("AWS_Things")
+        except Exception as e:
+            logger.warning(f"Could not check fleet index status: {str(e)}")
+        if index_status != INDEX_NOT_ENABLED:
+            documents = search_thing_documents(names)
+        for name in names:
+            sources[name]["index_status"] = index_status
+            sources[name]["document"] = documents.get(name)
+    
+    tasks = []
+    if projection.needs("describe_thing"):
+        tasks.extend(("thing", describe_thing, name) for name in names)
+    if projection.needs("thing_groups"):
+        tasks.extend(("groups", get_thing_groups, name) for name in names)
+    if projection.needs("shadow"):
+        tasks.extend(("shadow", _fetch_shadow_state, name) for name in names)
+    
+    if tasks:
+        with ThreadPoolExecutor(max_workers=min(BATCH_FETCH_WORKERS, len(tasks))) as executor:
+            futures = [(key, name, executor.submit(func, name)) for key, func, name in tasks]
+            for key, name, future in futures:
+                sources[name][key] = future.result()
+    
+    return sources
+
+def handle_batch(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Handle an AppSync BatchInvoke request for getDevice.
+    
+    Args:
+        events: AppSync resolver events, one per batched field
+        
+    Returns:
+        One AppSync resolver response per event, in request order
+    """
+    thing_names = [
+        (item.get("arguments") or {}).get("thingName") or (item.get("source") or {}).get("thingName")
+        for item in events
+    ]
+    projection = FieldProjection.from_event(events[0] if events else {}, DEVICE_FIELD_DEPENDENCIES)
+    logger.debug("Getting batch of thing details", extra={"count": len(events), "projection": repr(projection)})
+    
+    sources = fetch_device_sources_batch([name for name in thing_names if name], projection)
+    
+    responses = []
+    for thing_name in thing_names:
+        if not thing_name:
+            responses.append(create_error_response("Missing required argument: thingName"))
+            continue
+        try:
+            responses.append(create_response(build_device_details(thing_name, sources[thing_name])))
+        except Exception as error:
+            logger.exception(f"Failed to build device details for {thing_name}")
+            responses.append(create_error_response(error))
+    return responses
+
 @tracer.capture_lambda_handler
 @logger.inject_lambda_context(log_event=True)
 @metrics.log_metrics(capture_cold_start_metric=True)
-def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
+def handler(
+    event: Union[Dict[str, Any], List[Dict[str, Any]]],
+    context: LambdaContext
+) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
     """
     Handle AppSync resolver request for getting a device.
     
     Args:
-        event: AppSync resolver event
+        event: AppSync resolver event, or a list of them for BatchInvoke
         context: Lambda context
         
     Returns:
-        AppSync resolver response
+        AppSync resolver response, or a list of them for BatchInvoke
     """
     add_monitoring_details({"function_name": context.function_name})
     
+    # BatchInvoke sends a list of events and expects a list of responses
+    if isinstance(event, list):
+        try:
+            return handle_batch(event)
+        except Exception as error:
+            logger.exception("Batch resolver execution failed")
+            return [create_error_response(error) for _ in event]
+    
     try:
         # Extract thing name from arguments
         thing_name = event.get("arguments", {}).get("thingName")
@@ -127,7 +332,8 @@ def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
             return create_error_response("Missing required argument: thingName")
         
         # Get device details
-        result = get_device_details(thing_name)
+        projection = FieldProjection.from_event(event, DEVICE_FIELD_DEPENDENCIES)
+        result = get_device_details(thing_name, projection)
         
         # Return successful response
         return create_response(result)
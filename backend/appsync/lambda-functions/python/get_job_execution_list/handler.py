@@ -20,14 +20,14 @@ under the License.
 """Lambda handler for get-job-execution-list resolver."""
 from typing import Any, Dict, List, Optional
 
-import boto3
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from shared_lib.powertools import logger, tracer, metrics
+from shared_lib.aws_clients import lazy_client
 from shared_lib.appsync_utils import create_response, create_error_response
 
-# Initialize IoT client
-iot_client = boto3.client('iot')
+# IoT client, created on first use
+iot_client = lazy_client('iot')
 
 def get_job_executions_for_job(
     job_id: str,
@@ -19,32 +19,258 @@ under the License.
 
 """Lambda handler for get-latest-stats resolver."""
 import os
-import json
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-import boto3
-from boto3.dynamodb.conditions import Key
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from shared_lib.powertools import logger, tracer, metrics
+from shared_lib.aws_clients import lazy_resource
 from shared_lib.appsync_utils import create_response, create_error_response
+from shared_lib.fleet_counters import FLEET_COUNTERS_TABLE, read_fleet_counters
+from shared_lib.stats_records import (
+    DISTRIBUTION_FIELDS,
+    LATEST_STATS_KEY,
+    decode_distribution,
+    from_pointer_item
+)
 
-# Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+# DynamoDB client, created on first use
+dynamodb = lazy_resource('dynamodb')
 
-def get_latest_stats() -> Dict[str, Any]:
+# Pointer attributes every read needs; distributions are projected as requested
+POINTER_FIELDS = ["latestRecordTime", "registeredDevices", "connectedDevices", "disconnectedDevices"]
+
+# Seconds a warm container serves its cached stats without checking the pointer
+CACHE_MAX_AGE_SECONDS = float(os.environ.get("LATEST_STATS_CACHE_SECONDS", "15"))
+
+# Decoded stats kept between invocations of a warm container, keyed on
+# recordTime, and the distributions loaded into them so far
+_cached_stats: Optional[Dict[str, Any]] = None
+_cached_fields: Set[str] = set()
+_cached_stats_checked_at = 0.0
+
+# Counts the event-driven fleet counters keep current
+COUNT_FIELDS = ["registeredDevices", "connectedDevices", "disconnectedDevices"]
+
+# Fleet counters kept between invocations, read again after CACHE_MAX_AGE_SECONDS
+_cached_counters: Optional[Dict[str, Any]] = None
+_cached_counters_read_at = 0.0
+
+def query_latest_stats(table: Any) -> Optional[Dict[str, Any]]:
+    """
+    Find the newest stats row with the latest record index.
+    
+    Only needed until the stats monitor has written the pointer item.
+    
+    Args:
+        table: Device stats table
+        
+    Returns:
+        Newest stats row, or None if there is none
+    """
+    from boto3.dynamodb.conditions import Key
+    
+    index_name = os.environ.get("DEVICE_STATS_INDEX")
+    
+    # Query parameters
+    query_params = {
+        "KeyConditionExpression": Key("status").eq("LATEST"),
+        "Limit": 1,
+        "ScanIndexForward": False
+    }
+    
+    # Add index if provided
+    if index_name:
+        query_params["IndexName"] = index_name
+    
+    # Query the table
+    response = table.query(**query_params)
+    items = response.get("Items") or []
+    return items[0] if items else None
+
+def decode_stats(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Decode the stored distributions of a stats row.
+    
+    Args:
+        item: Stats row, updated in place
+        
+    Returns:
+        The same stats row
+    """
+    for field in DISTRIBUTION_FIELDS:
+        if field in item:
+            try:
+                item[field] = decode_distribution(item[field])
+            except ValueError:
+                logger.warning(f"Failed to decode {field}, using empty object")
+                item[field] = {}
+    return item
+
+def requested_distributions(event: Dict[str, Any]) -> List[str]:
+    """
+    Find the distributions selected by the GraphQL query.
+    
+    Args:
+        event: AppSync resolver event
+        
+    Returns:
+        Selected distribution fields, or all of them without selection info
+    """
+    selection = (event.get("info") or {}).get("selectionSetList")
+    if not selection:
+        return DISTRIBUTION_FIELDS
+    return [field for field in DISTRIBUTION_FIELDS if field in selection]
+
+def read_latest_stats(table: Any, distributions: List[str]) -> Tuple[Optional[Dict[str, Any]], Set[str]]:
+    """
+    Read the latest stats with the given distributions.
+    
+    Args:
+        table: Device stats table
+        distributions: Distribution fields to read
+        
+    Returns:
+        Tuple of the decoded stats, or None if there are none, and the
+        distributions they hold
+    """
+    response = table.get_item(
+        Key={"recordTime": LATEST_STATS_KEY},
+        ConsistentRead=True,
+        ProjectionExpression=", ".join(POINTER_FIELDS + distributions)
+    )
+    pointer = response.get("Item")
+    if pointer:
+        return decode_stats(from_pointer_item(pointer)), set(distributions)
+    
+    item = query_latest_stats(table)
+    if not item:
+        return None, set()
+    return decode_stats(item), set(DISTRIBUTION_FIELDS)
+
+def load_latest_stats(table: Any, distributions: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Load the latest decoded stats, reusing the warm container's copy.
+    
+    The cached copy is served as is for CACHE_MAX_AGE_SECONDS. After that
+    only the pointer's recordTime is read, and the cache is dropped when the
+    monitor has written a newer snapshot. Distributions missing from the
+    cache are read with a projection of just those attributes; if the
+    pointer has moved on in the meantime, every requested distribution is
+    read again for the new snapshot.
+    
+    Args:
+        table: Device stats table
+        distributions: Distribution fields the caller needs
+        
+    Returns:
+        Latest decoded stats, with at least the requested distributions, or
+        None if there are none. Callers must not modify it.
+    """
+    global _cached_stats, _cached_fields, _cached_stats_checked_at
+    
+    now = time.monotonic()
+    if _cached_stats is not None and now - _cached_stats_checked_at >= CACHE_MAX_AGE_SECONDS:
+        # One strongly consistent read of the pointer's record time
+        response = table.get_item(
+            Key={"recordTime": LATEST_STATS_KEY},
+            ConsistentRead=True,
+            ProjectionExpression="latestRecordTime"
+        )
+        record_time = (response.get("Item") or {}).get("latestRecordTime")
+        if record_time == _cached_stats["recordTime"]:
+            logger.debug(f"Cached stats from {record_time} are still the latest")
+            _cached_stats_checked_at = now
+        else:
+            _cached_stats = None
+    
+    missing = [field for field in distributions if _cached_stats is None or field not in _cached_fields]
+    if _cached_stats is not None and not missing:
+        return _cached_stats
+    
+    item, fields = read_latest_stats(table, missing)
+    if item is None:
+        return None
+    
+    if _cached_stats is not None and _cached_stats["recordTime"] != item["recordTime"] and not fields >= set(distributions):
+        # The cached distributions belong to an older snapshot
+        logger.debug(f"Latest stats moved on to {item['recordTime']}, reading all requested distributions")
+        item, fields = read_latest_stats(table, distributions)
+        if item is None:
+            return None
+    
+    if _cached_stats is not None and _cached_stats["recordTime"] == item["recordTime"]:
+        _cached_stats.update(item)
+        _cached_fields |= fields
+    else:
+        _cached_stats = item
+        _cached_fields = fields
+        _cached_stats_checked_at = now
+    return _cached_stats
+
+def load_fleet_counters() -> Dict[str, Any]:
+    """
+    Read the event-driven fleet counters, reusing the warm container's copy.
+    
+    Returns:
+        Counters in the shape of a device stats record. Callers must not
+        modify them.
+    """
+    global _cached_counters, _cached_counters_read_at
+    
+    now = time.monotonic()
+    if _cached_counters is None or now - _cached_counters_read_at >= CACHE_MAX_AGE_SECONDS:
+        _cached_counters = read_fleet_counters(FLEET_COUNTERS_TABLE)
+        _cached_counters_read_at = now
+    return _cached_counters
+
+def unchanged_stats(item: Dict[str, Any], distributions: List[str]) -> Dict[str, Any]:
+    """
+    Build the short response for a client that already has the latest stats.
+    
+    Distributions are returned as empty placeholders to satisfy the schema;
+    the client keeps the copy it has.
+    
+    Args:
+        item: Latest decoded stats
+        distributions: Distribution fields the client selected
+        
+    Returns:
+        Stats with status UNCHANGED and no distribution data
+    """
+    result = {
+        "status": "UNCHANGED",
+        "recordTime": item["recordTime"],
+        **{field: item.get(field, 0) for field in COUNT_FIELDS}
+    }
+    for field in distributions:
+        result[field] = {}
+    return result
+
+def get_latest_stats(
+    known_record_time: Optional[str] = None,
+    distributions: Optional[List[str]] = None
+) -> Dict[str, Any]:
     """
     Get latest device statistics from DynamoDB.
     
+    Args:
+        known_record_time: Record time of the stats the client already has
+        distributions: Distribution fields to return, all of them by default
+        
     Returns:
-        Latest device statistics or error response
+        Latest device statistics, an UNCHANGED response if they are the
+        client's, or error response
     """
     logger.debug("Getting latest device stats")
     
+    if distributions is None:
+        distributions = DISTRIBUTION_FIELDS
+    
     try:
-        # Get table and index names from environment variables
+        # Get table name from environment variables
         table_name = os.environ.get("DEVICE_STATS_TABLE")
-        index_name = os.environ.get("DEVICE_STATS_INDEX")
         
         if not table_name:
             raise ValueError("DEVICE_STATS_TABLE environment variable is not set")
@@ -52,22 +278,10 @@ def get_latest_stats() -> Dict[str, Any]:
         # Get the table
         table = dynamodb.Table(table_name)
         
-        # Query parameters
-        query_params = {
-            "KeyConditionExpression": Key("status").eq("LATEST"),
-            "Limit": 1,
-            "ScanIndexForward": False
-        }
-        
-        # Add index if provided
-        if index_name:
-            query_params["IndexName"] = index_name
-        
-        # Query the table
-        response = table.query(**query_params)
+        latest = load_latest_stats(table, distributions)
         
         # Check if any items were found
-        if not response.get("Items") or len(response["Items"]) == 0:
+        if not latest:
             return {
                 "errors": [
                     {
@@ -77,30 +291,30 @@ def get_latest_stats() -> Dict[str, Any]:
                 ]
             }
         
-        # Get the first item
-        item = response["Items"][0]
-        
-        # Parse JSON string fields into objects
-        json_fields = [
-            "brandNameDistribution", 
-            "countryDistribution", 
-            "productTypeDistribution",
-            "disconnectDistribution",
-            "groupDistribution",
-            "deviceTypeDistribution",
-            "versionDistribution"
-        ]
-
-        for field in json_fields:
-            if field in item and isinstance(item[field], str):
-                try:
-                    item[field] = json.loads(item[field])
-                    logger.debug(f"Parsed {field} from JSON string to object", extra={
-                        f"{field}": item[field]
-                    })
-                except json.JSONDecodeError:
-                    logger.warning(f"Failed to parse {field} as JSON, using empty object")
-                    item[field] = {}
+        # Event-driven counters are fresher than the last scan
+        counters = None
+        if FLEET_COUNTERS_TABLE:
+            try:
+                counters = load_fleet_counters()
+                if counters["registeredDevices"] <= 0:
+                    counters = None
+            except Exception as e:
+                logger.warning(f"Failed to read fleet counters, using last scan: {str(e)}")
+        
+        # Distributions taken from the counters change between snapshots, so
+        # a client's copy of them is never known to be current
+        live_distributions = counters is not None and any(field in counters for field in distributions)
+        
+        if known_record_time and known_record_time == latest["recordTime"] and not live_distributions:
+            item = unchanged_stats(latest, distributions)
+        else:
+            item = dict(latest)
+        
+        if counters is not None:
+            # Only the counts and the selected distributions; an unchanged
+            # response stays small and carries only the counts
+            fields = COUNT_FIELDS if item["status"] == "UNCHANGED" else COUNT_FIELDS + distributions
+            item.update((field, counters[field]) for field in fields if field in counters)
         
         logger.debug("Got latest device stats", extra={"stats": item})
         return {"data": item}
@@ -131,8 +345,9 @@ def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
         AppSync resolver response with latest device statistics
     """
     try:
-        # Get latest stats
-        result = get_latest_stats()
+        # Get latest stats, unless the client already has them
+        known_record_time = event.get("arguments", {}).get("knownRecordTime")
+        result = get_latest_stats(known_record_time, requested_distributions(event))
         
         # Return the result directly as it's already in the correct format
         return result
@@ -21,14 +21,14 @@ under the License.
 import json
 from typing import Any, Dict
 
-import boto3
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from shared_lib.powertools import logger, tracer, metrics
+from shared_lib.aws_clients import lazy_client
 from shared_lib.appsync_utils import create_response, create_error_response
 
-# Initialize IoT Data client
-iot_data_client = boto3.client('iot-data')
+# IoT Data client, created on first use
+iot_data_client = lazy_client('iot-data')
 
 def get_retained_topic(thing_name: str, topic_name: str) -> Dict[str, Any]:
     """
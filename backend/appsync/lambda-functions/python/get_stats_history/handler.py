@@ -0,0 +1,118 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Lambda handler for get-stats-history resolver."""
+import os
+import datetime
+from typing import Any, Dict, List, Optional
+
+from aws_lambda_powertools.utilities.typing import LambdaContext
+
+from shared_lib.powertools import logger, tracer, metrics
+from shared_lib.aws_clients import lazy_resource
+from shared_lib.appsync_utils import create_response, create_error_response
+from shared_lib.pagination import iter_items
+from shared_lib.stats_history import HISTORY_SERIES, decode_history, downsample, normalize_time
+
+# Points returned when maxPoints is not given, and the most allowed
+DEFAULT_MAX_POINTS = 500
+MAX_POINTS = 2000
+
+# DynamoDB client, created on first use
+dynamodb = lazy_resource('dynamodb')
+
+def get_stats_history(start: str, end: str, max_points: int) -> List[Dict[str, Any]]:
+    """
+    Get device statistics snapshots for a time range.
+    
+    The whole range is one query on the series index, starting from the
+    beginning of the first day so its keyframe is available for decoding.
+    
+    Args:
+        start: Start of the range, in recordTime format
+        end: End of the range, in recordTime format
+        max_points: Largest number of snapshots to return
+        
+    Returns:
+        Snapshots in time order, downsampled to max_points
+    """
+    from boto3.dynamodb.conditions import Key
+    
+    logger.debug("Getting stats history", extra={"start": start, "end": end, "maxPoints": max_points})
+    
+    table_name = os.environ.get("STATS_HISTORY_TABLE")
+    index_name = os.environ.get("STATS_HISTORY_INDEX")
+    if not table_name or not index_name:
+        raise ValueError("STATS_HISTORY_TABLE and STATS_HISTORY_INDEX environment variables must be set")
+    
+    table = dynamodb.Table(table_name)
+    records = iter_items(
+        table.query,
+        "Items",
+        "LastEvaluatedKey",
+        "ExclusiveStartKey",
+        IndexName=index_name,
+        KeyConditionExpression=Key("series").eq(HISTORY_SERIES) & Key("recordTime").between(start[:10], end)
+    )
+    
+    points = [
+        {"status": "HISTORY", **point}
+        for point in decode_history(records)
+        if point["recordTime"] >= start
+    ]
+    
+    logger.debug("Got stats history", extra={"count": len(points)})
+    return downsample(points, max_points)
+
+@tracer.capture_lambda_handler
+@logger.inject_lambda_context(log_event=True)
+@metrics.log_metrics(capture_cold_start_metric=True)
+def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
+    """
+    Handle AppSync resolver request for getting device statistics history.
+    
+    Args:
+        event: AppSync resolver event
+        context: Lambda context
+        
+    Returns:
+        AppSync resolver response with the snapshots in the range
+    """
+    try:
+        # Extract arguments
+        arguments = event.get("arguments", {})
+        start = normalize_time(arguments["start"])
+        end_str: Optional[str] = arguments.get("end")
+        end = normalize_time(end_str) if end_str else normalize_time(datetime.datetime.now(datetime.timezone.utc).isoformat())
+        max_points = min(arguments.get("maxPoints") or DEFAULT_MAX_POINTS, MAX_POINTS)
+        
+        if max_points < 1:
+            return create_error_response(ValueError("maxPoints must be at least 1"))
+        
+        return create_response(get_stats_history(start, end, max_points))
+    
+    except Exception as error:
+        # Log the error
+        logger.exception("Resolver execution failed")
+        
+        # Return error response
+        return create_error_response(error)
+
+# Entry point for AWS Lambda
+lambda_handler = handler
@@ -20,14 +20,15 @@ under the License.
 """Lambda handler for get-thing-group-list resolver."""
 from typing import Any, Dict, List, Optional
 
-import boto3
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from shared_lib.powertools import logger, tracer, metrics
+from shared_lib.aws_clients import lazy_client
+from shared_lib.pagination import iter_items
 from shared_lib.appsync_utils import create_response, create_error_response
 
-# Initialize IoT client
-iot_client = boto3.client('iot')
+# IoT client, created on first use
+iot_client = lazy_client('iot')
 
 def list_thing_groups() -> List[str]:
     """
@@ -38,31 +39,12 @@ def list_thing_groups() -> List[str]:
     """
     logger.debug("Getting all thing groups")
     
-    groups = []
-    next_token = None
-    
     try:
-        while True:
-            # Prepare request parameters
-            params = {
-                "recursive": True
-            }
-            
-            if next_token:
-                params["nextToken"] = next_token
-            
-            # Get thing groups
-            result = iot_client.list_thing_groups(**params)
-            
-            # Extract group names
-            for group in result.get("thingGroups", []):
-                if "groupName" in group:
-                    groups.append(group["groupName"])
-            
-            # Check for pagination
-            next_token = result.get("nextToken")
-            if not next_token:
-                break
+        groups = [
+            group["groupName"]
+            for group in iter_items(iot_client.list_thing_groups, "thingGroups", recursive=True)
+            if "groupName" in group
+        ]
         
         logger.debug("Got all thing groups", extra={"count": len(groups)})
         return groups
@@ -18,122 +18,120 @@ under the License.
 """
 
 """Lambda handler for get-thing-list resolver."""
-import json
+import os
 from typing import Any, Dict, List, Optional
 
+from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from shared_lib.powertools import logger, tracer, metrics
+from shared_lib.aws_clients import lazy_client
 from shared_lib.appsync_utils import create_response, create_error_response
-from shared_lib.iot_utils import get_device_connection_status
-import boto3
+from shared_lib.query_compiler import compile_query
+from shared_lib.cache_utils import TTLCache
+from shared_lib.iot_utils import get_device_connection_statuses
+from shared_lib.shadow_utils import extract_firmware_from_shadow
+from shared_lib.projection import FieldProjection
 
-# Initialize IoT client
-iot_client = boto3.client('iot')
+# IoT client, created on first use
+iot_client = lazy_client('iot')
 
-def concat_filters(filter_resolver_input: Optional[Dict[str, Any]]) -> str:
+# Work each ThingSummary field depends on beyond the search_index page itself
+THING_SUMMARY_FIELD_DEPENDENCIES = {
+    "connected": ["connection_status"],
+    "firmwareType": ["firmware"],
+    "firmwareVersion": ["firmware"]
+}
+
+# Page cache TTLs in seconds; queries on connectivity go stale fastest
+PAGE_CACHE_TTL_SECONDS = float(os.environ.get("PAGE_CACHE_TTL_SECONDS", "15"))
+PAGE_CACHE_CONNECTIVITY_TTL_SECONDS = float(os.environ.get("PAGE_CACHE_CONNECTIVITY_TTL_SECONDS", "5"))
+
+# Result pages cached by the warm container, keyed by (query, nextToken, limit, work)
+page_cache = TTLCache(
+    max_bytes=int(os.environ.get("PAGE_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+    default_ttl=PAGE_CACHE_TTL_SECONDS
+)
+
+def get_page_cache_ttl(query_string: str) -> float:
     """
-    Convert filter input to IoT query string.
+    Get the page cache TTL for a compiled query.
     
     Args:
-        filter_resolver_input: Filter resolver input from GraphQL
+        query_string: Compiled IoT query string
         
     Returns:
-        IoT query string
+        TTL in seconds
     """
-    if not filter_resolver_input:
-        return "*"
-    
-    is_filtered_to_favorites = False
-    filters_without_favorites = []
-    
-    if filter_resolver_input.get("filters"):
-        for filter_input in filter_resolver_input.get("filters", []):
-            if filter_input.get("fieldName") == "favorite":
-                is_filtered_to_favorites = True
-            else:
-                filters_without_favorites.append(filter_input)
-    
-    favorite_devices_query = []
-    if (is_filtered_to_favorites and 
-        filter_resolver_input.get("favoriteDevices") and 
-        len(filter_resolver_input.get("favoriteDevices", [])) > 0):
-        favorite_devices = " OR ".join(filter_resolver_input.get("favoriteDevices", []))
-        favorite_devices_query = [f"thingName = ({favorite_devices})"]
-    
-    filters_query = ""
-    if filters_without_favorites:
-        operation = filter_resolver_input.get("operation", "and").upper()
-        filter_strings = []
-        
-        for filter_input in filters_without_favorites:
-            filter_strings.append(construct_query_string(filter_input))
-        
-        filters_query = f") {operation} (".join(filter_strings)
-    
-    if filters_query:
-        operation = filter_resolver_input.get("operation", "and").upper()
-        query = f") {operation} (".join([*favorite_devices_query, filters_query]) if favorite_devices_query else filters_query
-    else:
-        query = "".join(favorite_devices_query)
-    
-    logger.debug("Query string", extra={"query": f"({query})" if query else "*"})
-    return f"({query})" if query else "*"
+    if "connectivity." in query_string:
+        return PAGE_CACHE_CONNECTIVITY_TTL_SECONDS
+    return PAGE_CACHE_TTL_SECONDS
 
-def construct_query_string(filter_input: Dict[str, Any]) -> str:
+def get_thing_list(
+    filter_input: Optional[Dict[str, Any]],
+    max_results: Optional[int],
+    next_token: Optional[str],
+    projection: Optional[FieldProjection] = None
+) -> Dict[str, Any]:
     """
-    Construct query string from filter input.
+    Get list of things from IoT Core, served from the page cache when fresh.
     
     Args:
         filter_input: Filter input
+        max_results: Maximum number of results to return
+        next_token: Token for pagination
+        projection: Requested ThingSummary fields; all are resolved when omitted
         
     Returns:
-        Query string
+        List of things
     """
-    field_name = filter_input.get("fieldName", "")
-    operator = filter_input.get("operator", "")
-    value = filter_input.get("value")
-    
-    operator_mapping = {
-        "none": "",
-        "eq": ":",
-        "ne": ":",
-        "le": "<=",
-        "lt": "<",
-        "ge": ">=",
-        "gt": ">",
-        "between": ":",
-        "contains": ":"
-    }
+    logger.debug("Getting thing list", extra={"max_results": max_results, "next_token": next_token})
     
-    if operator == "between" and isinstance(value, list) and len(value) == 2:
-        return f"{field_name} {operator_mapping[operator]} [{value[0]} TO {value[1]}]"
-    elif operator != "between" and value is not None and not isinstance(value, dict):
-        prefix = "NOT " if operator == "ne" else ""
-        suffix = "*" if operator == "contains" else ""
-        return f"{prefix}{field_name}{operator_mapping[operator]}{value}{suffix}"
-    else:
-        raise ValueError("Invalid filter")
+    if projection is None:
+        projection = FieldProjection(None, THING_SUMMARY_FIELD_DEPENDENCIES)
+    
+    query_string = compile_query(filter_input)
+    limit = min(max_results or 250, 250)
+    cache_key = (query_string, next_token, limit, projection.required_work)
+    
+    page = page_cache.get(cache_key)
+    if page is not None:
+        metrics.add_metric(name="ThingListCacheHit", unit=MetricUnit.Count, value=1)
+        logger.debug("Thing list served from page cache", extra={"cache_stats": page_cache.stats})
+        return page
+    
+    metrics.add_metric(name="ThingListCacheMiss", unit=MetricUnit.Count, value=1)
+    page = search_thing_page(query_string, limit, next_token, projection)
+    
+    evicted = page_cache.set(cache_key, page, ttl=get_page_cache_ttl(query_string))
+    if evicted:
+        metrics.add_metric(name="ThingListCacheEviction", unit=MetricUnit.Count, value=evicted)
+    
+    return page
 
-def get_thing_list(filter_input: Optional[Dict[str, Any]], max_results: Optional[int], next_token: Optional[str]) -> Dict[str, Any]:
+def search_thing_page(
+    query_string: str,
+    limit: int,
+    next_token: Optional[str],
+    projection: FieldProjection
+) -> Dict[str, Any]:
     """
-    Get list of things from IoT Core.
+    Search one page of things in the fleet index.
     
     Args:
-        filter_input: Filter input
-        max_results: Maximum number of results to return
+        query_string: Compiled IoT query string
+        limit: Maximum number of results to return
         next_token: Token for pagination
+        projection: Requested ThingSummary fields
         
     Returns:
         List of things
     """
-    logger.debug("Getting thing list", extra={"max_results": max_results, "next_token": next_token})
-    
     # Prepare search parameters
     search_params = {
         "indexName": "AWS_Things",
-        "queryString": concat_filters(filter_input),
-        "maxResults": min(max_results or 250, 250)
+        "queryString": query_string,
+        "maxResults": limit
     }
     
     if next_token:
@@ -142,39 +140,33 @@ def get_thing_list(filter_input: Optional[Dict[str, Any]], max_results: Optional
     # Search IoT index
     result = iot_client.search_index(**search_params)
     
+    things = result.get("things", [])
+    
+    # Resolve connection status for the whole page at once
+    connection_statuses = {}
+    if projection.needs("connection_status"):
+        connection_statuses = get_device_connection_statuses(
+            [thing.get("thingName", "") for thing in things],
+            things=things
+        )
+    include_firmware = projection.needs("firmware")
+    
     # Process results
     items = []
-    for thing in result.get("things", []):
+    for thing in things:
         # Extract shadow information if available
         firmware_type = None
         firmware_version = None
         
-        if thing.get("shadow"):
-            try:
-                shadow_json = json.loads(thing["shadow"])
-                package_shadow = (
-                    shadow_json.get("name", {})
-                    .get("$package", {})
-                    .get("state", {})
-                    .get("reported", {})
-                )
-                
-                if package_shadow:
-                    firmware_type = list(package_shadow.keys())[0] if package_shadow else None
-                    firmware_version = (
-                        list(package_shadow.values())[0].get("version")
-                        if package_shadow and list(package_shadow.values())
-                        else None
-                    )
-            except (json.JSONDecodeError, IndexError, KeyError) as e:
-                logger.warning(f"Failed to parse shadow JSON: {e}")
+        if include_firmware and thing.get("shadow"):
+            firmware_type, firmware_version = extract_firmware_from_shadow(thing["shadow"])
         
         # Create thing summary
         # Get the raw connection status from the thing data
         raw_connected = thing.get("connectivity", {}).get("connected", False)
         
-        # Get connection status using the consistent function
-        connected_value = get_device_connection_status(thing.get("thingName", ""))
+        # Get connection status resolved for the page
+        connected_value = connection_statuses.get(thing.get("thingName", ""), False)
         
         # Log both values for debugging
         logger.debug(f"Thing {thing.get('thingName', '')}: raw_connected={raw_connected}, consistent_connected={connected_value}")
@@ -223,8 +215,11 @@ def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
         limit = event.get("arguments", {}).get("limit")
         next_token = event.get("arguments", {}).get("nextToken")
         
+        # Only derive the fields the query selected
+        projection = FieldProjection.from_event(event, THING_SUMMARY_FIELD_DEPENDENCIES, prefix="items/")
+        
         # Get thing list
-        result = get_thing_list(filter_input, limit, next_token)
+        result = get_thing_list(filter_input, limit, next_token, projection)
         
         # Return successful response
         return create_response(result)
@@ -0,0 +1,135 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Shared AWS client registry for Lambda resolvers.
+
+Clients are created on first use and reused for the life of the container,
+one per (service, region), so endpoint resolution and TLS connections are
+shared by every caller. The connection pool is sized for the concurrent
+fan-out paths (batched shadow lookups, get_device) and retries use botocore's
+standard or adaptive mode.
+
+boto3 itself is imported on first client creation, and module-level client
+names can be bound with lazy_client/lazy_resource so that importing a
+handler never constructs a client.
+"""
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# Connections per client; must cover the largest thread pool using a client
+MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "50"))
+
+# botocore retry mode ("standard" or "adaptive") and attempts including the first call
+RETRY_MODE = os.environ.get("AWS_CLIENT_RETRY_MODE", "standard")
+MAX_ATTEMPTS = int(os.environ.get("AWS_CLIENT_MAX_ATTEMPTS", "5"))
+
+_clients: Dict[Tuple[str, Optional[str]], Any] = {}
+_resources: Dict[Tuple[str, Optional[str]], Any] = {}
+# boto3's default session is not safe for concurrent client creation
+_lock = threading.Lock()
+
+def _client_config() -> Any:
+    """Build the botocore Config shared by all clients."""
+    from botocore.config import Config
+    
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        retries={"mode": RETRY_MODE, "max_attempts": MAX_ATTEMPTS}
+    )
+
+def get_client(service_name: str, region_name: Optional[str] = None) -> Any:
+    """Get the shared low-level client for a service.
+    
+    Args:
+        service_name: AWS service name (e.g. 'iot', 'iot-data')
+        region_name: Region, defaults to the Lambda's region
+        
+    Returns:
+        boto3 client
+    """
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                import boto3
+                
+                client = boto3.client(service_name, region_name=region_name, config=_client_config())
+                _clients[key] = client
+    return client
+
+def get_resource(service_name: str, region_name: Optional[str] = None) -> Any:
+    """Get the shared resource interface for a service.
+    
+    Args:
+        service_name: AWS service name (e.g. 'dynamodb')
+        region_name: Region, defaults to the Lambda's region
+        
+    Returns:
+        boto3 service resource
+    """
+    key = (service_name, region_name)
+    resource = _resources.get(key)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(key)
+            if resource is None:
+                import boto3
+                
+                resource = boto3.resource(service_name, region_name=region_name, config=_client_config())
+                _resources[key] = resource
+    return resource
+
+class LazyClient:
+    """Stand-in for a shared client that creates it on first attribute access.
+    
+    Lets handlers keep module-level names such as ``iot_client`` without
+    paying for boto3 and client construction at import (cold start) time.
+    """
+    
+    def __init__(self, service_name: str, region_name: Optional[str] = None, resource: bool = False):
+        """Initialize the proxy.
+        
+        Args:
+            service_name: AWS service name
+            region_name: Region, defaults to the Lambda's region
+            resource: Proxy the resource interface instead of the client
+        """
+        self._service_name = service_name
+        self._region_name = region_name
+        self._resource = resource
+    
+    def __getattr__(self, name: str) -> Any:
+        getter = get_resource if self._resource else get_client
+        return getattr(getter(self._service_name, self._region_name), name)
+    
+    def __repr__(self) -> str:
+        kind = "resource" if self._resource else "client"
+        return f"LazyClient({self._service_name!r} {kind})"
+
+def lazy_client(service_name: str, region_name: Optional[str] = None) -> Any:
+    """Get a proxy for the shared client that defers its creation to first use."""
+    return LazyClient(service_name, region_name)
+
+def lazy_resource(service_name: str, region_name: Optional[str] = None) -> Any:
+    """Get a proxy for the shared resource that defers its creation to first use."""
+    return LazyClient(service_name, region_name, resource=True)
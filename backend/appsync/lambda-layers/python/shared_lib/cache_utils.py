@@ -0,0 +1,111 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""In-container caches for Lambda resolvers.
+
+Module-level instances survive between invocations of a warm container, so
+they can absorb repeated identical requests without another AWS round trip.
+"""
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+class TTLCache:
+    """LRU cache with per-entry TTL and a total size bound in bytes.
+    
+    Entry size is the length of the value's JSON encoding, which is a close
+    proxy for what the resolver would return to AppSync.
+    """
+    
+    def __init__(self, max_bytes: int, default_ttl: float):
+        """Initialize the cache.
+        
+        Args:
+            max_bytes: Upper bound on the summed size of all entries
+            default_ttl: TTL in seconds used when set() is not given one
+        """
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.current_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, float]]" = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a live entry and mark it most recently used.
+        
+        Args:
+            key: Cache key
+            
+        Returns:
+            Cached value, or None on a miss or an expired entry
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[2] <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.stats["misses"] += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[0]
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> int:
+        """Store an entry, evicting least recently used entries to fit.
+        
+        Values larger than the whole cache are not stored.
+        
+        Args:
+            key: Cache key
+            value: JSON-serializable value
+            ttl: TTL in seconds, defaults to default_ttl
+            
+        Returns:
+            Number of entries evicted to make room
+        """
+        size = len(json.dumps(value, default=str))
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return 0
+        
+        evicted = 0
+        while self._entries and self.current_bytes + size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            evicted += 1
+        
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        self._entries[key] = (value, size, expires_at)
+        self.current_bytes += size
+        self.stats["evictions"] += evicted
+        return evicted
+    
+    def clear(self) -> None:
+        """Drop all entries and reset the counters."""
+        self._entries.clear()
+        self.current_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+    
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
@@ -0,0 +1,70 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Downsampling of chart series.
+
+lttb implements Largest-Triangle-Three-Buckets (Steinarsson, 2013): the
+series is split into equal buckets and from each the point forming the
+largest triangle with the point kept before it and the average of the next
+bucket is kept. Unlike picking evenly spaced points, it keeps the peaks and
+dips a chart reader looks for.
+"""
+from typing import List, Sequence
+
+def lttb(xs: Sequence[float], ys: Sequence[float], max_points: int) -> List[int]:
+    """
+    Pick the points of a series to keep with Largest-Triangle-Three-Buckets.
+    
+    Args:
+        xs: X values in ascending order
+        ys: Y values, as many as xs
+        max_points: Largest number of points to keep
+        
+    Returns:
+        Indices of the kept points in ascending order, always including
+        the first and last point
+    """
+    count = len(xs)
+    if max_points >= count:
+        return list(range(count))
+    if max_points < 3:
+        return [0, count - 1][-max_points:] if max_points > 0 else []
+    
+    bucket_size = (count - 2) / (max_points - 2)
+    selected = [0]
+    previous = 0
+    for bucket in range(max_points - 2):
+        # Average of the next bucket, or the last point for the final bucket
+        next_start = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+        next_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        next_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+        
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        x, y = xs[previous], ys[previous]
+        best = max(
+            range(start, end),
+            key=lambda i: abs((x - next_x) * (ys[i] - y) - (x - xs[i]) * (next_y - y))
+        )
+        selected.append(best)
+        previous = best
+    
+    selected.append(count - 1)
+    return selected
@@ -0,0 +1,216 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Event-driven fleet counters in DynamoDB.
+
+The fleet-event-counter Lambda keeps device counts and attribute
+distributions current from IoT presence and registry events. Each counter is
+one item, updated with atomic ADDs:
+
+    pk="fleet",                   sk="registeredDevices" | "connectedDevices"
+    pk=<distribution name>,       sk=<bucket value>
+
+Alongside them, pk="thing#<thingName>", sk="state" holds the last state
+counted for each thing, so every event can be turned into counter deltas and
+duplicate or out-of-order events can be dropped. The device-stats-monitor
+periodically compares the counters with the totals of a full scan and
+corrects the ones that drifted.
+"""
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from shared_lib.aws_clients import lazy_resource
+from shared_lib.pagination import iter_items
+
+# Counters table, unset when event-driven counters are not deployed
+FLEET_COUNTERS_TABLE = os.environ.get("FLEET_COUNTERS_TABLE")
+
+# Partition of the fleet-wide device counts
+FLEET_PARTITION = "fleet"
+
+# Sort key of per-thing state items
+THING_STATE_SORT_KEY = "state"
+
+# Attribute distributions kept as counters, by the thing attribute behind each
+ATTRIBUTE_DISTRIBUTIONS = {
+    "brandNameDistribution": "brandName",
+    "countryDistribution": "country",
+    "productTypeDistribution": "productType",
+    "deviceTypeDistribution": "deviceType"
+}
+
+# Every distribution kept as counters; group membership is left to the scan
+COUNTED_DISTRIBUTIONS = [*ATTRIBUTE_DISTRIBUTIONS, "disconnectDistribution", "versionDistribution"]
+
+# DynamoDB resource, created on first use
+dynamodb = lazy_resource('dynamodb')
+
+CounterKey = Tuple[str, str]
+
+def thing_state_key(thing_name: str) -> Dict[str, str]:
+    """Key of a thing's state item."""
+    return {"pk": f"thing#{thing_name}", "sk": THING_STATE_SORT_KEY}
+
+def thing_counters(state: Optional[Dict[str, Any]]) -> Dict[CounterKey, int]:
+    """
+    Get the counters one thing contributes to.
+    
+    Buckets follow the device-stats-monitor scan, so counters and scans
+    agree: missing attributes count as "Unknown", and firmware versions are
+    only counted when present.
+    
+    Args:
+        state: The thing's state, or None for an unknown thing
+        
+    Returns:
+        Dictionary of (pk, sk) counter key to contribution
+    """
+    if not state or not state.get("exists"):
+        return {}
+    
+    counters = {(FLEET_PARTITION, "registeredDevices"): 1}
+    if state.get("connected") is True:
+        counters[(FLEET_PARTITION, "connectedDevices")] = 1
+    else:
+        counters[("disconnectDistribution", state.get("disconnectReason") or "Unknown")] = 1
+    
+    attributes = state.get("attributes") or {}
+    for distribution, attribute in ATTRIBUTE_DISTRIBUTIONS.items():
+        counters[(distribution, attributes.get(attribute) or "Unknown")] = 1
+    if attributes.get("firmwareVersion"):
+        counters[("versionDistribution", attributes["firmwareVersion"])] = 1
+    
+    return counters
+
+def counter_deltas(old_state: Optional[Dict[str, Any]], new_state: Optional[Dict[str, Any]]) -> Dict[CounterKey, int]:
+    """
+    Get the counter changes for a thing moving from one state to another.
+    
+    Args:
+        old_state: State before the event
+        new_state: State after the event
+        
+    Returns:
+        Dictionary of (pk, sk) counter key to non-zero delta
+    """
+    deltas = thing_counters(new_state)
+    for key, count in thing_counters(old_state).items():
+        deltas[key] = deltas.get(key, 0) - count
+    return {key: delta for key, delta in deltas.items() if delta}
+
+def read_counts(table_name: str) -> Dict[CounterKey, int]:
+    """
+    Read every fleet and distribution counter, including zero and negative ones.
+    
+    Args:
+        table_name: Counters table
+        
+    Returns:
+        Dictionary of (pk, sk) counter key to count
+    """
+    from boto3.dynamodb.conditions import Key
+    
+    table = dynamodb.Table(table_name)
+    
+    counts: Dict[CounterKey, int] = {}
+    for pk in (FLEET_PARTITION, *COUNTED_DISTRIBUTIONS):
+        for item in iter_items(
+            table.query,
+            "Items",
+            "LastEvaluatedKey",
+            "ExclusiveStartKey",
+            KeyConditionExpression=Key("pk").eq(pk)
+        ):
+            counts[(pk, item["sk"])] = int(item.get("count", 0))
+    
+    return counts
+
+def read_fleet_counters(table_name: str) -> Dict[str, Any]:
+    """
+    Read the current counters in the shape of a device stats record.
+    
+    Args:
+        table_name: Counters table
+        
+    Returns:
+        Device counts and COUNTED_DISTRIBUTIONS, without empty buckets;
+        the firmware distribution is nested under "Firmware" like the
+        device stats record
+    """
+    partitions: Dict[str, Dict[str, int]] = {pk: {} for pk in (FLEET_PARTITION, *COUNTED_DISTRIBUTIONS)}
+    for (pk, sk), count in read_counts(table_name).items():
+        if count > 0:
+            partitions[pk][sk] = count
+    
+    fleet = partitions[FLEET_PARTITION]
+    registered_devices = fleet.get("registeredDevices", 0)
+    connected_devices = fleet.get("connectedDevices", 0)
+    
+    counters = {
+        "registeredDevices": registered_devices,
+        "connectedDevices": connected_devices,
+        "disconnectedDevices": registered_devices - connected_devices
+    }
+    for distribution in COUNTED_DISTRIBUTIONS:
+        counters[distribution] = partitions[distribution]
+    counters["versionDistribution"] = {"Firmware": counters["versionDistribution"]}
+    
+    return counters
+
+def reconcile_fleet_counters(table_name: str, statistics: Dict[str, Any]) -> int:
+    """
+    Correct the counters that drifted from the totals of a full fleet scan.
+    
+    Only counters whose value differs from the scan are written; buckets
+    that have counters but no longer appear in the scan are reset to zero.
+    Events applied while the scan was running may be lost or counted twice
+    until the next reconciliation.
+    
+    Args:
+        table_name: Counters table
+        statistics: Scan totals, with parsed distributions
+        
+    Returns:
+        Number of counters corrected
+    """
+    expected: Dict[CounterKey, int] = {
+        (FLEET_PARTITION, "registeredDevices"): statistics.get("registeredDevices", 0),
+        (FLEET_PARTITION, "connectedDevices"): statistics.get("connectedDevices", 0)
+    }
+    for distribution in COUNTED_DISTRIBUTIONS:
+        buckets = statistics.get(distribution) or {}
+        if distribution == "versionDistribution":
+            buckets = buckets.get("Firmware", {})
+        expected.update({(distribution, value): count for value, count in buckets.items()})
+    
+    current = read_counts(table_name)
+    drifted = {
+        key: expected.get(key, 0)
+        for key in expected.keys() | current.keys()
+        if expected.get(key, 0) != current.get(key, 0)
+    }
+    if not drifted:
+        return 0
+    
+    table = dynamodb.Table(table_name)
+    with table.batch_writer() as batch:
+        for (pk, sk), count in drifted.items():
+            batch.put_item(Item={"pk": pk, "sk": sk, "count": count})
+    
+    return len(drifted)
@@ -18,15 +18,168 @@ under the License.
 """
 
 """IoT utility functions for Lambda resolvers."""
-import boto3
 import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional
 
 from shared_lib.powertools import logger
+from shared_lib.aws_clients import lazy_client
+from shared_lib.shadow_utils import extract_firmware_from_shadow
 
-# Initialize IoT clients
-iot_client = boto3.client('iot')
-iot_data_client = boto3.client('iot-data')
+# IoT clients, created on first use
+iot_client = lazy_client('iot')
+iot_data_client = lazy_client('iot-data')
+
+# Number of thing names OR-ed together in a single search_index query
+CONNECTION_STATUS_CHUNK_SIZE = 50
+
+# Number of concurrent get_thing_shadow calls for the shadow fallback
+SHADOW_FALLBACK_WORKERS = 10
+
+# How long a describe_index result is reused by a warm container
+INDEX_STATUS_TTL_SECONDS = int(os.environ.get("INDEX_STATUS_TTL_SECONDS", "300"))
+
+# Cached status for an index that does not exist (fleet indexing not enabled)
+INDEX_NOT_ENABLED = "NOT_ENABLED"
+
+# Process-wide index status cache: index name -> (status, expiry on the monotonic clock)
+_index_status_cache: Dict[str, tuple] = {}
+index_status_cache_stats = {"hits": 0, "misses": 0}
+
+def get_index_status(index_name: str = "AWS_Things") -> str:
+    """Get the fleet index status, cached for INDEX_STATUS_TTL_SECONDS.
+    
+    A missing index is cached as INDEX_NOT_ENABLED so that containers in
+    accounts without fleet indexing don't retry describe_index per call.
+    Other errors are not cached and are raised to the caller.
+    
+    Args:
+        index_name: The fleet index name
+        
+    Returns:
+        The index status (e.g. "ACTIVE") or INDEX_NOT_ENABLED
+    """
+    cached = _index_status_cache.get(index_name)
+    if cached and cached[1] > time.monotonic():
+        index_status_cache_stats["hits"] += 1
+        return cached[0]
+    
+    index_status_cache_stats["misses"] += 1
+    try:
+        status = iot_client.describe_index(indexName=index_name).get("indexStatus")
+    except iot_client.exceptions.ResourceNotFoundException:
+        status = INDEX_NOT_ENABLED
+    
+    _index_status_cache[index_name] = (status, time.monotonic() + INDEX_STATUS_TTL_SECONDS)
+    logger.debug("Cached fleet index status", extra={
+        "index_name": index_name,
+        "status": status,
+        "cache_stats": index_status_cache_stats
+    })
+    return status
+
+def clear_index_status_cache() -> None:
+    """Drop all cached index statuses and reset the hit/miss counters."""
+    _index_status_cache.clear()
+    index_status_cache_stats["hits"] = 0
+    index_status_cache_stats["misses"] = 0
+
+def search_thing_document(thing_name: str) -> Optional[Dict[str, Any]]:
+    """Get the fleet index document of a thing.
+    
+    Args:
+        thing_name: The IoT thing name
+        
+    Returns:
+        The thing's search_index document, or None if it is not indexed
+    """
+    response = iot_client.search_index(
+        queryString=f"thingName:{thing_name}",
+        indexName="AWS_Things"
+    )
+    
+    logger.debug(f"Search index response for {thing_name}: {json.dumps(response)}")
+    
+    things = response.get("things") or []
+    return things[0] if things else None
+
+def search_thing_documents(thing_names: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Get the fleet index documents of many things.
+    
+    Names are OR-ed together in chunks of CONNECTION_STATUS_CHUNK_SIZE, so
+    the cost is one search_index call per chunk rather than per thing. A
+    failing chunk is logged and its things are left out of the result.
+    
+    Args:
+        thing_names: The IoT thing names
+        
+    Returns:
+        Dictionary of thing name to search_index document for indexed things
+    """
+    documents: Dict[str, Dict[str, Any]] = {}
+    names = [name for name in dict.fromkeys(thing_names) if name]
+    
+    for i in range(0, len(names), CONNECTION_STATUS_CHUNK_SIZE):
+        chunk = names[i:i + CONNECTION_STATUS_CHUNK_SIZE]
+        params = {
+            "indexName": "AWS_Things",
+            "queryString": f"thingName:({' OR '.join(chunk)})",
+            "maxResults": len(chunk)
+        }
+        try:
+            while True:
+                response = iot_client.search_index(**params)
+                for thing in response.get("things", []):
+                    if thing.get("thingName"):
+                        documents[thing["thingName"]] = thing
+                next_token = response.get("nextToken")
+                if not next_token:
+                    break
+                params["nextToken"] = next_token
+        except Exception as e:
+            logger.warning(f"Error searching fleet index for {len(chunk)} things: {str(e)}")
+    
+    return documents
+
+def fleet_index_details_from_document(thing: Dict[str, Any]) -> Dict[str, Any]:
+    """Derive connectivity and firmware details from a fleet index document.
+    
+    Args:
+        thing: The thing's search_index document
+        
+    Returns:
+        Connectivity details dictionary
+    """
+    thing_name = thing.get("thingName")
+    
+    # Log the connectivity information
+    logger.debug(f"Thing connectivity for {thing_name}: {json.dumps(thing.get('connectivity', {}))}")
+    
+    # Extract shadow information if available
+    firmware_type = None
+    firmware_version = None
+    
+    if thing.get("shadow"):
+        firmware_type, firmware_version = extract_firmware_from_shadow(thing["shadow"])
+    
+    # Ensure connected is a proper boolean value
+    connected_value = thing.get("connectivity", {}).get("connected", False)
+    # Force to boolean to ensure consistency
+    connected_value = bool(connected_value)
+    
+    # Create the result and log it
+    result = {
+        "connected": connected_value,  # Use the consistent boolean value
+        "timestamp": thing.get("connectivity", {}).get("timestamp"),
+        "disconnectReason": thing.get("connectivity", {}).get("disconnectReason"),
+        "firmwareType": thing.get("attributes", {}).get("firmwareType") or firmware_type,
+        "firmwareVersion": thing.get("attributes", {}).get("firmwareVersion") or firmware_version,
+    }
+    
+    logger.debug(f"Returning connectivity details for {thing_name}: {json.dumps(result)}")
+    return result
 
 def get_fleet_index_details(thing_name: str) -> Dict[str, Any]:
     """Get connectivity information from fleet indexing.
@@ -39,67 +192,17 @@ def get_fleet_index_details(thing_name: str) -> Dict[str, Any]:
     """
     try:
         # Check if fleet indexing is enabled
-        try:
-            index_status = iot_client.describe_index(indexName="AWS_Things")
-            if index_status.get("indexStatus") != "ACTIVE":
-                logger.warning(f"Fleet indexing is not active: {index_status.get('indexStatus')}")
-                return {"connected": False}
-        except iot_client.exceptions.ResourceNotFoundException:
+        index_status = get_index_status("AWS_Things")
+        if index_status == INDEX_NOT_ENABLED:
             logger.warning("Fleet indexing is not enabled")
             return {"connected": False}
-            
-        response = iot_client.search_index(
-            queryString=f"thingName:{thing_name}",
-            indexName="AWS_Things"
-        )
-        
-        logger.debug(f"Search index response for {thing_name}: {json.dumps(response)}")
-        
-        if response.get("things") and len(response["things"]) > 0:
-            thing = response["things"][0]
-            
-            # Log the connectivity information
-            logger.debug(f"Thing connectivity for {thing_name}: {json.dumps(thing.get('connectivity', {}))}")
-            
-            # Extract shadow information if available
-            firmware_type = None
-            firmware_version = None
-            
-            if thing.get("shadow"):
-                try:
-                    shadow_json = json.loads(thing["shadow"])
-                    package_shadow = (
-                        shadow_json.get("name", {})
-                        .get("$package", {})
-                        .get("state", {})
-                        .get("reported", {})
-                    )
-                    if package_shadow:
-                        firmware_type = list(package_shadow.keys())[0] if package_shadow else None
-                        firmware_version = (
-                            list(package_shadow.values())[0].get("version")
-                            if package_shadow and list(package_shadow.values())
-                            else None
-                        )
-                except (json.JSONDecodeError, IndexError, KeyError) as e:
-                    logger.warning(f"Failed to parse shadow JSON: {e}")
-            
-            # Ensure connected is a proper boolean value
-            connected_value = thing.get("connectivity", {}).get("connected", False)
-            # Force to boolean to ensure consistency
-            connected_value = bool(connected_value)
-            
-            # Create the result and log it
-            result = {
-                "connected": connected_value,  # Use the consistent boolean value
-                "timestamp": thing.get("connectivity", {}).get("timestamp"),
-                "disconnectReason": thing.get("connectivity", {}).get("disconnectReason"),
-                "firmwareType": thing.get("attributes", {}).get("firmwareType") or firmware_type,
-                "firmwareVersion": thing.get("attributes", {}).get("firmwareVersion") or firmware_version,
-            }
-            
-            logger.debug(f"Returning connectivity details for {thing_name}: {json.dumps(result)}")
-            return result
+        if index_status != "ACTIVE":
+            logger.warning(f"Fleet indexing is not active: {index_status}")
+            return {"connected": False}
+        
+        thing = search_thing_document(thing_name)
+        if thing:
+            return fleet_index_details_from_document(thing)
         
         logger.warning(f"No thing found in search index for {thing_name}")
         return {"connected": False}
@@ -141,6 +244,102 @@ def describe_thing(thing_name: str) -> Dict[str, Any]:
         logger.error(f"Could not describe thing {thing_name}: {e}")
         return {"attributes": {}, "thingTypeName": "unknown"}
 
+def _parse_connected(connected_raw: Any) -> bool:
+    """Convert a raw connected value from the index or a shadow to a boolean.
+    
+    Args:
+        connected_raw: Raw connected value (bool or string)
+        
+    Returns:
+        Boolean connection status
+    """
+    if isinstance(connected_raw, str):
+        return connected_raw.lower() == 'true'
+    return bool(connected_raw)
+
+def get_thing_shadow_state(thing_name: str) -> Dict[str, Any]:
+    """Get the classic shadow document of a thing.
+    
+    Args:
+        thing_name: The IoT thing name
+        
+    Returns:
+        Parsed shadow document
+    """
+    response = iot_data_client.get_thing_shadow(thingName=thing_name)
+    return json.loads(response["payload"].read())
+
+def connection_status_from_shadow_state(thing_name: str, shadow_state: Dict[str, Any]) -> bool:
+    """
+    Derive the connection status of a device from its shadow document.
+    
+    Args:
+        thing_name: The IoT thing name
+        shadow_state: Parsed shadow document
+        
+    Returns:
+        Boolean indicating if the device is connected
+    """
+    # Try to get connection status from reported state
+    reported = shadow_state.get("state", {}).get("reported", {})
+    shadow_connected = reported.get("connected")
+    
+    if shadow_connected is not None:
+        connected = _parse_connected(shadow_connected)
+        logger.debug(f"Connection status for {thing_name} from shadow: {connected}")
+        return connected
+        
+    # If no explicit connected status in shadow, check for recent activity
+    last_updated = reported.get("lastUpdatedAt")
+    if last_updated:
+        # Consider connected if updated in the last 5 minutes
+        current_time = int(time.time())
+        time_diff = current_time - last_updated
+        is_recent = time_diff < 300  # 5 minutes
+        
+        logger.debug(f"Connection status for {thing_name} inferred from shadow timestamp: {is_recent} (last updated {time_diff} seconds ago)")
+        return is_recent
+        
+    logger.warning(f"No connection status or timestamp found in shadow for {thing_name}")
+    return False
+
+def _get_connection_status_from_shadow(thing_name: str) -> bool:
+    """
+    Get the connection status for a device from its classic shadow.
+    
+    Args:
+        thing_name: The IoT thing name
+        
+    Returns:
+        Boolean indicating if the device is connected
+    """
+    try:
+        return connection_status_from_shadow_state(thing_name, get_thing_shadow_state(thing_name))
+    except Exception as e:
+        logger.error(f"Error getting connection status from shadow for {thing_name}: {str(e)}")
+        return False
+
+def connection_status_from_document(thing: Dict[str, Any]) -> bool:
+    """
+    Derive the connection status of a device from its fleet index document.
+    
+    Args:
+        thing: The thing's search_index document
+        
+    Returns:
+        Boolean indicating if the device is connected
+    """
+    # Get the connection status
+    connectivity = thing.get("connectivity", {})
+    connected_raw = connectivity.get("connected", False)
+    connected = _parse_connected(connected_raw)
+    
+    # Log detailed information about the connection status
+    logger.debug(f"Connection status for {thing.get('thingName')} from fleet index: raw={connected_raw}, type={type(connected_raw).__name__}, converted={connected}")
+    logger.debug(f"Full connectivity data: {connectivity}")
+    
+    return connected
+
 def get_device_connection_status(thing_name: str) -> bool:
     """
     Get the connection status for a device from the IoT registry.
@@ -156,40 +355,20 @@ def get_device_connection_status(thing_name: str) -> bool:
     try:
         # Check if fleet indexing is enabled and active
         try:
-            index_status = iot_client.describe_index(indexName="AWS_Things")
-            if index_status.get("indexStatus") != "ACTIVE":
-                logger.warning(f"Fleet indexing is not active: {index_status.get('indexStatus')}")
+            index_status = get_index_status("AWS_Things")
+            if index_status != "ACTIVE":
+                logger.warning(f"Fleet indexing is not active: {index_status}")
                 # Continue to try search anyway
         except Exception as e:
             logger.warning(f"Could not check fleet index status: {str(e)}")
             # Continue to try search anyway
         
         # Search for the thing in the fleet index
-        response = iot_client.search_index(
-            queryString=f"thingName:{thing_name}",
-            indexName="AWS_Things"
-        )
+        thing = search_thing_document(thing_name)
         
         # Check if the thing was found
-        if response.get("things") and len(response["things"]) > 0:
-            thing = response["things"][0]
-            
-            # Get the connection status
-            connectivity = thing.get("connectivity", {})
-            connected_raw = connectivity.get("connected", False)
-            
-            # Convert to boolean if it's a string
-            if isinstance(connected_raw, str):
-                connected = connected_raw.lower() == 'true'
-            else:
-                connected = bool(connected_raw)
-            
-            # Log detailed information about the connection status
-            logger.debug(f"Connection status for {thing_name} from fleet index: raw={connected_raw}, type={type(connected_raw).__name__}, converted={connected}")
-            logger.debug(f"Full connectivity data: {connectivity}")
-            
-            # Return the connection status as a boolean
-            return connected
+        if thing:
+            return connection_status_from_document(thing)
         
         # If the thing was not found, log and try shadow as fallback
         logger.warning(f"Thing {thing_name} not found in fleet index, trying shadow")
@@ -199,41 +378,57 @@ def get_device_connection_status(thing_name: str) -> bool:
         logger.info("Will try shadow as fallback")
     
     # Fallback to shadow if fleet index fails
-    try:
-        # Get the device connection status directly from IoT Core shadow
-        iot_data_client = boto3.client('iot-data')
-        response = iot_data_client.get_thing_shadow(thingName=thing_name)
-        shadow_state = json.loads(response["payload"].read())
-        
-        # Try to get connection status from reported state
-        reported = shadow_state.get("state", {}).get("reported", {})
-        shadow_connected = reported.get("connected")
-        
-        if shadow_connected is not None:
-            # Convert to boolean if it's a string
-            if isinstance(shadow_connected, str):
-                connected = shadow_connected.lower() == 'true'
-            else:
-                connected = bool(shadow_connected)
-                
-            logger.debug(f"Connection status for {thing_name} from shadow: {connected}")
-            return connected
-            
-        # If no explicit connected status in shadow, check for recent activity
-        last_updated = reported.get("lastUpdatedAt")
-        if last_updated:
-            # Consider connected if updated in the last 5 minutes
-            import time
-            current_time = int(time.time())
-            time_diff = current_time - last_updated
-            is_recent = time_diff < 300  # 5 minutes
-            
-            logger.debug(f"Connection status for {thing_name} inferred from shadow timestamp: {is_recent} (last updated {time_diff} seconds ago)")
-            return is_recent
-            
-        logger.warning(f"No connection status or timestamp found in shadow for {thing_name}")
-        return False
+    return _get_connection_status_from_shadow(thing_name)
+
+def get_device_connection_statuses(
+    thing_names: List[str],
+    things: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, bool]:
+    """
+    Get the connection status for many devices at once.
+    
+    Resolves statuses in three stages so a page of things costs about one
+    round trip instead of two or three calls per thing:
+    
+    1. Connectivity already present in ``things`` (e.g. the search_index page
+       being rendered) is used as-is.
+    2. Remaining names are looked up with chunked
+       ``thingName:(a OR b ...)`` fleet index queries.
+    3. Names still unresolved fall back to their shadow, fetched concurrently.
+    
+    Args:
+        thing_names: The IoT thing names
+        things: Optional fleet index documents that are already available
         
-    except Exception as e:
-        logger.error(f"Error getting connection status from shadow for {thing_name}: {str(e)}")
-        return False
+    Returns:
+        Dictionary of thing name to boolean connection status
+    """
+    statuses: Dict[str, bool] = {}
+    
+    # Stage 1: connectivity from documents the caller already has
+    for thing in things or []:
+        name = thing.get("thingName")
+        connected_raw = thing.get("connectivity", {}).get("connected")
+        if name and connected_raw is not None:
+            statuses[name] = _parse_connected(connected_raw)
+    
+    pending = [name for name in dict.fromkeys(thing_names) if name and name not in statuses]
+    
+    # Stage 2: chunked fleet index queries for the rest
+    for name, thing in search_thing_documents(pending).items():
+        statuses[name] = _parse_connected(thing.get("connectivity", {}).get("connected", False))
+    
+    # Stage 3: concurrent shadow fallback for things missing from the index
+    missing = [name for name in pending if name not in statuses]
+    if missing:
+        logger.warning(f"{len(missing)} things not found in fleet index, trying shadow")
+        with ThreadPoolExecutor(max_workers=min(SHADOW_FALLBACK_WORKERS, len(missing))) as executor:
+            for name, connected in zip(missing, executor.map(_get_connection_status_from_shadow, missing)):
+                statuses[name] = connected
+    
+    logger.debug("Resolved connection statuses", extra={
+        "requested": len(thing_names),
+        "from_index_query": len(pending) - len(missing),
+        "from_shadow": len(missing)
+    })
+    return statuses
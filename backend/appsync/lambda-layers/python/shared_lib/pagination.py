@@ -0,0 +1,125 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Streaming pagination over token-paged AWS APIs.
+
+Full-fleet consumers should iterate rather than collect: only the page being
+processed is held in memory, whatever the size of the fleet.
+"""
+import random
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Error codes AWS uses to signal request throttling
+THROTTLE_ERROR_CODES = frozenset({
+    "ThrottlingException",
+    "Throttling",
+    "TooManyRequestsException",
+    "RequestLimitExceeded"
+})
+
+def is_throttle_error(error: Exception) -> bool:
+    """Check whether a botocore ClientError reports throttling."""
+    response = getattr(error, "response", None) or {}
+    return response.get("Error", {}).get("Code") in THROTTLE_ERROR_CODES
+
+def with_throttle_retry(
+    operation: Callable[..., Dict[str, Any]],
+    max_attempts: int = 6,
+    base_delay: float = 0.2,
+    max_delay: float = 5.0
+) -> Callable[..., Dict[str, Any]]:
+    """Wrap an API call to back off and retry while it is throttled.
+    
+    Delays grow exponentially with full jitter, so concurrent callers that
+    were throttled together do not retry in lockstep. Errors other than
+    throttling are raised immediately.
+    
+    Args:
+        operation: Client method to wrap
+        max_attempts: Calls made before the throttling error is raised
+        base_delay: Upper bound in seconds of the first delay
+        max_delay: Upper bound in seconds of any delay
+        
+    Returns:
+        Callable with the same signature as operation
+    """
+    def call(**params: Any) -> Dict[str, Any]:
+        for attempt in range(max_attempts):
+            try:
+                return operation(**params)
+            except Exception as e:
+                if not is_throttle_error(e) or attempt == max_attempts - 1:
+                    raise
+                time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+    return call
+
+def iter_pages(
+    operation: Callable[..., Dict[str, Any]],
+    result_key: str,
+    token_key: str = "nextToken",
+    start_key: Optional[str] = None,
+    **params: Any
+) -> Iterator[List[Any]]:
+    """Yield each page of a token-paged API call.
+    
+    Args:
+        operation: Client method to call, e.g. iot_client.search_index
+        result_key: Response key holding the page's items, e.g. "things"
+        token_key: Response key of the pagination token, and request key
+            unless start_key is given
+        start_key: Request key of the token when it differs, e.g.
+            "ExclusiveStartKey" for DynamoDB's "LastEvaluatedKey"
+        **params: Parameters passed to every call
+        
+    Returns:
+        Iterator over the item list of every page
+    """
+    while True:
+        response = operation(**params)
+        yield response.get(result_key, [])
+        
+        next_token = response.get(token_key)
+        if not next_token:
+            return
+        params[start_key or token_key] = next_token
+
+def iter_items(
+    operation: Callable[..., Dict[str, Any]],
+    result_key: str,
+    token_key: str = "nextToken",
+    start_key: Optional[str] = None,
+    **params: Any
+) -> Iterator[Any]:
+    """Yield every item of a token-paged API call, one page in memory at a time.
+    
+    Args:
+        operation: Client method to call, e.g. iot_client.search_index
+        result_key: Response key holding the page's items, e.g. "things"
+        token_key: Response key of the pagination token, and request key
+            unless start_key is given
+        start_key: Request key of the token when it differs, e.g.
+            "ExclusiveStartKey" for DynamoDB's "LastEvaluatedKey"
+        **params: Parameters passed to every call
+        
+    Returns:
+        Iterator over the items of all pages
+    """
+    for page in iter_pages(operation, result_key, token_key, start_key, **params):
+        yield from page
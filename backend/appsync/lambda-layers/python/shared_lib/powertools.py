@@ -18,12 +18,53 @@ under the License.
 """
 
 """AWS Lambda Powertools setup for Python Lambdas."""
-from aws_lambda_powertools import Logger, Metrics, Tracer
+import os
+
+from aws_lambda_powertools import Logger, Metrics
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
+class DisabledTracer:
+    """Stand-in for Tracer when tracing is disabled.
+    
+    Powertools' Tracer imports the X-Ray SDK (and botocore with it) even when
+    disabled, which is the largest single import in a resolver cold start.
+    This class offers the decorator and annotation surface the handlers use
+    without importing anything.
+    """
+    
+    def capture_lambda_handler(self, lambda_handler=None, **kwargs):
+        """Return the handler unchanged."""
+        if lambda_handler is None:
+            return lambda func: func
+        return lambda_handler
+    
+    def capture_method(self, method=None, **kwargs):
+        """Return the method unchanged."""
+        if method is None:
+            return lambda func: func
+        return method
+    
+    def put_annotation(self, key, value):
+        """Ignore the annotation."""
+    
+    def put_metadata(self, key, value, namespace=None):
+        """Ignore the metadata."""
+
+def tracing_disabled() -> bool:
+    """Check whether POWERTOOLS_TRACE_DISABLED turns tracing off."""
+    return os.environ.get("POWERTOOLS_TRACE_DISABLED", "false").lower() in ("1", "true", "yes", "on")
+
+def create_tracer():
+    """Create the Tracer, importing the X-Ray SDK only if tracing is enabled."""
+    if tracing_disabled():
+        return DisabledTracer()
+    
+    from aws_lambda_powertools import Tracer
+    return Tracer()
+
 # Initialize powertools
 logger = Logger()
-tracer = Tracer()
+tracer = create_tracer()
 metrics = Metrics(namespace="Device Monitor")
 
 # Default dimensions similar to the TypeScript version
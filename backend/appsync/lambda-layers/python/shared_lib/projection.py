@@ -0,0 +1,96 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Selection-set-aware field projection for AppSync resolvers.
+
+AppSync passes the fields selected by the query in `info.selectionSetList`
+(e.g. `["thingName", "items/connected"]`). A FieldProjection maps the
+requested fields onto the named pieces of work (usually AWS calls) each
+field depends on, so resolvers can skip work nobody asked for.
+"""
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional
+
+class FieldProjection:
+    """Requested fields of a resolver and the work they depend on."""
+    
+    def __init__(
+        self,
+        selection_set: Optional[Iterable[str]],
+        field_dependencies: Mapping[str, Iterable[str]],
+        prefix: str = ""
+    ):
+        """Initialize the projection.
+        
+        Args:
+            selection_set: AppSync selectionSetList, or None if unknown
+            field_dependencies: Field name -> names of the work the field needs
+            prefix: Path prefix of the projected type in the selection set
+                (e.g. "items/" for a paginated list)
+        """
+        self.field_dependencies = {
+            field: frozenset(work) for field, work in field_dependencies.items()
+        }
+        if selection_set is None:
+            # Unknown selection (direct invocation): behave as if everything was asked for
+            self.fields: Optional[FrozenSet[str]] = None
+        else:
+            self.fields = frozenset(
+                path[len(prefix):] for path in selection_set
+                if path.startswith(prefix) and "/" not in path[len(prefix):]
+            )
+        self.required_work = self._resolve_work()
+    
+    @classmethod
+    def from_event(
+        cls,
+        event: Dict[str, Any],
+        field_dependencies: Mapping[str, Iterable[str]],
+        prefix: str = ""
+    ) -> "FieldProjection":
+        """Build a projection from an AppSync resolver event.
+        
+        Args:
+            event: AppSync resolver event
+            field_dependencies: Field name -> names of the work the field needs
+            prefix: Path prefix of the projected type in the selection set
+            
+        Returns:
+            FieldProjection for the event
+        """
+        selection_set = (event.get("info") or {}).get("selectionSetList")
+        return cls(selection_set, field_dependencies, prefix)
+    
+    def requested(self, *fields: str) -> bool:
+        """Check whether any of the given fields was requested."""
+        return self.fields is None or any(field in self.fields for field in fields)
+    
+    def needs(self, work: str) -> bool:
+        """Check whether a named piece of work is needed by a requested field."""
+        return work in self.required_work
+    
+    def _resolve_work(self) -> FrozenSet[str]:
+        if self.fields is None:
+            return frozenset().union(*self.field_dependencies.values())
+        return frozenset().union(*(
+            self.field_dependencies.get(field, frozenset()) for field in self.fields
+        ))
+    
+    def __repr__(self) -> str:
+        fields: List[str] = sorted(self.fields) if self.fields is not None else ["*"]
+        return f"FieldProjection(fields={fields}, work={sorted(self.required_work)})"
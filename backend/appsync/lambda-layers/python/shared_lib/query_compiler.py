@@ -0,0 +1,169 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Compile GraphQL filter input into fleet index query strings.
+
+Equivalent filter inputs (reordered filters, duplicated filters or favorite
+devices) are normalized to the same hashable form before compiling, so the
+compiled query string can also be used as a stable key for result caches.
+"""
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from shared_lib.powertools import logger
+
+# Maximum number of distinct normalized filters kept compiled per container
+QUERY_CACHE_SIZE = 256
+
+OPERATOR_MAPPING = {
+    "none": "",
+    "eq": ":",
+    "ne": ":",
+    "le": "<=",
+    "lt": "<",
+    "ge": ">=",
+    "gt": ">",
+    "between": ":",
+    "contains": ":"
+}
+
+# Normalized filter: (operation, filters, favorite devices or None)
+NormalizedFilter = Tuple[str, Tuple[Tuple[str, str, Any], ...], Optional[Tuple[str, ...]]]
+
+def _freeze_value(value: Any) -> Any:
+    """
+    Make a filter value hashable, turning lists (also nested ones) into tuples.
+    
+    Args:
+        value: Filter value from GraphQL
+        
+    Returns:
+        Hashable filter value
+    """
+    if isinstance(value, dict):
+        raise ValueError("Invalid filter")
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze_value(item) for item in value)
+    return value
+
+def normalize_filter(filter_resolver_input: Optional[Dict[str, Any]]) -> Optional[NormalizedFilter]:
+    """
+    Normalize filter input so that equivalent filters compare equal.
+    
+    Filters are de-duplicated and sorted (both AND and OR are commutative),
+    the favorite pseudo-filter is folded into a sorted, de-duplicated tuple of
+    favorite device names, and list values become tuples so the result is
+    hashable.
+    
+    Args:
+        filter_resolver_input: Filter resolver input from GraphQL
+        
+    Returns:
+        Hashable normalized filter, or None for "match everything"
+    """
+    if not filter_resolver_input:
+        return None
+    
+    is_filtered_to_favorites = False
+    filters = set()
+    
+    for filter_input in filter_resolver_input.get("filters") or []:
+        if filter_input.get("fieldName") == "favorite":
+            is_filtered_to_favorites = True
+            continue
+        
+        value = _freeze_value(filter_input.get("value"))
+        filters.add((filter_input.get("fieldName", ""), filter_input.get("operator", ""), value))
+    
+    favorite_devices = None
+    if is_filtered_to_favorites and filter_resolver_input.get("favoriteDevices"):
+        favorite_devices = tuple(sorted(set(filter_resolver_input["favoriteDevices"])))
+    
+    if not filters and not favorite_devices:
+        return None
+    
+    operation = (filter_resolver_input.get("operation") or "and").lower()
+    return (operation, tuple(sorted(filters, key=repr)), favorite_devices)
+
+def construct_query_string(field_name: str, operator: str, value: Any) -> str:
+    """
+    Construct query string for a single filter.
+    
+    Args:
+        field_name: Indexed field name
+        operator: Filter operator
+        value: Filter value
+        
+    Returns:
+        Query string
+    """
+    if operator == "between" and isinstance(value, (list, tuple)) and len(value) == 2:
+        return f"{field_name} {OPERATOR_MAPPING[operator]} [{value[0]} TO {value[1]}]"
+    elif operator != "between" and operator in OPERATOR_MAPPING and value is not None:
+        prefix = "NOT " if operator == "ne" else ""
+        suffix = "*" if operator == "contains" else ""
+        return f"{prefix}{field_name}{OPERATOR_MAPPING[operator]}{value}{suffix}"
+    else:
+        raise ValueError("Invalid filter")
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _compile_normalized(normalized: Optional[NormalizedFilter]) -> str:
+    """
+    Compile a normalized filter into an IoT query string.
+    
+    Args:
+        normalized: Output of normalize_filter
+        
+    Returns:
+        IoT query string
+    """
+    if normalized is None:
+        return "*"
+    
+    operation, filters, favorite_devices = normalized
+    operation = operation.upper()
+    
+    parts = []
+    if favorite_devices:
+        parts.append(f"thingName = ({' OR '.join(favorite_devices)})")
+    parts.extend(construct_query_string(*filter_tuple) for filter_tuple in filters)
+    
+    return f"({f') {operation} ('.join(parts)})"
+
+def compile_query(filter_resolver_input: Optional[Dict[str, Any]]) -> str:
+    """
+    Convert filter input to IoT query string.
+    
+    The result is identical for equivalent filter inputs, so it doubles as
+    the cache key for anything cached per filter (list pages, counts).
+    
+    Args:
+        filter_resolver_input: Filter resolver input from GraphQL
+        
+    Returns:
+        IoT query string
+    """
+    query = _compile_normalized(normalize_filter(filter_resolver_input))
+    logger.debug("Query string", extra={"query": query})
+    return query
+
+def query_cache_info() -> Dict[str, int]:
+    """Get hit/miss counters of the compiled query cache."""
+    info = _compile_normalized.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
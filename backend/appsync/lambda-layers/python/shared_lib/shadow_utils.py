@@ -0,0 +1,112 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Targeted extraction of fields from fleet index shadow documents.
+
+With the `$package`, `state` and `schedule` named shadows indexed, the
+`shadow` string on a search_index row can be several KB. Callers only need
+the firmware package reported in `name.$package.state.reported`, so the
+extractor decodes just that sub-document instead of the whole blob.
+"""
+import json
+import re
+from typing import Any, Dict, Optional, Tuple
+
+from shared_lib.powertools import logger
+
+_decoder = json.JSONDecoder()
+
+# Start of the value of a "$package" key
+_PACKAGE_KEY = re.compile(r'"\$package"\s*:\s*')
+
+def _firmware_from_package_reported(package_reported: Any) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Get firmware type and version from the reported `$package` state.
+    
+    Args:
+        package_reported: Reported state of the `$package` shadow
+        
+    Returns:
+        Tuple of (firmware type, firmware version)
+    """
+    if not package_reported or not isinstance(package_reported, dict):
+        return None, None
+    
+    firmware_type, package = next(iter(package_reported.items()))
+    firmware_version = package.get("version") if isinstance(package, dict) else None
+    return firmware_type, firmware_version
+
+def _parse_full_shadow(shadow: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Get firmware fields by decoding the whole shadow document.
+    
+    Args:
+        shadow: Shadow JSON string from a fleet index row
+        
+    Returns:
+        Tuple of (firmware type, firmware version)
+    """
+    try:
+        shadow_json = json.loads(shadow)
+        package_reported = (
+            shadow_json.get("name", {})
+            .get("$package", {})
+            .get("state", {})
+            .get("reported", {})
+        )
+        return _firmware_from_package_reported(package_reported)
+    except (json.JSONDecodeError, AttributeError) as e:
+        logger.warning(f"Failed to parse shadow JSON: {e}")
+        return None, None
+
+def extract_firmware_from_shadow(shadow: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Get firmware type and version from an indexed shadow string.
+    
+    Fast path: locate the `"$package"` key and decode only its value. Shadows
+    without that key are skipped without any decoding. A single `$package`
+    key after the `name` key is taken to be the named shadow; when the key
+    occurs more than once (e.g. a device also reports a `$package` property),
+    has no `name` key before it, or its value does not look like a named
+    shadow document, the whole document is decoded instead. Text outside the
+    `$package` value is not validated on the fast path.
+    
+    Args:
+        shadow: Shadow JSON string from a fleet index row
+        
+    Returns:
+        Tuple of (firmware type, firmware version)
+    """
+    if not shadow or '"$package"' not in shadow:
+        return None, None
+    
+    match = _PACKAGE_KEY.search(shadow)
+    if (
+        match
+        and shadow.find('"$package"', match.end()) == -1
+        and shadow.find('"name"', 0, match.start()) != -1
+    ):
+        try:
+            package_shadow, _ = _decoder.raw_decode(shadow, match.end())
+        except json.JSONDecodeError:
+            package_shadow = None
+        if isinstance(package_shadow, dict) and isinstance(package_shadow.get("state"), dict):
+            return _firmware_from_package_reported(package_shadow["state"].get("reported"))
+    
+    return _parse_full_shadow(shadow)
@@ -0,0 +1,121 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Bounded-size frequency summaries for high-cardinality distributions."""
+import heapq
+from typing import Dict, Hashable, List, Tuple
+
+# Bucket that collects everything outside the top K
+OTHER_BUCKET = "Other"
+
+class ExactCounts:
+    """Exact key counts, with the same interface as SpaceSaving."""
+    
+    def __init__(self):
+        self.total = 0
+        self.counts: Dict[Hashable, int] = {}
+    
+    def add(self, key: Hashable, count: int = 1) -> None:
+        """Count occurrences of a key.
+        
+        Args:
+            key: Key that occurred
+            count: Number of occurrences
+        """
+        self.total += count
+        self.counts[key] = self.counts.get(key, 0) + count
+
+class SpaceSaving:
+    """Space-Saving heavy-hitter summary that tracks at most `capacity` keys.
+    
+    Once full, a new key replaces the key with the smallest count and
+    inherits that count, so counts are upper bounds that overestimate by at
+    most the inherited amount. Any key occurring more than total / capacity
+    times is guaranteed to be tracked, and the counts always sum to the
+    number of occurrences added.
+    """
+    
+    def __init__(self, capacity: int):
+        """Initialize the summary.
+        
+        Args:
+            capacity: Largest number of keys tracked
+        """
+        self.capacity = capacity
+        self.total = 0
+        self.counts: Dict[Hashable, int] = {}
+        # Min-heap of (count, key); entries whose count is stale are skipped
+        self._heap: List[Tuple[int, Hashable]] = []
+    
+    def add(self, key: Hashable, count: int = 1) -> None:
+        """Count occurrences of a key.
+        
+        Args:
+            key: Key that occurred
+            count: Number of occurrences
+        """
+        self.total += count
+        if key in self.counts:
+            self.counts[key] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = count
+        else:
+            evicted_count = self._pop_min()
+            self.counts[key] = evicted_count + count
+        self._push(key)
+    
+    def _push(self, key: Hashable) -> None:
+        heapq.heappush(self._heap, (self.counts[key], key))
+        # Drop stale entries once they outnumber the live ones
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, key) for key, count in self.counts.items()]
+            heapq.heapify(self._heap)
+    
+    def _pop_min(self) -> int:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                del self.counts[key]
+                return count
+
+def top_k(distribution: Dict[str, int], k: int) -> Dict[str, int]:
+    """
+    Keep the k largest buckets of a distribution and fold the rest into OTHER_BUCKET.
+    
+    Counts still sum to the distribution's total, so the result can be
+    merged with other top-k distributions and truncated again.
+    
+    Args:
+        distribution: Bucket counts, possibly with an OTHER_BUCKET already
+        k: Largest number of buckets kept besides OTHER_BUCKET
+        
+    Returns:
+        At most k + 1 buckets
+    """
+    other = distribution.get(OTHER_BUCKET, 0)
+    buckets = sorted(
+        ((key, count) for key, count in distribution.items() if key != OTHER_BUCKET),
+        key=lambda bucket: bucket[1],
+        reverse=True
+    )
+    result = dict(buckets[:k])
+    other += sum(count for _, count in buckets[k:])
+    if other:
+        result[OTHER_BUCKET] = other
+    return result
@@ -0,0 +1,197 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Compact, delta-encoded device stats history.
+
+Every stats snapshot is kept as a history record in its day's partition,
+sorted by recordTime. Counts are stored as-is; distributions are stored as
+changes against the previous record of the same writer, which is named in
+"baseTime". The first record of a day, and any record without a known
+predecessor, is a keyframe holding the full distributions, so a day can be
+decoded on its own.
+"""
+import datetime
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Distributions kept in history records
+HISTORY_DISTRIBUTIONS = [
+    "brandNameDistribution",
+    "countryDistribution",
+    "productTypeDistribution",
+    "disconnectDistribution",
+    "groupDistribution",
+    "deviceTypeDistribution",
+    "versionDistribution"
+]
+
+# Counts kept in history records
+HISTORY_COUNTS = ["registeredDevices", "connectedDevices", "disconnectedDevices"]
+
+# Partition key of the series index, shared by every history record so a
+# time range is a single query
+HISTORY_SERIES = "fleet"
+
+def normalize_time(value: str) -> str:
+    """
+    Convert an ISO 8601 time to the naive UTC isoformat used for recordTime.
+    
+    Args:
+        value: ISO 8601 time, with or without an offset
+        
+    Returns:
+        Time in the recordTime format
+    """
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat()
+
+def encode_delta(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Get the changes that turn one set of distributions into another.
+    
+    Counts that changed hold their difference; buckets that disappeared hold
+    minus their old count, and nested distributions are diffed recursively.
+    
+    Args:
+        previous: Distributions of the previous record
+        current: Distributions of this record
+        
+    Returns:
+        Non-empty changes only
+    """
+    delta = {}
+    for key in current.keys() | previous.keys():
+        old, new = previous.get(key), current.get(key)
+        if isinstance(old, dict) or isinstance(new, dict):
+            change = encode_delta(old or {}, new or {})
+            if change:
+                delta[key] = change
+        elif (new or 0) != (old or 0):
+            delta[key] = (new or 0) - (old or 0)
+    return delta
+
+def apply_delta(base: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Apply changes from encode_delta to a set of distributions.
+    
+    Args:
+        base: Distributions of the previous record, left unchanged
+        delta: Changes of this record
+        
+    Returns:
+        Distributions of this record, without empty buckets
+    """
+    result = dict(base)
+    for key, change in delta.items():
+        if isinstance(change, dict):
+            result[key] = apply_delta(base.get(key) or {}, change)
+        else:
+            count = (base.get(key) or 0) + change
+            if count:
+                result[key] = count
+            else:
+                result.pop(key, None)
+    return result
+
+def build_history_record(
+    device_stats: Dict[str, Any],
+    distributions: Dict[str, Any],
+    previous: Optional[Dict[str, Any]],
+    ttl: int
+) -> Dict[str, Any]:
+    """
+    Build the history record of a stats snapshot.
+    
+    Args:
+        device_stats: Stats snapshot, with counts and recordTime
+        distributions: Parsed HISTORY_DISTRIBUTIONS of the snapshot
+        previous: recordTime and distributions of the last record written,
+            or None if unknown
+        ttl: Expiry time of the record in epoch seconds
+        
+    Returns:
+        History table item
+    """
+    record_time = device_stats["recordTime"]
+    day = record_time[:10]
+    keyframe = previous is None or previous["recordTime"][:10] != day
+    
+    record = {
+        "day": day,
+        "recordTime": record_time,
+        "series": HISTORY_SERIES,
+        **{count: device_stats.get(count, 0) for count in HISTORY_COUNTS},
+        "ttl": ttl
+    }
+    if keyframe:
+        record["distributions"] = json.dumps(distributions, separators=(",", ":"))
+    else:
+        record["baseTime"] = previous["recordTime"]
+        record["delta"] = json.dumps(encode_delta(previous["distributions"], distributions), separators=(",", ":"))
+    return record
+
+def decode_history(records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Decode history records, in recordTime order, into full snapshots.
+    
+    Each container chains deltas to the records it wrote itself, so chains
+    from several containers interleave; a delta is resolved against any
+    record decoded before it. Deltas whose base isn't among them are skipped.
+    
+    Args:
+        records: History table items sorted by recordTime
+        
+    Returns:
+        Iterator over snapshots with counts and parsed distributions
+    """
+    decoded: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        if "distributions" in record:
+            distributions = json.loads(record["distributions"])
+        elif record.get("baseTime") in decoded:
+            distributions = apply_delta(decoded[record["baseTime"]], json.loads(record["delta"]))
+        else:
+            continue
+        
+        decoded[record["recordTime"]] = distributions
+        yield {
+            "recordTime": record["recordTime"],
+            **{count: int(record.get(count, 0)) for count in HISTORY_COUNTS},
+            **distributions
+        }
+
+def downsample(points: List[Dict[str, Any]], max_points: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    Keep at most max_points evenly spaced points, always including the last.
+    
+    Args:
+        points: Points in time order
+        max_points: Largest number of points to return, or None for all
+        
+    Returns:
+        The selected points
+    """
+    if not max_points or len(points) <= max_points:
+        return points
+    if max_points == 1:
+        return points[-1:]
+    step = (len(points) - 1) / (max_points - 1)
+    return [points[round(i * step)] for i in range(max_points)]
@@ -0,0 +1,155 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Device stats table records shared by the stats monitor and its readers.
+
+Every snapshot is written as its own row keyed by recordTime. A single
+pointer item under the fixed key LATEST_STATS_KEY is overwritten with a copy
+of the newest snapshot, so readers get the latest stats with one get_item
+instead of a query over every row.
+
+Distributions are stored as native DynamoDB maps, so readers can project
+just the ones they need and get them back without parsing. A distribution
+too wide for a comfortable map is stored as zlib-compressed JSON in a binary
+attribute instead. Rows written before either existed hold JSON strings;
+decode_distribution reads all three.
+"""
+import json
+import os
+import zlib
+from decimal import Decimal
+from typing import Any, Dict
+
+# Fixed recordTime key of the latest stats pointer item
+LATEST_STATS_KEY = "LATEST_STATS"
+
+# Distribution attributes of a stats record
+DISTRIBUTION_FIELDS = [
+    "brandNameDistribution",
+    "countryDistribution",
+    "productTypeDistribution",
+    "disconnectDistribution",
+    "groupDistribution",
+    "deviceTypeDistribution",
+    "versionDistribution"
+]
+
+# Distributions whose JSON is larger than this are stored compressed; a
+# native map costs its full key and value size in the 400 KB item limit
+DISTRIBUTION_COMPRESS_BYTES = int(os.environ.get("DISTRIBUTION_COMPRESS_BYTES", "4096"))
+
+def _has_empty_key(distribution: Dict[str, Any]) -> bool:
+    return any(
+        key == "" or (isinstance(value, dict) and _has_empty_key(value))
+        for key, value in distribution.items()
+    )
+
+def _from_dynamodb_numbers(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _from_dynamodb_numbers(item) for key, item in value.items()}
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+def encode_distribution(distribution: Dict[str, Any]) -> Any:
+    """
+    Encode a distribution for storage.
+    
+    Args:
+        distribution: Bucket counts, possibly nested one level
+        
+    Returns:
+        The distribution itself, to be stored as a map, or compressed JSON
+        bytes if it is too wide or has a key a map can't hold
+    """
+    payload = json.dumps(distribution, separators=(",", ":"))
+    if len(payload) > DISTRIBUTION_COMPRESS_BYTES or _has_empty_key(distribution):
+        return zlib.compress(payload.encode("utf-8"))
+    return distribution
+
+def decode_distribution(value: Any) -> Dict[str, Any]:
+    """
+    Decode a stored distribution.
+    
+    Args:
+        value: Map, compressed binary or JSON string attribute value
+        
+    Returns:
+        Bucket counts with plain int values
+        
+    Raises:
+        ValueError: If the stored value can't be decoded
+    """
+    if isinstance(value, dict):
+        return _from_dynamodb_numbers(value)
+    if isinstance(value, str):
+        # Rows written before distributions were stored natively
+        return json.loads(value)
+    try:
+        return json.loads(zlib.decompress(bytes(value)))
+    except (TypeError, zlib.error) as e:
+        raise ValueError(f"Unreadable distribution: {str(e)}") from e
+
+def encode_stats_item(device_stats: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the stored form of a stats snapshot.
+    
+    Args:
+        device_stats: Stats snapshot with distributions as dicts
+        
+    Returns:
+        Item with every distribution encoded for storage
+    """
+    return {
+        key: encode_distribution(value) if key in DISTRIBUTION_FIELDS else value
+        for key, value in device_stats.items()
+    }
+
+def to_pointer_item(device_stats: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the pointer item for a stats snapshot.
+    
+    The pointer has no status attribute, so it stays out of the latest
+    record index, and keeps the snapshot's own time in latestRecordTime.
+    
+    Args:
+        device_stats: Stats snapshot as written to its own row
+        
+    Returns:
+        Pointer item
+    """
+    item = {key: value for key, value in device_stats.items() if key not in ("status", "ttl")}
+    item["latestRecordTime"] = device_stats["recordTime"]
+    item["recordTime"] = LATEST_STATS_KEY
+    return item
+
+def from_pointer_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turn the pointer item back into the stats snapshot it copies.
+    
+    Args:
+        item: Pointer item
+        
+    Returns:
+        Stats snapshot, as its own row would read
+    """
+    stats = {key: value for key, value in item.items() if key != "latestRecordTime"}
+    stats["recordTime"] = item["latestRecordTime"]
+    stats["status"] = "LATEST"
+    return stats
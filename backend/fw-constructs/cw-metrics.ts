@@ -22,13 +22,37 @@ import * as Lambda from 'aws-cdk-lib/aws-lambda';
 import * as AppSync from 'aws-cdk-lib/aws-appsync';
 import * as path from 'path';
 import * as IAM from 'aws-cdk-lib/aws-iam';
-import { defaultAppSyncResponseMapping, type FWConstructProps } from './types';
+import * as DynamoDB from 'aws-cdk-lib/aws-dynamodb';
+import { RemovalPolicy } from 'aws-cdk-lib/core';
+import {
+  defaultAppSyncResponseMapping,
+  defaultLambdaEnvironment,
+  type FWConstructProps
+} from './types';
 
 export class CloudWatchMetricsConstruct extends Construct {
   constructor(scope: Construct, id: string, props: FWConstructProps) {
     super(scope, id);
     const api: AppSync.GraphqlApi = props.api;
 
+    // Completed metric buckets, one item per chunk of a metric series
+    const seriesCacheTable: DynamoDB.Table = new DynamoDB.Table(
+      this,
+      'MetricSeriesCacheTable',
+      {
+        partitionKey: {
+          name: 'series',
+          type: DynamoDB.AttributeType.STRING
+        },
+        sortKey: {
+          name: 'chunkStart',
+          type: DynamoDB.AttributeType.NUMBER
+        },
+        billingMode: DynamoDB.BillingMode.PAY_PER_REQUEST,
+        removalPolicy: RemovalPolicy.DESTROY
+      }
+    );
+
     const getCloudwatchMetricDataLambdaRole: IAM.Role = new IAM.Role(
       this,
       'GetCloudwatchMetricDataLambdaRole',
@@ -65,10 +89,14 @@ export class CloudWatchMetricsConstruct extends Construct {
         layers: props.pythonLayer ? [props.pythonLayer] : [],
         role: getCloudwatchMetricDataLambdaRole,
         environment: {
-          PYTHONPATH: '/var/task:/opt/python'
+          PYTHONPATH: '/var/task:/opt/python',
+          ...defaultLambdaEnvironment,
+          METRIC_SERIES_CACHE_TABLE: seriesCacheTable.tableName
         }
       });
 
+    seriesCacheTable.grantReadWriteData(getCloudwatchMetricDataFunction);
+
     // Create the AppSync data source
     const getCloudwatchMetricDataDataSource: AppSync.LambdaDataSource =
       api.addLambdaDataSource(
@@ -23,6 +23,7 @@ import * as lambda from 'aws-cdk-lib/aws-lambda';
 import * as iam from 'aws-cdk-lib/aws-iam';
 import * as path from 'path';
 import { Duration } from 'aws-cdk-lib';
+import { defaultLambdaEnvironment } from './types';
 
 export interface DefenderMetricsConstructProps {
   api: appsync.GraphqlApi;
@@ -90,7 +91,8 @@ export class DefenderMetricsConstruct extends Construct {
         role: defenderLambdaRole,
         timeout: Duration.seconds(30),
         environment: {
-          REGION: props.region
+          REGION: props.region,
+          ...defaultLambdaEnvironment
         }
       }
     );
@@ -25,11 +25,20 @@ import * as IAM from 'aws-cdk-lib/aws-iam';
 import * as Events from 'aws-cdk-lib/aws-events';
 import * as EventsTargets from 'aws-cdk-lib/aws-events-targets';
 import * as DynamoDB from 'aws-cdk-lib/aws-dynamodb';
+import * as IoT from 'aws-cdk-lib/aws-iot';
+import * as cr from 'aws-cdk-lib/custom-resources';
 import { Duration, RemovalPolicy } from 'aws-cdk-lib/core';
-import { defaultAppSyncResponseMapping, type FWConstructProps } from './types';
+import {
+  defaultAppSyncResponseMapping,
+  defaultLambdaEnvironment,
+  type FWConstructProps
+} from './types';
 
 export class DeviceStatsConstruct extends Construct {
   public readonly table: DynamoDB.Table;
+  public readonly countersTable: DynamoDB.Table;
+  public readonly historyTable: DynamoDB.Table;
+  public readonly historySeriesIndexName: string = 'SeriesIndex';
   public readonly latestRecordIndexName: string = 'LatestRecordIndex';
 
   constructor(scope: Construct, id: string, props: FWConstructProps) {
@@ -58,6 +67,48 @@ export class DeviceStatsConstruct extends Construct {
       sortKey: { name: 'recordTime', type: DynamoDB.AttributeType.STRING }
     });
 
+    // Event-driven fleet counters and the per-thing state behind them
+    this.countersTable = new DynamoDB.Table(this, 'FleetCountersTable', {
+      partitionKey: {
+        name: 'pk',
+        type: DynamoDB.AttributeType.STRING
+      },
+      sortKey: {
+        name: 'sk',
+        type: DynamoDB.AttributeType.STRING
+      },
+      billingMode: DynamoDB.BillingMode.PAY_PER_REQUEST,
+      removalPolicy: RemovalPolicy.DESTROY,
+      pointInTimeRecoverySpecification: {
+        pointInTimeRecoveryEnabled: true
+      }
+    });
+
+    // Stats history, one partition per day sorted by recordTime
+    this.historyTable = new DynamoDB.Table(this, 'DeviceStatsHistoryTable', {
+      partitionKey: {
+        name: 'day',
+        type: DynamoDB.AttributeType.STRING
+      },
+      sortKey: {
+        name: 'recordTime',
+        type: DynamoDB.AttributeType.STRING
+      },
+      billingMode: DynamoDB.BillingMode.PAY_PER_REQUEST,
+      removalPolicy: RemovalPolicy.DESTROY,
+      timeToLiveAttribute: 'ttl',
+      pointInTimeRecoverySpecification: {
+        pointInTimeRecoveryEnabled: true
+      }
+    });
+
+    // Add GSI so a time range spanning days is a single query
+    this.historyTable.addGlobalSecondaryIndex({
+      indexName: this.historySeriesIndexName,
+      partitionKey: { name: 'series', type: DynamoDB.AttributeType.STRING },
+      sortKey: { name: 'recordTime', type: DynamoDB.AttributeType.STRING }
+    });
+
     // Create AppSync data source for the DynamoDB table
     const deviceStatsDataSource: AppSync.DynamoDbDataSource =
       api.addDynamoDbDataSource('DeviceStatsConstruct', this.table);
@@ -104,14 +155,17 @@ export class DeviceStatsConstruct extends Construct {
         role: getLatestStatsLambdaRole,
         environment: {
           PYTHONPATH: '/var/task:/opt/python',
+          ...defaultLambdaEnvironment,
           DEVICE_STATS_TABLE: this.table.tableName,
-          DEVICE_STATS_INDEX: this.latestRecordIndexName
+          DEVICE_STATS_INDEX: this.latestRecordIndexName,
+          FLEET_COUNTERS_TABLE: this.countersTable.tableName
         }
       }
     );
 
     // Grant read access to the table
     this.table.grantReadData(getLatestStatsFunction);
+    this.countersTable.grantReadData(getLatestStatsFunction);
 
     // Create AppSync data source for the Lambda function
     const getLatestStatsDataSource: AppSync.LambdaDataSource =
@@ -129,6 +183,48 @@ export class DeviceStatsConstruct extends Construct {
       )
     });
 
+    // Create the Python Lambda function for get-stats-history
+    const getStatsHistoryFunction: Lambda.Function = new Lambda.Function(
+      this,
+      'GetStatsHistoryFunction',
+      {
+        runtime: Lambda.Runtime.PYTHON_3_12,
+        code: Lambda.Code.fromAsset(
+          path.join(
+            import.meta.dirname,
+            '../appsync/lambda-functions/python/get_stats_history'
+          )
+        ),
+        handler: 'handler.lambda_handler',
+        layers: props.pythonLayer ? [props.pythonLayer] : [],
+        environment: {
+          PYTHONPATH: '/var/task:/opt/python',
+          ...defaultLambdaEnvironment,
+          STATS_HISTORY_TABLE: this.historyTable.tableName,
+          STATS_HISTORY_INDEX: this.historySeriesIndexName
+        }
+      }
+    );
+
+    // Grant read access to the history table
+    this.historyTable.grantReadData(getStatsHistoryFunction);
+
+    // Create AppSync data source for the Lambda function
+    const getStatsHistoryDataSource: AppSync.LambdaDataSource =
+      api.addLambdaDataSource(
+        'GetStatsHistoryDataSource',
+        getStatsHistoryFunction
+      );
+
+    // Create resolver for getDeviceStatsHistory query
+    getStatsHistoryDataSource.createResolver('GetDeviceStatsHistory', {
+      typeName: 'Query',
+      fieldName: 'getDeviceStatsHistory',
+      responseMappingTemplate: AppSync.MappingTemplate.fromString(
+        defaultAppSyncResponseMapping
+      )
+    });
+
     // Device Stats Monitor
     const monitoringLambdaRole: IAM.Role = new IAM.Role(
       this,
@@ -143,7 +239,7 @@ export class DeviceStatsConstruct extends Construct {
       }
     );
 
-    // Add CloudWatch metrics permission without namespace restriction
+    // Add CloudWatch metrics permission without namespace restriction (METRICS_PUBLISHING=api)
     monitoringLambdaRole.addToPolicy(
       new IAM.PolicyStatement({
         effect: IAM.Effect.ALLOW,
@@ -159,14 +255,22 @@ export class DeviceStatsConstruct extends Construct {
         effect: IAM.Effect.ALLOW,
         actions: [
           'iot:SearchIndex',
-          'iot:ListThingGroupsForThing' // Add missing permission
+          'iot:GetStatistics',
+          'iot:GetBucketsAggregation'
         ],
         resources: [
-          `arn:aws:iot:${props.region}:${props.accountId}:index/AWS_Things`,
-          `arn:aws:iot:${props.region}:${props.accountId}:thing/*` // Add thing resource for ListThingGroupsForThing
+          `arn:aws:iot:${props.region}:${props.accountId}:index/AWS_Things`
         ]
       })
     );
+    // Dynamic thing group sizes (INCLUDE_DYNAMIC_GROUPS)
+    monitoringLambdaRole.addToPolicy(
+      new IAM.PolicyStatement({
+        effect: IAM.Effect.ALLOW,
+        actions: ['iot:ListThingGroups', 'iot:DescribeThingGroup'],
+        resources: ['*']
+      })
+    );
 
     // Add AppSync permissions with IAM auth
     monitoringLambdaRole.addToPolicy(
@@ -179,8 +283,12 @@ export class DeviceStatsConstruct extends Construct {
     // REMOVED: STS AssumeRole permission - not needed for this Lambda function
     // If cross-service authentication is needed, implement with specific role ARNs
 
-    // Grant write access to the DynamoDB table directly
-    this.table.grantWriteData(monitoringLambdaRole);
+    // Grant access to the DynamoDB table directly; reads are for the scan checkpoint
+    this.table.grantReadWriteData(monitoringLambdaRole);
+    // Append each snapshot to the history
+    this.historyTable.grantWriteData(monitoringLambdaRole);
+    // Reconcile the event-driven counters after each scan
+    this.countersTable.grantReadWriteData(monitoringLambdaRole);
 
     // Use Python implementation for device-stats-monitor
     const deviceStatsMonitorFunction: Lambda.Function = new Lambda.Function(
@@ -201,8 +309,23 @@ export class DeviceStatsConstruct extends Construct {
         memorySize: 1024,
         environment: {
           PYTHONPATH: '/var/task:/opt/python',
+          ...defaultLambdaEnvironment,
           APPSYNC_API_URL: api.graphqlUrl,
-          DEVICE_STATS_TABLE: this.table.tableName // Add table name for direct DynamoDB access
+          DEVICE_STATS_TABLE: this.table.tableName, // Add table name for direct DynamoDB access
+          // 'index' aggregates distributions in the fleet index; needs the
+          // attributes configured as custom fields, falls back to a scan otherwise
+          STATS_AGGREGATION_BACKEND: 'scan',
+          // Parallel thingName prefix shards for the fleet scan; 1 scans sequentially.
+          // Only sequential scans are checkpointed across invocations
+          SCAN_SHARDS: '1',
+          FLEET_COUNTERS_TABLE: this.countersTable.tableName,
+          STATS_HISTORY_TABLE: this.historyTable.tableName,
+          // Fleet metrics as Embedded Metric Format log lines ('api' for put_metric_data)
+          METRICS_PUBLISHING: 'emf',
+          // Comma-separated breakdowns, e.g. 'Country,DeviceType,DisconnectReason'
+          METRIC_DIMENSIONS: '',
+          // 'topk' bounds group and firmware distributions for very large fleets
+          DISTRIBUTION_MODE: 'exact'
         }
       }
     );
@@ -220,5 +343,151 @@ export class DeviceStatsConstruct extends Construct {
       action: 'lambda:InvokeFunction',
       sourceArn: deviceStatsRule.ruleArn
     });
+
+    // Fleet Event Counter: keeps counts current from IoT lifecycle events
+    const fleetEventCounterRole: IAM.Role = new IAM.Role(
+      this,
+      'FleetEventCounterRole',
+      {
+        assumedBy: new IAM.ServicePrincipal('lambda.amazonaws.com'),
+        managedPolicies: [
+          IAM.ManagedPolicy.fromAwsManagedPolicyName(
+            'service-role/AWSLambdaBasicExecutionRole'
+          )
+        ]
+      }
+    );
+
+    // First event for a thing starts from its fleet index document
+    fleetEventCounterRole.addToPolicy(
+      new IAM.PolicyStatement({
+        effect: IAM.Effect.ALLOW,
+        actions: ['iot:SearchIndex'],
+        resources: [
+          `arn:aws:iot:${props.region}:${props.accountId}:index/AWS_Things`
+        ]
+      })
+    );
+
+    this.countersTable.grantReadWriteData(fleetEventCounterRole);
+
+    const fleetEventCounterFunction: Lambda.Function = new Lambda.Function(
+      this,
+      'FleetEventCounter',
+      {
+        runtime: Lambda.Runtime.PYTHON_3_12,
+        code: Lambda.Code.fromAsset(
+          path.join(
+            import.meta.dirname,
+            '../appsync/lambda-functions/python/fleet_event_counter'
+          )
+        ),
+        handler: 'handler.lambda_handler',
+        layers: props.pythonLayer ? [props.pythonLayer] : [],
+        role: fleetEventCounterRole,
+        timeout: Duration.seconds(30),
+        environment: {
+          PYTHONPATH: '/var/task:/opt/python',
+          ...defaultLambdaEnvironment,
+          FLEET_COUNTERS_TABLE: this.countersTable.tableName
+        }
+      }
+    );
+
+    // Connect and disconnect events, published by IoT Core for every client
+    const presenceEventsRule: IoT.CfnTopicRule = new IoT.CfnTopicRule(
+      this,
+      'FleetPresenceEventsRule',
+      {
+        topicRulePayload: {
+          sql: "SELECT * FROM '$aws/events/presence/+/+'",
+          awsIotSqlVersion: '2016-03-23',
+          ruleDisabled: false,
+          actions: [
+            { lambda: { functionArn: fleetEventCounterFunction.functionArn } }
+          ]
+        }
+      }
+    );
+    fleetEventCounterFunction.addPermission('IoTPresenceEventsInvoke', {
+      principal: new IAM.ServicePrincipal('iot.amazonaws.com'),
+      action: 'lambda:InvokeFunction',
+      sourceArn: presenceEventsRule.attrArn
+    });
+
+    // Thing created, updated and deleted events
+    const registryEventsRule: IoT.CfnTopicRule = new IoT.CfnTopicRule(
+      this,
+      'FleetRegistryEventsRule',
+      {
+        topicRulePayload: {
+          sql: "SELECT * FROM '$aws/events/thing/+/+'",
+          awsIotSqlVersion: '2016-03-23',
+          ruleDisabled: false,
+          actions: [
+            { lambda: { functionArn: fleetEventCounterFunction.functionArn } }
+          ]
+        }
+      }
+    );
+    fleetEventCounterFunction.addPermission('IoTRegistryEventsInvoke', {
+      principal: new IAM.ServicePrincipal('iot.amazonaws.com'),
+      action: 'lambda:InvokeFunction',
+      sourceArn: registryEventsRule.attrArn
+    });
+
+    // Registry events are off by default and the setting is account-wide, so
+    // record the current value on create and restore it when the stack is
+    // deleted
+    const previousEvents: cr.AwsCustomResource = new cr.AwsCustomResource(
+      this,
+      'FleetRegistryEventsPreviousConfiguration',
+      {
+        onCreate: {
+          service: 'Iot',
+          action: 'describeEventConfigurations',
+          parameters: {},
+          outputPaths: ['eventConfigurations.THING.Enabled'],
+          physicalResourceId: cr.PhysicalResourceId.of(
+            'FleetRegistryEventsPrevious'
+          )
+        },
+        policy: cr.AwsCustomResourcePolicy.fromSdkCalls({
+          resources: cr.AwsCustomResourcePolicy.ANY_RESOURCE
+        })
+      }
+    );
+
+    const registryEvents: cr.AwsCustomResource = new cr.AwsCustomResource(
+      this,
+      'FleetRegistryEventsConfiguration',
+      {
+        onCreate: {
+          service: 'Iot',
+          action: 'updateEventConfigurations',
+          parameters: {
+            eventConfigurations: { THING: { Enabled: true } }
+          },
+          physicalResourceId: cr.PhysicalResourceId.of('FleetRegistryEvents')
+        },
+        onDelete: {
+          service: 'Iot',
+          action: 'updateEventConfigurations',
+          parameters: {
+            eventConfigurations: {
+              THING: {
+                Enabled: previousEvents.getResponseField(
+                  'eventConfigurations.THING.Enabled'
+                )
+              }
+            }
+          }
+        },
+        policy: cr.AwsCustomResourcePolicy.fromSdkCalls({
+          resources: cr.AwsCustomResourcePolicy.ANY_RESOURCE
+        })
+      }
+    );
+    registryEvents.node.addDependency(previousEvents);
   }
 }
@@ -22,7 +22,11 @@ import * as Lambda from 'aws-cdk-lib/aws-lambda';
 import * as AppSync from 'aws-cdk-lib/aws-appsync';
 import * as IAM from 'aws-cdk-lib/aws-iam';
 import * as path from 'path';
-import { defaultAppSyncResponseMapping, type FWConstructProps } from './types';
+import {
+  defaultAppSyncResponseMapping,
+  defaultLambdaEnvironment,
+  type FWConstructProps
+} from './types';
 
 // Import the Duration from core for timeouts
 import * as cdk from 'aws-cdk-lib';
@@ -49,13 +53,17 @@ export class DeviceConstruct extends Construct {
     // Add necessary permissions
     getDeviceLambdaRole.addToPolicy(
       new IAM.PolicyStatement({
-        actions: ['iot:DescribeThing', 'iot:ListThingGroupsForThing'],
+        actions: [
+          'iot:DescribeThing',
+          'iot:ListThingGroupsForThing',
+          'iot:GetThingShadow'
+        ],
         resources: [`arn:aws:iot:${props.region}:${props.accountId}:thing/*`]
       })
     );
     getDeviceLambdaRole.addToPolicy(
       new IAM.PolicyStatement({
-        actions: ['iot:SearchIndex'],
+        actions: ['iot:SearchIndex', 'iot:DescribeIndex'],
         resources: [
           `arn:aws:iot:${props.region}:${props.accountId}:index/AWS_Things`
         ]
@@ -80,7 +88,8 @@ export class DeviceConstruct extends Construct {
         timeout: cdk.Duration.seconds(30),
         memorySize: 128,
         environment: {
-          PYTHONPATH: '/var/task:/opt/python'
+          PYTHONPATH: '/var/task:/opt/python',
+          ...defaultLambdaEnvironment
         }
       }
     );
@@ -97,5 +106,16 @@ export class DeviceConstruct extends Construct {
         defaultAppSyncResponseMapping
       )
     });
+
+    // Device details of every item in a thing list page; AppSync batches
+    // the nested field into BatchInvoke calls of up to 100 things
+    getDeviceDataSource.createResolver('ThingSummaryDeviceResolver', {
+      typeName: 'ThingSummary',
+      fieldName: 'device',
+      maxBatchSize: 100,
+      responseMappingTemplate: AppSync.MappingTemplate.fromString(
+        defaultAppSyncResponseMapping
+      )
+    });
   }
 }
@@ -22,7 +22,11 @@ import * as Lambda from 'aws-cdk-lib/aws-lambda';
 import * as AppSync from 'aws-cdk-lib/aws-appsync';
 import * as path from 'path';
 import * as IAM from 'aws-cdk-lib/aws-iam';
-import { defaultAppSyncResponseMapping, type FWConstructProps } from './types';
+import {
+  defaultAppSyncResponseMapping,
+  defaultLambdaEnvironment,
+  type FWConstructProps
+} from './types';
 
 export class JobsConstruct extends Construct {
   constructor(scope: Construct, id: string, props: FWConstructProps) {
@@ -83,7 +87,8 @@ export class JobsConstruct extends Construct {
         layers: props.pythonLayer ? [props.pythonLayer] : [],
         role: listJobsLambdaRole,
         environment: {
-          PYTHONPATH: '/var/task:/opt/python'
+          PYTHONPATH: '/var/task:/opt/python',
+          ...defaultLambdaEnvironment
         }
       }
     );
@@ -134,7 +139,8 @@ export class JobsConstruct extends Construct {
         layers: props.pythonLayer ? [props.pythonLayer] : [],
         role: getJobDetailsLambdaRole,
         environment: {
-          PYTHONPATH: '/var/task:/opt/python'
+          PYTHONPATH: '/var/task:/opt/python',
+          ...defaultLambdaEnvironment
         }
       }
     );
@@ -191,7 +197,8 @@ export class JobsConstruct extends Construct {
         layers: props.pythonLayer ? [props.pythonLayer] : [],
         role: listExecutionsLambdaRole,
         environment: {
-          PYTHONPATH: '/var/task:/opt/python'
+          PYTHONPATH: '/var/task:/opt/python',
+          ...defaultLambdaEnvironment
         }
       }
     );
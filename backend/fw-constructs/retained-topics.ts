@@ -22,7 +22,11 @@ import * as Lambda from 'aws-cdk-lib/aws-lambda';
 import * as AppSync from 'aws-cdk-lib/aws-appsync';
 import * as path from 'path';
 import * as IAM from 'aws-cdk-lib/aws-iam';
-import { defaultAppSyncResponseMapping, type FWConstructProps } from './types';
+import {
+  defaultAppSyncResponseMapping,
+  defaultLambdaEnvironment,
+  type FWConstructProps
+} from './types';
 import { RetainedTopicSuffix } from '@bfw/shared/src/appsync';
 
 export class RetainedTopicsConstruct extends Construct {
@@ -78,7 +82,8 @@ export class RetainedTopicsConstruct extends Construct {
         layers: props.pythonLayer ? [props.pythonLayer] : [],
         role: getRetainedTopicLambdaRole,
         environment: {
-          PYTHONPATH: '/var/task:/opt/python'
+          PYTHONPATH: '/var/task:/opt/python',
+          ...defaultLambdaEnvironment
         }
       }
     );
@@ -22,7 +22,11 @@ import * as Lambda from 'aws-cdk-lib/aws-lambda';
 import * as AppSync from 'aws-cdk-lib/aws-appsync';
 import * as path from 'path';
 import * as IAM from 'aws-cdk-lib/aws-iam';
-import { defaultAppSyncResponseMapping, type FWConstructProps } from './types';
+import {
+  defaultAppSyncResponseMapping,
+  defaultLambdaEnvironment,
+  type FWConstructProps
+} from './types';
 
 export default class ThingCountConstruct extends Construct {
   constructor(scope: Construct, id: string, props: FWConstructProps) {
@@ -67,7 +71,8 @@ export default class ThingCountConstruct extends Construct {
         layers: props.pythonLayer ? [props.pythonLayer] : [],
         role: getThingCountLambdaRole,
         environment: {
-          PYTHONPATH: '/var/task:/opt/python'
+          PYTHONPATH: '/var/task:/opt/python',
+          ...defaultLambdaEnvironment
         }
       }
     );
@@ -22,7 +22,11 @@ import * as Lambda from 'aws-cdk-lib/aws-lambda';
 import * as AppSync from 'aws-cdk-lib/aws-appsync';
 import * as path from 'path';
 import * as IAM from 'aws-cdk-lib/aws-iam';
-import { defaultAppSyncResponseMapping, type FWConstructProps } from './types';
+import {
+  defaultAppSyncResponseMapping,
+  defaultLambdaEnvironment,
+  type FWConstructProps
+} from './types';
 import * as cdk from 'aws-cdk-lib';
 
 export default class ThingGroupsConstruct extends Construct {
@@ -91,7 +95,8 @@ export default class ThingGroupsConstruct extends Construct {
         role: listThingGroupRole,
         timeout: cdk.Duration.seconds(30),
         environment: {
-          PYTHONPATH: '/var/task:/opt/python'
+          PYTHONPATH: '/var/task:/opt/python',
+          ...defaultLambdaEnvironment
         }
       }
     );
@@ -18,7 +18,11 @@
  */
 import * as path from 'path';
 import * as IAM from 'aws-cdk-lib/aws-iam';
-import { defaultAppSyncResponseMapping, type FWConstructProps } from './types';
+import {
+  defaultAppSyncResponseMapping,
+  defaultLambdaEnvironment,
+  type FWConstructProps
+} from './types';
 import * as AppSync from 'aws-cdk-lib/aws-appsync';
 import { ShadowName } from '@bfw/shared/src/enums';
 import { Construct } from 'constructs';
@@ -74,7 +78,8 @@ export class ThingShadowConstruct extends Construct {
         layers: props.pythonLayer ? [props.pythonLayer] : [],
         role: getThingShadowLambdaRole,
         environment: {
-          PYTHONPATH: '/var/task:/opt/python'
+          PYTHONPATH: '/var/task:/opt/python',
+          ...defaultLambdaEnvironment
         }
       }
     );
@@ -21,7 +21,11 @@ import * as Lambda from 'aws-cdk-lib/aws-lambda';
 import * as AppSync from 'aws-cdk-lib/aws-appsync';
 import * as path from 'path';
 import * as IAM from 'aws-cdk-lib/aws-iam';
-import { defaultAppSyncResponseMapping, type FWConstructProps } from './types';
+import {
+  defaultAppSyncResponseMapping,
+  defaultLambdaEnvironment,
+  type FWConstructProps
+} from './types';
 import * as cdk from 'aws-cdk-lib';
 
 export class ThingsDataConstruct extends Construct {
@@ -52,6 +56,13 @@ export class ThingsDataConstruct extends Construct {
         ]
       })
     );
+    // Shadow fallback for things missing from the fleet index
+    listThingsLambdaRole.addToPolicy(
+      new IAM.PolicyStatement({
+        actions: ['iot:GetThingShadow'],
+        resources: [`arn:aws:iot:${props.region}:${props.accountId}:thing/*`]
+      })
+    );
 
     // Create the Python Lambda function for list-things
     const listThingsFunction: Lambda.Function = new Lambda.Function(
@@ -71,7 +82,8 @@ export class ThingsDataConstruct extends Construct {
         timeout: cdk.Duration.seconds(30),
         memorySize: 128,
         environment: {
-          PYTHONPATH: '/var/task:/opt/python'
+          PYTHONPATH: '/var/task:/opt/python',
+          ...defaultLambdaEnvironment
         }
       }
     );
@@ -29,6 +29,12 @@ export interface FWConstructProps {
   pythonLayer?: Lambda.LayerVersion;
 }
 
+// Environment shared by the Python Lambda functions. None of them enable
+// active X-Ray tracing, so Powertools skips loading the X-Ray SDK at cold start
+export const defaultLambdaEnvironment: Record<string, string> = {
+  POWERTOOLS_TRACE_DISABLED: 'true'
+};
+
 export const defaultAppSyncResponseMapping: string = `
 #if (!$util.isNull($ctx.result.errors))
   #foreach($error in $ctx.result.errors)
@@ -0,0 +1,106 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Micro-benchmark: firmware extraction from fleet index shadow strings.
+
+Compares decoding the whole indexed shadow (the previous approach in
+get_thing_list and iot_utils) against shared_lib.shadow_utils on synthetic
+250-row search_index pages with the `$package`, `state` and `schedule`
+named shadows populated.
+
+Usage (with the layer requirements installed):
+    python scripts/benchmark_shadow_parsing.py [--pages 20] [--state-keys 60]
+"""
+import argparse
+import json
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend/appsync/lambda-layers/python"))
+
+from shared_lib.shadow_utils import extract_firmware_from_shadow  # noqa: E402
+
+PAGE_SIZE = 250
+
+def random_word(length: int = 8) -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=length))
+
+def make_shadow(state_keys: int) -> str:
+    """Build an indexed shadow string shaped like the fleet index output."""
+    named_state = {random_word(): {"value": random.random(), "unit": random_word(3)} for _ in range(state_keys)}
+    schedule = {"entries": [{"at": random_word(12), "action": random_word()} for _ in range(state_keys // 2)]}
+    shadow = {
+        "reported": {"connected": True, "lastUpdatedAt": 1700000000},
+        "name": {
+            "state": {"state": {"reported": named_state, "desired": named_state}},
+            "schedule": {"state": {"reported": schedule}},
+            "$package": {
+                "state": {"reported": {"appliance-fw": {"version": f"1.{random.randint(0, 99)}.0"}}}
+            }
+        }
+    }
+    return json.dumps(shadow)
+
+def full_parse(shadow: str):
+    """Previous approach: decode everything, then walk to the package."""
+    package_shadow = (
+        json.loads(shadow).get("name", {})
+        .get("$package", {})
+        .get("state", {})
+        .get("reported", {})
+    )
+    if not package_shadow:
+        return None, None
+    return list(package_shadow.keys())[0], list(package_shadow.values())[0].get("version")
+
+def bench(func, pages) -> float:
+    start = time.perf_counter()
+    for page in pages:
+        for shadow in page:
+            func(shadow)
+    return (time.perf_counter() - start) / len(pages)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--state-keys", type=int, default=60)
+    args = parser.parse_args()
+
+    random.seed(0)
+    pages = [[make_shadow(args.state_keys) for _ in range(PAGE_SIZE)] for _ in range(args.pages)]
+    avg_bytes = sum(len(s) for page in pages for s in page) / (args.pages * PAGE_SIZE)
+
+    # Both approaches must agree before timing them
+    for shadow in pages[0]:
+        assert full_parse(shadow) == extract_firmware_from_shadow(shadow)
+
+    baseline = bench(full_parse, pages)
+    targeted = bench(extract_firmware_from_shadow, pages)
+    skipped = bench(lambda shadow: None, pages)
+
+    print(f"{args.pages} pages x {PAGE_SIZE} rows, avg shadow {avg_bytes / 1024:.1f} KB")
+    print(f"full json.loads       : {baseline * 1000:8.2f} ms/page")
+    print(f"targeted extraction   : {targeted * 1000:8.2f} ms/page ({baseline / targeted:.1f}x faster)")
+    print(f"firmware not requested: {skipped * 1000:8.2f} ms/page")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Benchmark: stats record storage as JSON strings, native maps or compressed binary.
+
+Builds a synthetic stats snapshot and stores its distributions three ways:
+as JSON strings (rows written before native maps), as native DynamoDB maps,
+and as zlib-compressed JSON. For each it reports the DynamoDB item size and
+the client-side cost of a read: parsing the GetItem response body,
+deserializing the attribute values and decoding the distributions, as
+get_latest_stats does. The native variant also reports a projected read of
+the fleet totals and a single distribution.
+
+With --table the same items are written to that table under throwaway keys
+and read back with strongly consistent get_item calls, so the latency
+includes the service round trip.
+
+Usage (with the layer requirements installed):
+    python scripts/benchmark_stats_storage.py [--groups 2000] [--reads 200] [--table NAME]
+"""
+import argparse
+import base64
+import json
+import random
+import string
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend/appsync/lambda-layers/python"))
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer  # noqa: E402
+
+from shared_lib import stats_records  # noqa: E402
+from shared_lib.stats_records import DISTRIBUTION_FIELDS, decode_distribution, encode_stats_item  # noqa: E402
+
+# Hard item size limit of DynamoDB
+ITEM_SIZE_LIMIT = 400 * 1024
+
+def random_word(length: int = 10) -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=length))
+
+def make_snapshot(groups: int) -> Dict[str, Any]:
+    """Build a stats snapshot with `groups` thing groups and firmware versions."""
+    def buckets(names: List[str]) -> Dict[str, int]:
+        return {name: random.randint(1, 100000) for name in names}
+    
+    return {
+        "status": "LATEST",
+        "recordTime": "2026-01-01T00:00:00.000000",
+        "registeredDevices": 1000000,
+        "connectedDevices": 600000,
+        "disconnectedDevices": 400000,
+        "brandNameDistribution": buckets(["Acme", "Globex", "Initech", "Umbrella"]),
+        "countryDistribution": buckets(["US", "DE", "JP", "BR", "IN", "FR", "GB", "Unknown"]),
+        "productTypeDistribution": buckets(["washer", "dryer", "oven", "fridge"]),
+        "disconnectDistribution": buckets(["CLIENT_INITIATED_DISCONNECT", "MQTT_KEEP_ALIVE_TIMEOUT", "Unknown"]),
+        "groupDistribution": buckets([f"group-{random_word()}" for _ in range(groups)]),
+        "deviceTypeDistribution": buckets(["gen1", "gen2", "gen3"]),
+        "versionDistribution": {"Firmware": buckets([f"{i // 100}.{i % 100}.{random.randint(0, 9)}" for i in range(groups)])},
+        "ttl": 1800000000
+    }
+
+def attribute_size(value: Any) -> int:
+    """Approximate DynamoDB storage size of an attribute value."""
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        digits = len(str(value).lstrip("-").replace(".", ""))
+        return (digits + 1) // 2 + 1
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return 3 + sum(len(key.encode("utf-8")) + attribute_size(item) + 1 for key, item in value.items())
+    if isinstance(value, list):
+        return 3 + sum(attribute_size(item) + 1 for item in value)
+    raise TypeError(f"Unsupported value {type(value)}")
+
+def item_size(item: Dict[str, Any]) -> int:
+    return sum(len(name.encode("utf-8")) + attribute_size(value) for name, value in item.items())
+
+def response_body(item: Dict[str, Any]) -> str:
+    """GetItem response body as DynamoDB sends it over the wire."""
+    serializer = TypeSerializer()
+    
+    def wire(value: Any) -> Any:
+        if isinstance(value, bytes):
+            return base64.b64encode(value).decode("ascii")
+        if isinstance(value, dict):
+            return {key: wire(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [wire(item) for item in value]
+        return value
+    
+    return json.dumps({"Item": {name: wire(serializer.serialize(value)) for name, value in item.items()}})
+
+def read_item(body: str) -> Dict[str, Any]:
+    """Client-side work of one get_item: parse, deserialize, decode distributions."""
+    deserializer = TypeDeserializer()
+    attributes = json.loads(body)["Item"]
+    item = {}
+    for name, value in attributes.items():
+        if "B" in value:
+            value = {"B": base64.b64decode(value["B"])}
+        item[name] = deserializer.deserialize(value)
+    for name in DISTRIBUTION_FIELDS:
+        if name in item:
+            item[name] = decode_distribution(item[name])
+    return item
+
+def encode_with_threshold(snapshot: Dict[str, Any], threshold: int) -> Dict[str, Any]:
+    original = stats_records.DISTRIBUTION_COMPRESS_BYTES
+    stats_records.DISTRIBUTION_COMPRESS_BYTES = threshold
+    try:
+        return encode_stats_item(snapshot)
+    finally:
+        stats_records.DISTRIBUTION_COMPRESS_BYTES = original
+
+def bench(func: Callable[[], Any], reads: int) -> float:
+    start = time.perf_counter()
+    for _ in range(reads):
+        func()
+    return (time.perf_counter() - start) / reads
+
+def live_read_latency(table_name: str, variants: Dict[str, Dict[str, Any]], reads: int) -> Dict[str, float]:
+    """Write each variant to the table and time strongly consistent reads of it."""
+    import boto3
+    
+    table = boto3.resource("dynamodb").Table(table_name)
+    latencies = {}
+    for label, item in variants.items():
+        key = f"BENCHMARK#{label}"
+        table.put_item(Item=dict(item, recordTime=key))
+        try:
+            table.get_item(Key={"recordTime": key}, ConsistentRead=True)
+            latencies[label] = bench(
+                lambda: read_stored(table.get_item(Key={"recordTime": key}, ConsistentRead=True)["Item"]),
+                reads
+            )
+        finally:
+            table.delete_item(Key={"recordTime": key})
+    return latencies
+
+def read_stored(item: Dict[str, Any]) -> Dict[str, Any]:
+    for name in DISTRIBUTION_FIELDS:
+        if name in item:
+            item[name] = decode_distribution(item[name])
+    return item
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=2000)
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--table", help="device stats table to time live reads against")
+    args = parser.parse_args()
+    
+    random.seed(0)
+    snapshot = make_snapshot(args.groups)
+    json_item = {
+        key: json.dumps(value) if key in DISTRIBUTION_FIELDS else value
+        for key, value in snapshot.items()
+    }
+    variants = {
+        "json strings": json_item,
+        "native maps": encode_with_threshold(snapshot, sys.maxsize),
+        "compressed": encode_with_threshold(snapshot, 0),
+        "default": encode_stats_item(snapshot)
+    }
+    projected = {
+        key: value for key, value in variants["native maps"].items()
+        if key in ("recordTime", "registeredDevices", "connectedDevices", "disconnectedDevices", "countryDistribution")
+    }
+    
+    # Every variant must read back as the original snapshot
+    for item in variants.values():
+        assert read_item(response_body(item)) == snapshot
+    
+    print(f"{args.groups} groups and firmware versions, {args.reads} reads per variant")
+    print(f"{'variant':<22}{'item KB':>10}{'body KB':>10}{'read ms':>10}")
+    for label, item in [*variants.items(), ("native, one projected", projected)]:
+        body = response_body(item)
+        seconds = bench(lambda: read_item(body), args.reads)
+        warning = "  over item limit" if item_size(item) > ITEM_SIZE_LIMIT else ""
+        print(f"{label:<22}{item_size(item) / 1024:>10.1f}{len(body) / 1024:>10.1f}{seconds * 1000:>10.3f}{warning}")
+    
+    if args.table:
+        print(f"live get_item against {args.table}")
+        for label, seconds in live_read_latency(args.table, variants, args.reads).items():
+            print(f"{label:<22}{seconds * 1000:>10.2f} ms")
+
+if __name__ == "__main__":
+    main()
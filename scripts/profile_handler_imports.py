@@ -0,0 +1,110 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Report the import-time (cold start) cost of each Python Lambda handler.
+
+Each handler is imported in a fresh interpreter with `python -X importtime`,
+the same way Lambda loads it (handler directory plus the shared layer on
+sys.path). The report lists total import time per handler and the most
+expensive top-level modules, so regressions in cold start cost are easy to
+attribute.
+
+Usage (with the layer requirements installed):
+    python scripts/profile_handler_imports.py [--top 8] [--handler get_device]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+HANDLERS_DIR = ROOT / "backend/appsync/lambda-functions/python"
+LAYER_DIR = ROOT / "backend/appsync/lambda-layers/python"
+
+# "import time: self [us] | cumulative | imported package"
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def profile_handler(handler_dir: Path) -> Tuple[int, List[Tuple[str, int]]]:
+    """Import one handler in a fresh interpreter and parse -X importtime output.
+    
+    Args:
+        handler_dir: Directory containing handler.py
+        
+    Returns:
+        Tuple of (total microseconds, [(module imported by handler, cumulative microseconds)])
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([str(handler_dir), str(LAYER_DIR)])
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    # Match the deployed functions' environment
+    env.setdefault("POWERTOOLS_TRACE_DISABLED", "true")
+    
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import handler"],
+        env=env, cwd=handler_dir, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    
+    # Children are printed before their parent; depth is encoded as indentation
+    total = 0
+    children: List[Tuple[str, int]] = []
+    handler_children: List[Tuple[str, int]] = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        depth = (len(match.group(3)) - 1) // 2
+        if depth == 1:
+            children.append((match.group(4), int(match.group(2))))
+        elif depth == 0:
+            if match.group(4) == "handler":
+                total = int(match.group(2))
+                handler_children = children
+            children = []
+    
+    ranked = sorted(handler_children, key=lambda item: item[1], reverse=True)
+    return total, ranked
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=8, help="modules to list per handler")
+    parser.add_argument("--handler", action="append", help="only profile these handlers")
+    args = parser.parse_args()
+    
+    handler_dirs = sorted(path.parent for path in HANDLERS_DIR.glob("*/handler.py"))
+    if args.handler:
+        handler_dirs = [path for path in handler_dirs if path.name in args.handler]
+    
+    for handler_dir in handler_dirs:
+        try:
+            total, ranked = profile_handler(handler_dir)
+        except RuntimeError as e:
+            print(f"{handler_dir.name}: import failed: {e}\n")
+            continue
+        print(f"{handler_dir.name}: {total / 1000:.1f} ms")
+        for module, cumulative in ranked[:args.top]:
+            print(f"    {cumulative / 1000:8.1f} ms  {module}")
+        print()
+
+if __name__ == "__main__":
+    main()
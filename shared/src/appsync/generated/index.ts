@@ -300,6 +300,7 @@ export interface Query {
   getCloudwatchMetricData: Maybe<Array<MetricData>>;
   getDefenderMetricData: Maybe<Array<MetricData>>;
   getDevice: Maybe<Device>;
+  getDeviceStatsHistory: Maybe<Array<DeviceStats>>;
   getJobDetails: Maybe<JobDetails>;
   getLatestDeviceStats: Maybe<DeviceStats>;
   getLatestVersionStats: Maybe<DeviceStats>;
@@ -315,6 +316,7 @@ export interface Query {
 }
 
 export interface QueryGetCloudwatchMetricDataArgs {
+  maxPoints: InputMaybe<Scalars['Int']['input']>;
   period: InputMaybe<Scalars['Int']['input']>;
   start: InputMaybe<Scalars['AWSDateTime']['input']>;
   type: CloudwatchMetricType;
@@ -331,10 +333,20 @@ export interface QueryGetDeviceArgs {
   thingName: Scalars['String']['input'];
 }
 
+export interface QueryGetDeviceStatsHistoryArgs {
+  end: InputMaybe<Scalars['AWSDateTime']['input']>;
+  maxPoints: InputMaybe<Scalars['Int']['input']>;
+  start: Scalars['AWSDateTime']['input'];
+}
+
 export interface QueryGetJobDetailsArgs {
   jobId: Scalars['String']['input'];
 }
 
+export interface QueryGetLatestDeviceStatsArgs {
+  knownRecordTime: InputMaybe<Scalars['String']['input']>;
+}
+
 export interface QueryGetRetainedTopicArgs {
   thingName: Scalars['String']['input'];
   topicName: RetainedTopicSuffix;
@@ -412,6 +424,7 @@ export interface ThingSummary {
   brandName: Scalars['String']['output'];
   connected: Scalars['Boolean']['output'];
   country: Scalars['String']['output'];
+  device: Maybe<Device>;
   deviceType: Scalars['String']['output'];
   disconnectReason: Maybe<Scalars['String']['output']>;
   firmwareType: Maybe<Scalars['String']['output']>;
@@ -604,7 +617,7 @@ export type GetDeviceQuery = {
 };
 
 export type GetLatestDeviceStatsQueryVariables = Exact<{
-  [key: string]: never;
+  knownRecordTime: InputMaybe<Scalars['String']['input']>;
 }>;
 
 export type GetLatestDeviceStatsQuery = {
@@ -646,6 +659,22 @@ export type GetLatestVersionStatsQuery = {
   } | null;
 };
 
+export type GetDeviceStatsHistoryQueryVariables = Exact<{
+  start: Scalars['AWSDateTime']['input'];
+  end: InputMaybe<Scalars['AWSDateTime']['input']>;
+  maxPoints: InputMaybe<Scalars['Int']['input']>;
+}>;
+
+export type GetDeviceStatsHistoryQuery = {
+  getDeviceStatsHistory: Array<{
+    recordTime: string;
+    registeredDevices: number;
+    connectedDevices: number;
+    disconnectedDevices: number;
+    disconnectDistribution: string;
+  }> | null;
+};
+
 export type GetThingShadowQueryVariables = Exact<{
   thingName: Scalars['String']['input'];
   shadowName: InputMaybe<Scalars['String']['input']>;
@@ -676,6 +705,7 @@ export type GetCloudwatchMetricDataQueryVariables = Exact<{
   type: CloudwatchMetricType;
   period: InputMaybe<Scalars['Int']['input']>;
   start: InputMaybe<Scalars['AWSDateTime']['input']>;
+  maxPoints: InputMaybe<Scalars['Int']['input']>;
 }>;
 
 export type GetCloudwatchMetricDataQuery = {
@@ -1669,12 +1699,32 @@ export const GetLatestDeviceStatsDocument = {
       kind: 'OperationDefinition',
       operation: 'query',
       name: { kind: 'Name', value: 'GetLatestDeviceStats' },
+      variableDefinitions: [
+        {
+          kind: 'VariableDefinition',
+          variable: {
+            kind: 'Variable',
+            name: { kind: 'Name', value: 'knownRecordTime' }
+          },
+          type: { kind: 'NamedType', name: { kind: 'Name', value: 'String' } }
+        }
+      ],
       selectionSet: {
         kind: 'SelectionSet',
         selections: [
           {
             kind: 'Field',
             name: { kind: 'Name', value: 'getLatestDeviceStats' },
+            arguments: [
+              {
+                kind: 'Argument',
+                name: { kind: 'Name', value: 'knownRecordTime' },
+                value: {
+                  kind: 'Variable',
+                  name: { kind: 'Name', value: 'knownRecordTime' }
+                }
+              }
+            ],
             selectionSet: {
               kind: 'SelectionSet',
               selections: [
@@ -1803,6 +1853,108 @@ export const GetLatestVersionStatsDocument = {
   GetLatestVersionStatsQuery,
   GetLatestVersionStatsQueryVariables
 >;
+export const GetDeviceStatsHistoryDocument = {
+  kind: 'Document',
+  definitions: [
+    {
+      kind: 'OperationDefinition',
+      operation: 'query',
+      name: { kind: 'Name', value: 'GetDeviceStatsHistory' },
+      variableDefinitions: [
+        {
+          kind: 'VariableDefinition',
+          variable: {
+            kind: 'Variable',
+            name: { kind: 'Name', value: 'start' }
+          },
+          type: {
+            kind: 'NonNullType',
+            type: {
+              kind: 'NamedType',
+              name: { kind: 'Name', value: 'AWSDateTime' }
+            }
+          }
+        },
+        {
+          kind: 'VariableDefinition',
+          variable: { kind: 'Variable', name: { kind: 'Name', value: 'end' } },
+          type: {
+            kind: 'NamedType',
+            name: { kind: 'Name', value: 'AWSDateTime' }
+          }
+        },
+        {
+          kind: 'VariableDefinition',
+          variable: {
+            kind: 'Variable',
+            name: { kind: 'Name', value: 'maxPoints' }
+          },
+          type: { kind: 'NamedType', name: { kind: 'Name', value: 'Int' } }
+        }
+      ],
+      selectionSet: {
+        kind: 'SelectionSet',
+        selections: [
+          {
+            kind: 'Field',
+            name: { kind: 'Name', value: 'getDeviceStatsHistory' },
+            arguments: [
+              {
+                kind: 'Argument',
+                name: { kind: 'Name', value: 'start' },
+                value: {
+                  kind: 'Variable',
+                  name: { kind: 'Name', value: 'start' }
+                }
+              },
+              {
+                kind: 'Argument',
+                name: { kind: 'Name', value: 'end' },
+                value: {
+                  kind: 'Variable',
+                  name: { kind: 'Name', value: 'end' }
+                }
+              },
+              {
+                kind: 'Argument',
+                name: { kind: 'Name', value: 'maxPoints' },
+                value: {
+                  kind: 'Variable',
+                  name: { kind: 'Name', value: 'maxPoints' }
+                }
+              }
+            ],
+            selectionSet: {
+              kind: 'SelectionSet',
+              selections: [
+                { kind: 'Field', name: { kind: 'Name', value: 'recordTime' } },
+                {
+                  kind: 'Field',
+                  name: { kind: 'Name', value: 'registeredDevices' }
+                },
+                {
+                  kind: 'Field',
+                  name: { kind: 'Name', value: 'connectedDevices' }
+                },
+                {
+                  kind: 'Field',
+                  name: { kind: 'Name', value: 'disconnectedDevices' }
+                },
+                {
+                  kind: 'Field',
+                  name: { kind: 'Name', value: 'disconnectDistribution' }
+                }
+              ]
+            }
+          }
+        ]
+      }
+    }
+  ]
+} as unknown as DocumentNode<
+  GetDeviceStatsHistoryQuery,
+  GetDeviceStatsHistoryQueryVariables
+>;
 export const GetThingShadowDocument = {
   kind: 'Document',
   definitions: [
@@ -2015,6 +2167,14 @@ export const GetCloudwatchMetricDataDocument = {
             kind: 'NamedType',
             name: { kind: 'Name', value: 'AWSDateTime' }
           }
+        },
+        {
+          kind: 'VariableDefinition',
+          variable: {
+            kind: 'Variable',
+            name: { kind: 'Name', value: 'maxPoints' }
+          },
+          type: { kind: 'NamedType', name: { kind: 'Name', value: 'Int' } }
         }
       ],
       selectionSet: {
@@ -2047,6 +2207,14 @@ export const GetCloudwatchMetricDataDocument = {
                   kind: 'Variable',
                   name: { kind: 'Name', value: 'start' }
                 }
+              },
+              {
+                kind: 'Argument',
+                name: { kind: 'Name', value: 'maxPoints' },
+                value: {
+                  kind: 'Variable',
+                  name: { kind: 'Name', value: 'maxPoints' }
+                }
               }
             ],
             selectionSet: {
@@ -0,0 +1,51 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Pytest setup for the Python Lambda handlers.
+
+Handlers are loaded the way Lambda loads them: the shared layer is put on
+sys.path and each handler.py is imported from its own directory. Every
+handler module is named "handler", so they are imported under unique names.
+"""
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+HANDLERS_DIR = ROOT / "backend/appsync/lambda-functions/python"
+LAYER_DIR = ROOT / "backend/appsync/lambda-layers/python"
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("POWERTOOLS_TRACE_DISABLED", "true")
+os.environ.setdefault("POWERTOOLS_METRICS_NAMESPACE", "Device Monitor")
+sys.path.insert(0, str(LAYER_DIR))
+
+def _load_handler(name: str):
+    spec = importlib.util.spec_from_file_location(f"{name}_handler", HANDLERS_DIR / name / "handler.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture
+def load_handler():
+    """Import a fresh copy of a handler module by its directory name."""
+    return _load_handler
@@ -0,0 +1,124 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Tests for the shared AWS client registry."""
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import boto3
+import pytest
+
+from shared_lib import aws_clients
+
+HANDLER_NAMES = sorted(
+    path.parent.name
+    for path in (Path(__file__).resolve().parents[2] / "backend/appsync/lambda-functions/python").glob("*/handler.py")
+)
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(aws_clients, "_clients", {})
+    monkeypatch.setattr(aws_clients, "_resources", {})
+    return aws_clients
+
+def slow_factory():
+    """boto3.client stand-in that widens the window for racing creations."""
+    def create(service_name, region_name=None, config=None):
+        time.sleep(0.01)
+        return MagicMock(name=f"{service_name}-{region_name}")
+    return MagicMock(side_effect=create)
+
+def test_concurrent_first_use_creates_one_client(registry):
+    factory = slow_factory()
+    start = threading.Barrier(16)
+    clients = []
+    
+    def first_use():
+        start.wait()
+        clients.append(registry.get_client("iot"))
+    
+    with patch.object(boto3, "client", factory):
+        threads = [threading.Thread(target=first_use) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    
+    assert factory.call_count == 1
+    assert all(client is clients[0] for client in clients)
+
+def test_one_client_per_service_and_region(registry):
+    with patch.object(boto3, "client", slow_factory()) as factory:
+        iot = registry.get_client("iot")
+        assert registry.get_client("iot") is iot
+        assert registry.get_client("iot", "eu-west-1") is not iot
+        assert registry.get_client("iot-data") is not iot
+        assert registry.get_client("iot", "eu-west-1") is registry.get_client("iot", "eu-west-1")
+    
+    assert [call.args[0] for call in factory.call_args_list] == ["iot", "iot", "iot-data"]
+    assert [call.kwargs["region_name"] for call in factory.call_args_list] == [None, "eu-west-1", None]
+
+def test_clients_and_resources_share_the_config(registry, monkeypatch):
+    monkeypatch.setattr(registry, "MAX_POOL_CONNECTIONS", 32)
+    monkeypatch.setattr(registry, "RETRY_MODE", "adaptive")
+    monkeypatch.setattr(registry, "MAX_ATTEMPTS", 7)
+    
+    with patch.object(boto3, "client") as client, patch.object(boto3, "resource") as resource:
+        registry.get_client("iot")
+        registry.get_resource("dynamodb")
+    
+    for factory in (client, resource):
+        config = factory.call_args.kwargs["config"]
+        assert config.max_pool_connections == 32
+        assert config.tcp_keepalive is True
+        assert config.retries == {"mode": "adaptive", "max_attempts": 7}
+
+def test_default_pool_covers_the_fan_out_paths():
+    config = aws_clients._client_config()
+    
+    assert config.max_pool_connections >= 10
+    assert config.retries["mode"] in ("standard", "adaptive")
+
+def test_lazy_client_is_created_on_first_attribute_access(registry):
+    with patch.object(boto3, "client", slow_factory()) as factory:
+        iot_client = registry.lazy_client("iot")
+        assert factory.call_count == 0
+        
+        iot_client.search_index(indexName="AWS_Things", queryString="*")
+    
+    assert factory.call_count == 1
+    registry.get_client("iot").search_index.assert_called_once_with(indexName="AWS_Things", queryString="*")
+
+def test_lazy_resource_uses_the_resource_registry(registry):
+    with patch.object(boto3, "resource") as factory:
+        table = registry.lazy_resource("dynamodb").Table("stats")
+    
+    factory.assert_called_once()
+    assert table is registry.get_resource("dynamodb").Table.return_value
+
+@pytest.mark.parametrize("name", HANDLER_NAMES)
+def test_importing_a_handler_creates_no_clients(registry, load_handler, name):
+    with patch.object(boto3, "client") as client, patch.object(boto3, "resource") as resource:
+        load_handler(name)
+    
+    client.assert_not_called()
+    resource.assert_not_called()
+    assert registry._clients == {} and registry._resources == {}
@@ -0,0 +1,88 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+"""Tests for the in-container TTL cache."""
+import json
+
+import pytest
+
+from shared_lib import cache_utils
+from shared_lib.cache_utils import TTLCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_utils.time, "monotonic", lambda: now[0])
+    return now
+
+def size_of(value):
+    return len(json.dumps(value))
+
+def test_least_recently_used_entries_are_evicted_to_fit(clock):
+    value = {"items": ["x" * 20]}
+    cache = TTLCache(max_bytes=3 * size_of(value), default_ttl=60)
+    
+    for key in ("a", "b", "c"):
+        assert cache.set(key, value) == 0
+    assert cache.get("a") == value
+    
+    # "b" is now the least recently used entry
+    assert cache.set("d", value) == 1
+    assert cache.get("b") is None
+    assert [cache.get(key) is not None for key in ("a", "c", "d")] == [True, True, True]
+    assert cache.current_bytes == 3 * size_of(value)
+    assert cache.stats == {"hits": 4, "misses": 1, "evictions": 1}
+
+def test_large_values_evict_several_entries(clock):
+    cache = TTLCache(max_bytes=100, default_ttl=60)
+    for key in range(5):
+        cache.set(key, "x" * 16)
+    
+    assert cache.set("big", "y" * 60) == 3
+    assert len(cache) == 3
+    assert cache.current_bytes <= cache.max_bytes
+
+def test_values_larger_than_the_cache_are_not_stored(clock):
+    cache = TTLCache(max_bytes=10, default_ttl=60)
+    cache.set("small", "x")
+    
+    assert cache.set("huge", "y" * 20) == 0
+    assert cache.get("huge") is None
+    assert cache.get("small") == "x"
+
+def test_replacing_an_entry_updates_its_size(clock):
+    cache = TTLCache(max_bytes=100, default_ttl=60)
+    cache.set("a", "x" * 40)
+    cache.set("a", "x")
+    
+    assert len(cache) == 1
+    assert cache.current_bytes == size_of("x")
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = TTLCache(max_bytes=1000, default_ttl=15)
+    cache.set("default", 1)
+    cache.set("short", 2, ttl=5)
+    
+    clock[0] += 5
+    assert cache.get("short") is None
+    assert cache.get("default") == 1
+    
+    clock[0] += 10
+    assert cache.get("default") is None
+    assert len(cache) == 0
+    assert cache.current_bytes == 0
@@ -0,0 +1,654 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Tests for the device-stats-monitor Lambda."""
+import json
+import random
+import re
+import string
+import tracemalloc
+from typing import Any, Dict, List, Optional
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from shared_lib import stats_records
+
+PAGE_SIZE = 250
+
+def make_fleet(size: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Build a synthetic fleet of fleet index documents."""
+    rng = random.Random(seed)
+    fleet = []
+    for i in range(size):
+        thing: Dict[str, Any] = {
+            "thingName": f"thing-{i:05d}",
+            "attributes": {
+                "brandName": rng.choice(["Acme", "Globex", "Initech"]),
+                "country": rng.choice(["US", "DE", "JP", "BR"]),
+                "productType": rng.choice(["washer", "dryer", "oven"]),
+                "deviceType": rng.choice(["gen1", "gen2"]),
+            },
+            "thingGroupNames": rng.sample(["north", "south", "beta", "lab"], k=rng.randint(0, 2))
+        }
+        if rng.random() < 0.8:
+            thing["attributes"]["firmwareVersion"] = rng.choice(["1.0.0", "1.1.0", "2.0.0"])
+        if rng.random() < 0.1:
+            # Some attributes missing entirely
+            del thing["attributes"]["country"]
+        roll = rng.random()
+        if roll < 0.55:
+            thing["connectivity"] = {"connected": True, "timestamp": 1700000000000}
+        elif roll < 0.95:
+            thing["connectivity"] = {"connected": False, "timestamp": 1700000000000}
+            if rng.random() < 0.7:
+                thing["connectivity"]["disconnectReason"] = rng.choice(
+                    ["CLIENT_INITIATED_DISCONNECT", "MQTT_KEEP_ALIVE_TIMEOUT", "CONNECTION_LOST"]
+                )
+        # else: never connected, no connectivity document
+        fleet.append(thing)
+    return fleet
+
+INDEXED_FIELDS = [
+    "attributes.brandName",
+    "attributes.country",
+    "attributes.productType",
+    "attributes.deviceType",
+    "attributes.firmwareVersion",
+    "connectivity.disconnectReason",
+    "thingGroupNames",
+]
+
+def make_iot_client(fleet: List[Dict[str, Any]], indexed_fields: Optional[List[str]] = None) -> MagicMock:
+    """
+    Mock IoT client that pages through the fleet for the queries the monitor uses.
+    
+    With indexed_fields, get_statistics and get_buckets_aggregation answer
+    from the fleet too, rejecting aggregations on any other field.
+    """
+    client = MagicMock()
+    
+    def matches(thing: Dict[str, Any], query: str) -> bool:
+        if query == "*":
+            return True
+        if query == "connectivity.connected:true":
+            return thing.get("connectivity", {}).get("connected") is True
+        if query == "NOT connectivity.connected:true":
+            return thing.get("connectivity", {}).get("connected") is not True
+        if query.startswith("NOT (") and query.endswith(")"):
+            return not matches(thing, query[len("NOT ("):-1])
+        prefixes = re.findall(r"thingName:(\w)\*", query)
+        if prefixes:
+            return thing["thingName"][0] in prefixes
+        raise AssertionError(f"unexpected query {query}")
+    
+    def search_index(indexName, queryString, maxResults, nextToken=None):
+        matched = [thing for thing in fleet if matches(thing, queryString)]
+        start = int(nextToken or 0)
+        page = matched[start:start + maxResults]
+        response = {"things": page}
+        if start + maxResults < len(matched):
+            response["nextToken"] = str(start + maxResults)
+        return response
+    
+    def list_thing_groups_for_thing(thingName):
+        thing = next(thing for thing in fleet if thing["thingName"] == thingName)
+        return {"thingGroups": [{"groupName": name} for name in thing["thingGroupNames"]]}
+    
+    def field_values(thing: Dict[str, Any], field: str) -> List[str]:
+        value: Any = thing
+        for part in field.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        if value is None:
+            return []
+        return value if isinstance(value, list) else [value]
+    
+    def get_statistics(indexName, queryString, aggregationField):
+        return {"statistics": {"count": sum(1 for thing in fleet if matches(thing, queryString))}}
+    
+    def get_buckets_aggregation(indexName, queryString, aggregationField, bucketsAggregationType):
+        if aggregationField not in indexed_fields:
+            raise client.exceptions.InvalidAggregationException(f"{aggregationField} is not indexed")
+        counts: Dict[str, int] = {}
+        for thing in fleet:
+            if matches(thing, queryString):
+                for value in field_values(thing, aggregationField):
+                    counts[value] = counts.get(value, 0) + 1
+        return {"buckets": [{"keyValue": key, "count": count} for key, count in counts.items()]}
+    
+    client.search_index.side_effect = search_index
+    client.list_thing_groups_for_thing.side_effect = list_thing_groups_for_thing
+    if indexed_fields is not None:
+        client.exceptions.InvalidAggregationException = type("InvalidAggregationException", (Exception,), {})
+        client.get_statistics.side_effect = get_statistics
+        client.get_buckets_aggregation.side_effect = get_buckets_aggregation
+    return client
+
+def legacy_stats(fleet: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Statistics as computed by the original two-scan implementation."""
+    connected = [thing for thing in fleet if thing.get("connectivity", {}).get("connected") is True]
+    distributions: Dict[str, Dict[str, Any]] = {
+        "brandNameDistribution": {},
+        "countryDistribution": {},
+        "productTypeDistribution": {},
+        "disconnectDistribution": {},
+        "groupDistribution": {},
+        "deviceTypeDistribution": {},
+        "versionDistribution": {"Firmware": {}},
+    }
+    
+    def add(name: str, key: str) -> None:
+        distributions[name][key] = distributions[name].get(key, 0) + 1
+    
+    for thing in fleet:
+        attributes = thing.get("attributes", {})
+        add("brandNameDistribution", attributes.get("brandName", "Unknown"))
+        add("countryDistribution", attributes.get("country", "Unknown"))
+        add("productTypeDistribution", attributes.get("productType", "Unknown"))
+        add("deviceTypeDistribution", attributes.get("deviceType", "Unknown"))
+        version = attributes.get("firmwareVersion", "Unknown")
+        if version != "Unknown":
+            firmware = distributions["versionDistribution"]["Firmware"]
+            firmware[version] = firmware.get(version, 0) + 1
+        for group in thing["thingGroupNames"]:
+            add("groupDistribution", group)
+    for thing in fleet:
+        if thing.get("connectivity", {}).get("connected", False) is False:
+            add("disconnectDistribution", thing.get("connectivity", {}).get("disconnectReason", "Unknown"))
+    
+    return {
+        "registeredDevices": len(fleet),
+        "connectedDevices": len(connected),
+        "disconnectedDevices": len(fleet) - len(connected),
+        **distributions
+    }
+
+@pytest.fixture
+def monitor(load_handler):
+    return load_handler("device_stats_monitor")
+
+def assert_matches_legacy(stats: Dict[str, Any], fleet: List[Dict[str, Any]]) -> None:
+    expected = legacy_stats(fleet)
+    for field, value in expected.items():
+        assert stats[field] == value, field
+
+@pytest.mark.parametrize("fleet_size", [0, 1, PAGE_SIZE, 1234])
+def test_single_scan_matches_legacy_statistics(monitor, fleet_size):
+    fleet = make_fleet(fleet_size)
+    monitor.iot_client = make_iot_client(fleet)
+    
+    stats = monitor.get_device_stats()
+    
+    assert_matches_legacy(stats, fleet)
+
+def test_fleet_is_scanned_once(monitor):
+    fleet = make_fleet(1234)
+    monitor.iot_client = make_iot_client(fleet)
+    
+    monitor.get_device_stats()
+    
+    queries = [call.kwargs["queryString"] for call in monitor.iot_client.search_index.call_args_list]
+    assert queries == ["*"] * 5
+
+def test_groups_come_from_index_without_per_thing_calls(monitor):
+    fleet = make_fleet(600)
+    monitor.iot_client = make_iot_client(fleet)
+    
+    stats = monitor.get_device_stats()
+    
+    assert stats["groupDistribution"] == legacy_stats(fleet)["groupDistribution"]
+    monitor.iot_client.list_thing_groups_for_thing.assert_not_called()
+
+def test_dynamic_groups_are_counted_per_group(monitor):
+    fleet = make_fleet(300)
+    monitor.iot_client = make_iot_client(fleet)
+    monitor.INCLUDE_DYNAMIC_GROUPS = True
+    monitor.iot_client.list_thing_groups.return_value = {
+        "thingGroups": [{"groupName": "north"}, {"groupName": "online"}]
+    }
+    monitor.iot_client.describe_thing_group.side_effect = lambda thingGroupName: (
+        {"queryString": "connectivity.connected:true", "indexName": "AWS_Things"}
+        if thingGroupName == "online" else {}
+    )
+    monitor.iot_client.get_statistics.return_value = {"statistics": {"count": 42}}
+    
+    stats = monitor.get_device_stats()
+    
+    groups = stats["groupDistribution"]
+    assert groups["online"] == 42
+    assert groups["north"] == legacy_stats(fleet)["groupDistribution"]["north"]
+    monitor.iot_client.get_statistics.assert_called_once()
+
+@pytest.mark.parametrize("fleet_size", [0, 1, 1234])
+def test_index_backend_matches_scan(monitor, fleet_size):
+    fleet = make_fleet(fleet_size)
+    monitor.iot_client = make_iot_client(fleet, INDEXED_FIELDS)
+    monitor.STATS_AGGREGATION_BACKEND = "index"
+    
+    stats = monitor.get_device_stats()
+    
+    assert_matches_legacy(stats, fleet)
+    monitor.iot_client.search_index.assert_not_called()
+
+def test_index_backend_scans_for_unindexed_fields(monitor):
+    fleet = make_fleet(600)
+    monitor.iot_client = make_iot_client(fleet, ["attributes.brandName", "thingGroupNames"])
+    monitor.STATS_AGGREGATION_BACKEND = "index"
+    
+    stats = monitor.get_device_stats()
+    
+    assert_matches_legacy(stats, fleet)
+    queries = [call.kwargs["queryString"] for call in monitor.iot_client.search_index.call_args_list]
+    assert queries == ["*"] * 3
+
+def make_streaming_iot_client(pages: int) -> MagicMock:
+    """Mock IoT client that builds each search_index page on request, holding no fleet."""
+    client = MagicMock()
+    
+    def search_index(indexName, queryString, maxResults, nextToken=None):
+        page = int(nextToken or 0)
+        things = [
+            {
+                "thingName": f"thing-{page}-{i}",
+                "attributes": {"brandName": "Acme", "country": "US", "firmwareVersion": "1.0.0",
+                               "description": "x" * 512},
+                "thingGroupNames": ["north"],
+                "connectivity": {"connected": i % 2 == 0}
+            }
+            for i in range(maxResults)
+        ]
+        response = {"things": things}
+        if page + 1 < pages:
+            response["nextToken"] = str(page + 1)
+        return response
+    
+    client.search_index.side_effect = search_index
+    return client
+
+def peak_scan_memory(monitor, pages: int) -> int:
+    monitor.iot_client = make_streaming_iot_client(pages)
+    tracemalloc.start()
+    try:
+        stats = monitor.scan_fleet_statistics()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert stats["registeredDevices"] == pages * PAGE_SIZE
+    return peak
+
+def test_scan_memory_is_bounded_by_page_size(monitor):
+    small = peak_scan_memory(monitor, pages=2)
+    large = peak_scan_memory(monitor, pages=40)
+    
+    # Twenty times the fleet, but still about one page resident at a time
+    assert large < small * 2
+
+def make_named_fleet(size: int) -> List[Dict[str, Any]]:
+    """Fleet with varied leading characters in thing names."""
+    rng = random.Random(11)
+    fleet = make_fleet(size)
+    for i, thing in enumerate(fleet):
+        thing["thingName"] = rng.choice(string.ascii_letters + string.digits + "_-:") + f"{i:05d}"
+    return fleet
+
+@pytest.mark.parametrize("shards", [2, 5, 37, 100])
+def test_shard_queries_partition_the_fleet(monitor, shards):
+    fleet = make_named_fleet(2000)
+    client = make_iot_client(fleet, [])
+    queries = monitor.shard_queries(shards)
+    
+    assert len(queries) == min(shards, 37)
+    names = [
+        thing["thingName"]
+        for query in queries
+        for thing in client.search_index(indexName="AWS_Things", queryString=query, maxResults=10000)["things"]
+    ]
+    assert sorted(names) == sorted(thing["thingName"] for thing in fleet)
+
+def test_sharded_scan_matches_sequential_scan(monitor):
+    fleet = make_named_fleet(1500)
+    monitor.iot_client = make_iot_client(fleet, [])
+    monitor.SCAN_SHARDS = 6
+    
+    stats = monitor.get_device_stats()
+    
+    assert_matches_legacy(stats, fleet)
+    queries = {call.kwargs["queryString"] for call in monitor.iot_client.search_index.call_args_list}
+    assert queries == set(monitor.shard_queries(6))
+
+def test_sharded_scan_retries_throttled_pages(monitor):
+    fleet = make_named_fleet(1500)
+    monitor.iot_client = make_iot_client(fleet, [])
+    monitor.SCAN_SHARDS = 4
+    search_index = monitor.iot_client.search_index.side_effect
+    throttled = set()
+    
+    class ThrottlingError(Exception):
+        response = {"Error": {"Code": "ThrottlingException"}}
+    
+    def flaky_search_index(**params):
+        key = (params["queryString"], params.get("nextToken"))
+        if key not in throttled:
+            throttled.add(key)
+            raise ThrottlingError()
+        return search_index(**params)
+    
+    monitor.iot_client.search_index.side_effect = flaky_search_index
+    
+    with patch("shared_lib.pagination.time.sleep") as sleep:
+        stats = monitor.get_device_stats()
+    
+    assert_matches_legacy(stats, fleet)
+    assert sleep.call_count == len(throttled)
+
+def test_sharded_scan_falls_back_when_totals_disagree(monitor):
+    fleet = make_named_fleet(800)
+    monitor.iot_client = make_iot_client(fleet, [])
+    monitor.SCAN_SHARDS = 4
+    # Shards that overlap: every thing is counted twice
+    monitor.shard_queries = lambda shard_count: ["*", "*"]
+    
+    stats = monitor.get_device_stats()
+    
+    assert_matches_legacy(stats, fleet)
+
+class ConditionalCheckFailed(Exception):
+    response = {"Error": {"Code": "ConditionalCheckFailedException"}}
+
+def evaluate(condition: Any, item: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate the boto3 condition expressions the checkpoint uses."""
+    item = item or {}
+    operator = condition.expression_operator
+    values = condition.get_expression()["values"]
+    if operator == "AND":
+        return all(evaluate(value, item) for value in values)
+    if operator == "OR":
+        return any(evaluate(value, item) for value in values)
+    if operator == "attribute_not_exists":
+        return values[0].name not in item
+    if operator in ("=", "<"):
+        if values[0].name not in item:
+            return False
+        actual = item[values[0].name]
+        return actual == values[1] if operator == "=" else actual < values[1]
+    raise AssertionError(f"unexpected operator {operator}")
+
+class FakeStatsTable:
+    """Just enough of a DynamoDB Table for the scan checkpoint and stats records."""
+    
+    def __init__(self):
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.reads = 0
+    
+    def get_item(self, Key, ConsistentRead=False, ProjectionExpression=None):
+        self.reads += 1
+        item = self.items.get(Key["recordTime"])
+        if item and ProjectionExpression:
+            item = {name: item[name] for name in ProjectionExpression.split(", ") if name in item}
+        return {"Item": dict(item)} if item else {}
+    
+    def put_item(self, Item, ConditionExpression=None):
+        if ConditionExpression is not None and not evaluate(ConditionExpression, self.items.get(Item["recordTime"])):
+            raise ConditionalCheckFailed()
+        self.items[Item["recordTime"]] = dict(Item)
+    
+    def update_item(self, Key, UpdateExpression, ConditionExpression,
+                    ExpressionAttributeValues, ExpressionAttributeNames=None):
+        item = self.items.get(Key["recordTime"])
+        if not evaluate(ConditionExpression, item):
+            raise ConditionalCheckFailed()
+        names = ExpressionAttributeNames or {}
+        set_part, _, remove_part = UpdateExpression.partition(" REMOVE ")
+        for assignment in set_part[len("SET "):].split(", "):
+            name, value = assignment.split(" = ")
+            item[names.get(name, name)] = ExpressionAttributeValues[value]
+        for name in filter(None, remove_part.split(", ")):
+            item.pop(names.get(name, name), None)
+
+class FakeContext:
+    """Lambda context that runs into the checkpoint margin after the given number of pages."""
+    
+    def __init__(self, iot_client: MagicMock, request_id: str, pages: int):
+        self.aws_request_id = request_id
+        self.iot_client = iot_client
+        self.start = iot_client.search_index.call_count
+        self.pages = pages
+    
+    def get_remaining_time_in_millis(self) -> int:
+        used = self.iot_client.search_index.call_count - self.start
+        return 30000 + 10000 * (self.pages - used) - 1
+
+@pytest.fixture
+def checkpointed(monitor, monkeypatch):
+    monkeypatch.setenv("DEVICE_STATS_TABLE", "stats")
+    table = FakeStatsTable()
+    monitor.dynamodb = MagicMock()
+    monitor.dynamodb.Table.return_value = table
+    return monitor, table
+
+def test_scan_resumes_across_invocations(checkpointed):
+    monitor, table = checkpointed
+    fleet = make_fleet(1234)
+    monitor.iot_client = make_iot_client(fleet)
+    
+    results = []
+    for i in range(3):
+        results.append(monitor.get_device_stats(FakeContext(monitor.iot_client, f"request-{i}", pages=2)))
+    
+    assert results[:2] == [None, None]
+    assert_matches_legacy(results[2], fleet)
+    # Each page fetched exactly once over the three invocations
+    tokens = [call.kwargs.get("nextToken") for call in monitor.iot_client.search_index.call_args_list]
+    assert tokens == [None, "250", "500", "750", "1000"]
+    assert table.items["SCAN_CHECKPOINT"]["scanStatus"] == "COMPLETE"
+    assert table.items["SCAN_CHECKPOINT"]["generation"] == 1
+
+def test_overlapping_invocation_does_not_scan(checkpointed):
+    monitor, table = checkpointed
+    monitor.iot_client = make_iot_client(make_fleet(1234))
+    first = FakeContext(monitor.iot_client, "request-1", pages=10)
+    
+    # The first invocation holds the lease while it scans
+    assert monitor.claim_scan_pass(table, "request-1", monitor._now_ms() + 60000) is not None
+    
+    assert monitor.get_device_stats(FakeContext(monitor.iot_client, "request-2", pages=10)) is None
+    monitor.iot_client.search_index.assert_not_called()
+    assert table.items["SCAN_CHECKPOINT"]["leaseOwner"] == first.aws_request_id
+
+def test_completed_pass_starts_next_generation(checkpointed):
+    monitor, table = checkpointed
+    fleet = make_fleet(300)
+    monitor.iot_client = make_iot_client(fleet)
+    
+    first = monitor.get_device_stats(FakeContext(monitor.iot_client, "request-1", pages=10))
+    second = monitor.get_device_stats(FakeContext(monitor.iot_client, "request-2", pages=10))
+    
+    assert_matches_legacy(first, fleet)
+    assert_matches_legacy(second, fleet)
+    assert table.items["SCAN_CHECKPOINT"]["generation"] == 2
+
+def test_stale_pass_is_abandoned(checkpointed):
+    monitor, table = checkpointed
+    fleet = make_fleet(1234)
+    monitor.iot_client = make_iot_client(fleet)
+    
+    assert monitor.get_device_stats(FakeContext(monitor.iot_client, "request-1", pages=2)) is None
+    table.items["SCAN_CHECKPOINT"]["startedAt"] -= (monitor.SCAN_PASS_MAX_AGE_SECONDS + 1) * 1000
+    
+    stats = monitor.get_device_stats(FakeContext(monitor.iot_client, "request-2", pages=10))
+    
+    assert_matches_legacy(stats, fleet)
+    assert table.items["SCAN_CHECKPOINT"]["generation"] == 2
+
+def test_handler_publishes_only_completed_passes(checkpointed):
+    monitor, table = checkpointed
+    monitor.iot_client = make_iot_client(make_fleet(1234))
+    monitor.cloudwatch = MagicMock()
+    context = FakeContext(monitor.iot_client, "request-1", pages=2)
+    context.function_name = "DeviceStatsMonitor"
+    context.memory_limit_in_mb = 1024
+    context.invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:DeviceStatsMonitor"
+    
+    response = monitor.lambda_handler({}, context)
+    
+    assert response["statusCode"] == 202
+    monitor.cloudwatch.put_metric_data.assert_not_called()
+    assert list(table.items) == ["SCAN_CHECKPOINT"]
+
+def test_resumable_scan_retries_throttled_pages(checkpointed):
+    monitor, table = checkpointed
+    fleet = make_fleet(1234)
+    monitor.iot_client = make_iot_client(fleet)
+    search_index = monitor.iot_client.search_index.side_effect
+    throttled = set()
+    
+    class ThrottlingError(Exception):
+        response = {"Error": {"Code": "ThrottlingException"}}
+    
+    def flaky_search_index(**params):
+        if params.get("nextToken") not in throttled:
+            throttled.add(params.get("nextToken"))
+            raise ThrottlingError()
+        return search_index(**params)
+    
+    monitor.iot_client.search_index.side_effect = flaky_search_index
+    
+    with patch("shared_lib.pagination.time.sleep") as sleep:
+        stats = monitor.get_device_stats(FakeContext(monitor.iot_client, "request-1", pages=20))
+    
+    assert_matches_legacy(stats, fleet)
+    assert sleep.call_count == len(throttled) == 5
+
+def test_large_checkpoint_counts_are_compressed(checkpointed, monkeypatch):
+    monitor, table = checkpointed
+    monkeypatch.setattr(stats_records, "DISTRIBUTION_COMPRESS_BYTES", 64)
+    fleet = make_fleet(1234)
+    monitor.iot_client = make_iot_client(fleet)
+    
+    assert monitor.get_device_stats(FakeContext(monitor.iot_client, "request-1", pages=2)) is None
+    saved = table.items["SCAN_CHECKPOINT"]["counts"]
+    assert isinstance(saved, bytes)
+    assert stats_records.decode_distribution(saved)["registeredDevices"] == 500
+    
+    stats = monitor.get_device_stats(FakeContext(monitor.iot_client, "request-2", pages=10))
+    
+    assert_matches_legacy(stats, fleet)
+
+def test_checkpoint_written_as_json_string_is_resumed(checkpointed):
+    monitor, table = checkpointed
+    fleet = make_fleet(1234)
+    monitor.iot_client = make_iot_client(fleet)
+    
+    assert monitor.get_device_stats(FakeContext(monitor.iot_client, "request-1", pages=2)) is None
+    checkpoint = table.items["SCAN_CHECKPOINT"]
+    checkpoint["counts"] = json.dumps(stats_records.decode_distribution(checkpoint["counts"]))
+    
+    stats = monitor.get_device_stats(FakeContext(monitor.iot_client, "request-2", pages=10))
+    
+    assert_matches_legacy(stats, fleet)
+
+def test_sharded_scan_warns_that_it_is_not_checkpointed(checkpointed):
+    monitor, table = checkpointed
+    fleet = make_named_fleet(600)
+    monitor.iot_client = make_iot_client(fleet, [])
+    monitor.SCAN_SHARDS = 4
+    
+    with patch.object(monitor.logger, "warning") as warning:
+        stats = monitor.get_device_stats(FakeContext(monitor.iot_client, "request-1", pages=100))
+    
+    assert_matches_legacy(stats, fleet)
+    assert "SCAN_SHARDS=1" in warning.call_args_list[0].args[0]
+    assert "SCAN_CHECKPOINT" not in table.items
+
+def emf_documents(output: str) -> List[Dict[str, Any]]:
+    documents = []
+    for line in output.splitlines():
+        if line.startswith("{") and '"_aws"' in line:
+            documents.append(json.loads(line))
+    return [
+        document for document in documents
+        if document["_aws"]["CloudWatchMetrics"][0]["Namespace"] == "IoTFleetMetrics"
+    ]
+
+def test_metrics_are_emitted_as_emf(monitor, capsys):
+    fleet = make_fleet(500)
+    monitor.iot_client = make_iot_client(fleet)
+    monitor.cloudwatch = MagicMock()
+    monitor.METRIC_DIMENSIONS = ["Country", "DisconnectReason"]
+    stats = monitor.get_device_stats()
+    
+    monitor.publish_metrics(stats)
+    
+    monitor.cloudwatch.put_metric_data.assert_not_called()
+    documents = emf_documents(capsys.readouterr().out)
+    totals = next(document for document in documents if document.get("AggregationType") == "count")
+    assert totals["iotconnectivitydashboard-all-device-count"] == [500]
+    assert totals["iotconnectivitydashboard-connected-device-count"] == [stats["connectedDevices"]]
+    countries = {
+        document["Country"]: document["iotconnectivitydashboard-device-count"][0]
+        for document in documents if "Country" in document
+    }
+    assert countries == stats["countryDistribution"]
+    reasons = {document["DisconnectReason"] for document in documents if "DisconnectReason" in document}
+    assert reasons == set(stats["disconnectDistribution"])
+
+def test_breakdowns_keep_largest_values(monitor):
+    monitor.METRIC_DIMENSIONS = ["ThingGroup"]
+    monitor.METRIC_DIMENSION_MAX_VALUES = 3
+    groups = {f"group-{i}": i for i in range(1, 11)}
+    
+    metric_data = monitor.build_metric_data({"groupDistribution": groups})
+    
+    values = [datum["Dimensions"][0]["Value"] for datum in metric_data[4:]]
+    assert values == ["group-10", "group-9", "group-8"]
+
+def test_put_metric_data_is_chunked(monitor):
+    monitor.cloudwatch = MagicMock()
+    monitor.METRICS_PUBLISHING = "api"
+    monitor.METRIC_DIMENSIONS = ["ThingGroup"]
+    monitor.METRIC_DIMENSION_MAX_VALUES = 5000
+    groups = {f"group-{i}": i for i in range(2500)}
+    
+    monitor.publish_metrics({"registeredDevices": 10, "groupDistribution": groups})
+    
+    sizes = [len(call.kwargs["MetricData"]) for call in monitor.cloudwatch.put_metric_data.call_args_list]
+    assert sizes == [1000, 1000, 504]
+
+def test_topk_mode_bounds_group_and_firmware_buckets(monitor):
+    rng = random.Random(9)
+    fleet = make_fleet(3000)
+    for thing in fleet:
+        # Skewed, high-cardinality groups and versions
+        thing["thingGroupNames"] = [f"group-{min(int(rng.paretovariate(1)), 5000)}"]
+        thing["attributes"]["firmwareVersion"] = f"1.{min(int(rng.paretovariate(1.2)), 900)}"
+    monitor.iot_client = make_iot_client(fleet)
+    monitor.DISTRIBUTION_MODE = "topk"
+    monitor.DISTRIBUTION_TOP_K = 5
+    monitor.TOPK_SKETCH_CAPACITY = 50
+    
+    stats = monitor.get_device_stats()
+    
+    exact = legacy_stats(fleet)
+    groups = stats["groupDistribution"]
+    firmware = stats["versionDistribution"]["Firmware"]
+    assert len(groups) == 6 and "Other" in groups
+    assert sum(groups.values()) == sum(exact["groupDistribution"].values())
+    assert sum(firmware.values()) == sum(exact["versionDistribution"]["Firmware"].values())
+    top_groups = sorted(exact["groupDistribution"], key=exact["groupDistribution"].get, reverse=True)[:3]
+    assert set(top_groups) <= set(groups)
@@ -0,0 +1,287 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Tests for the fleet-event-counter Lambda."""
+import random
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+from unittest.mock import MagicMock
+
+import pytest
+from boto3.dynamodb.types import TypeDeserializer
+
+from test_device_stats_monitor import legacy_stats, make_fleet
+
+class ConditionalCheckFailedException(Exception):
+    pass
+
+class FakeDynamoDB:
+    """Just enough of the DynamoDB client for get_item, put_item and update_item."""
+    
+    def __init__(self):
+        self.items: Dict[tuple, Dict[str, Any]] = {}
+        self.exceptions = SimpleNamespace(ConditionalCheckFailedException=ConditionalCheckFailedException)
+        self.conflicts = 0
+        self.puts = 0
+    
+    def get_item(self, TableName, Key, ConsistentRead):
+        item = self.items.get((Key["pk"]["S"], Key["sk"]["S"]))
+        return {"Item": item} if item else {}
+    
+    def condition_holds(self, put: Dict[str, Any]) -> bool:
+        existing = self.items.get((put["Item"]["pk"]["S"], put["Item"]["sk"]["S"]))
+        if put["ConditionExpression"] == "attribute_not_exists(pk)":
+            return existing is None
+        return existing is not None and existing["version"] == put["ExpressionAttributeValues"][":version"]
+    
+    def put_item(self, **put):
+        self.puts += 1
+        if self.conflicts:
+            self.conflicts -= 1
+            raise ConditionalCheckFailedException()
+        if not self.condition_holds(put):
+            raise ConditionalCheckFailedException()
+        self.items[(put["Item"]["pk"]["S"], put["Item"]["sk"]["S"])] = put["Item"]
+    
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+        key = (Key["pk"]["S"], Key["sk"]["S"])
+        count = int(self.items.get(key, {}).get("count", {"N": "0"})["N"])
+        count += int(ExpressionAttributeValues[":delta"]["N"])
+        self.items[key] = {**Key, "count": {"N": str(count)}}
+    
+    def counters(self) -> Dict[str, Dict[str, int]]:
+        counters: Dict[str, Dict[str, int]] = {}
+        for (pk, sk), item in self.items.items():
+            if sk != "state" and int(item["count"]["N"]):
+                counters.setdefault(pk, {})[sk] = int(item["count"]["N"])
+        return counters
+    
+    def state(self, thing_name: str) -> Dict[str, Any]:
+        deserializer = TypeDeserializer()
+        item = self.items[(f"thing#{thing_name}", "state")]
+        return {key: deserializer.deserialize(value) for key, value in item.items()}
+
+class FakeCountersTable:
+    """Just enough of the counters Table resource for query and batch_writer."""
+    
+    def __init__(self, counts: Dict[tuple, int]):
+        self.counts = dict(counts)
+        self.writes = []
+    
+    def query(self, KeyConditionExpression, ExclusiveStartKey=None):
+        pk = KeyConditionExpression.get_expression()["values"][1]
+        return {"Items": [
+            {"pk": key[0], "sk": key[1], "count": count}
+            for key, count in self.counts.items()
+            if key[0] == pk
+        ]}
+    
+    @contextmanager
+    def batch_writer(self):
+        yield self
+    
+    def put_item(self, Item):
+        self.writes.append((Item["pk"], Item["sk"]))
+        self.counts[(Item["pk"], Item["sk"])] = Item["count"]
+
+def presence(thing_name: str, connected: bool, timestamp: int, reason: Optional[str] = None) -> Dict[str, Any]:
+    event = {
+        "clientId": thing_name,
+        "timestamp": timestamp,
+        "eventType": "connected" if connected else "disconnected",
+        "sessionIdentifier": "00000000-0000-0000-0000-000000000000"
+    }
+    if reason:
+        event["disconnectReason"] = reason
+    return event
+
+def registry(thing_name: str, operation: str, timestamp: int, attributes: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        "eventType": "THING_EVENT",
+        "eventId": f"{thing_name}-{timestamp}",
+        "timestamp": timestamp,
+        "operation": operation,
+        "thingName": thing_name,
+        "attributes": attributes or {}
+    }
+
+@pytest.fixture
+def counter(load_handler, monkeypatch):
+    module = load_handler("fleet_event_counter")
+    module.dynamodb_client = FakeDynamoDB()
+    module.search_thing_document = lambda thing_name: None
+    module.delays = []
+    monkeypatch.setattr(module.time, "sleep", module.delays.append)
+    return module
+
+def test_presence_events_move_connected_count(counter):
+    db = counter.dynamodb_client
+    counter.apply_event(*counter.parse_event(registry("t1", "CREATED", 100, {"brandName": "Acme"})))
+    
+    assert db.counters()["fleet"] == {"registeredDevices": 1}
+    assert db.counters()["disconnectDistribution"] == {"Unknown": 1}
+    
+    counter.apply_event(*counter.parse_event(presence("t1", True, 200)))
+    assert db.counters()["fleet"] == {"registeredDevices": 1, "connectedDevices": 1}
+    assert "disconnectDistribution" not in db.counters()
+    
+    counter.apply_event(*counter.parse_event(presence("t1", False, 300, "MQTT_KEEP_ALIVE_TIMEOUT")))
+    assert db.counters()["fleet"] == {"registeredDevices": 1}
+    assert db.counters()["disconnectDistribution"] == {"MQTT_KEEP_ALIVE_TIMEOUT": 1}
+
+def test_duplicate_and_out_of_order_events_are_dropped(counter):
+    db = counter.dynamodb_client
+    counter.apply_event(*counter.parse_event(registry("t1", "CREATED", 100)))
+    
+    assert counter.apply_event(*counter.parse_event(presence("t1", True, 200)))
+    assert not counter.apply_event(*counter.parse_event(presence("t1", True, 200)))
+    # A disconnect older than the connect must not undo it
+    assert not counter.apply_event(*counter.parse_event(presence("t1", False, 150, "CONNECTION_LOST")))
+    
+    assert db.counters()["fleet"] == {"registeredDevices": 1, "connectedDevices": 1}
+    assert db.state("t1")["presenceTime"] == 200
+
+def test_registry_events_move_attribute_buckets(counter):
+    db = counter.dynamodb_client
+    counter.apply_event(*counter.parse_event(registry("t1", "CREATED", 100, {"country": "US", "firmwareVersion": "1.0.0"})))
+    counter.apply_event(*counter.parse_event(registry("t1", "UPDATED", 200, {"country": "DE", "firmwareVersion": "1.1.0"})))
+    
+    assert db.counters()["countryDistribution"] == {"DE": 1}
+    assert db.counters()["versionDistribution"] == {"1.1.0": 1}
+    
+    counter.apply_event(*counter.parse_event(registry("t1", "DELETED", 300)))
+    assert db.counters() == {}
+
+def test_first_event_starts_from_fleet_index(counter):
+    db = counter.dynamodb_client
+    counter.search_thing_document = lambda thing_name: {
+        "thingName": thing_name,
+        "attributes": {"brandName": "Acme"},
+        "connectivity": {"connected": True, "timestamp": 500}
+    }
+    
+    # Already reflected in the index, so counted by the last scan
+    assert not counter.apply_event(*counter.parse_event(presence("t1", True, 500)))
+    assert counter.apply_event(*counter.parse_event(presence("t1", False, 600, "CLIENT_INITIATED_DISCONNECT")))
+    
+    # Only the change since the scan is applied, so no new registration
+    assert db.counters()["fleet"] == {"connectedDevices": -1}
+    assert db.counters()["disconnectDistribution"] == {"CLIENT_INITIATED_DISCONNECT": 1}
+
+def test_conflicting_writes_are_retried_with_backoff(counter):
+    db = counter.dynamodb_client
+    db.conflicts = 2
+    
+    assert counter.apply_event(*counter.parse_event(registry("t1", "CREATED", 100)))
+    assert db.counters()["fleet"] == {"registeredDevices": 1}
+    assert len(counter.delays) == 2
+    assert counter.delays[0] <= counter.RETRY_BASE_DELAY_SECONDS
+    assert counter.delays[1] <= 2 * counter.RETRY_BASE_DELAY_SECONDS
+    
+    db.conflicts = counter.MAX_UPDATE_ATTEMPTS
+    with pytest.raises(RuntimeError):
+        counter.apply_event(*counter.parse_event(presence("t1", True, 200)))
+
+def test_counters_are_not_part_of_the_state_write(counter):
+    db = counter.dynamodb_client
+    for i in range(20):
+        counter.apply_event(*counter.parse_event(registry(f"t{i}", "CREATED", 100)))
+        counter.apply_event(*counter.parse_event(presence(f"t{i}", True, 200)))
+    
+    # One conditional write per event; the shared fleet counts never block it
+    assert db.puts == 40
+    assert counter.delays == []
+    assert db.counters()["fleet"] == {"registeredDevices": 20, "connectedDevices": 20}
+
+def test_unrelated_events_are_ignored(counter):
+    assert counter.parse_event({"eventType": "subscribed", "clientId": "t1", "timestamp": 1}) is None
+    assert counter.parse_event({"eventType": "THING_GROUP_EVENT", "thingGroupName": "g", "timestamp": 1}) is None
+
+def test_event_counters_match_scan(counter):
+    db = counter.dynamodb_client
+    fleet = make_fleet(400)
+    events = []
+    for thing in fleet:
+        events.append(registry(thing["thingName"], "CREATED", 1000, thing["attributes"]))
+        connectivity = thing.get("connectivity")
+        if connectivity:
+            events.append(presence(thing["thingName"], True, 2000))
+            if not connectivity["connected"]:
+                events.append(presence(thing["thingName"], False, 3000, connectivity.get("disconnectReason")))
+    # Delivery order is not guaranteed, and some events arrive twice
+    events += random.Random(3).sample(events, 100)
+    random.Random(5).shuffle(events)
+    
+    for event in events:
+        counter.apply_event(*counter.parse_event(event))
+    
+    expected = legacy_stats(fleet)
+    counters = db.counters()
+    assert counters["fleet"]["registeredDevices"] == expected["registeredDevices"]
+    assert counters["fleet"].get("connectedDevices", 0) == expected["connectedDevices"]
+    for distribution in ("brandNameDistribution", "countryDistribution", "productTypeDistribution",
+                         "deviceTypeDistribution", "disconnectDistribution"):
+        assert counters[distribution] == expected[distribution], distribution
+    assert counters["versionDistribution"] == expected["versionDistribution"]["Firmware"]
+
+def test_reconcile_only_writes_drifted_counters(monkeypatch):
+    from shared_lib import fleet_counters
+    
+    table = FakeCountersTable({
+        ("fleet", "registeredDevices"): 3,
+        ("fleet", "connectedDevices"): 1,
+        ("countryDistribution", "US"): 2,
+        ("countryDistribution", "DE"): 1,
+        ("countryDistribution", "FR"): 0,
+        ("versionDistribution", "1.0.0"): 3
+    })
+    monkeypatch.setattr(fleet_counters, "dynamodb", MagicMock(Table=MagicMock(return_value=table)))
+    statistics = {
+        "registeredDevices": 3,
+        "connectedDevices": 2,
+        "countryDistribution": {"US": 3},
+        "versionDistribution": {"Firmware": {"1.0.0": 3}}
+    }
+    
+    assert fleet_counters.reconcile_fleet_counters("counters", statistics) == 3
+    assert sorted(table.writes) == [
+        ("countryDistribution", "DE"), ("countryDistribution", "US"), ("fleet", "connectedDevices")
+    ]
+    assert table.counts[("countryDistribution", "DE")] == 0
+    
+    # Nothing left to correct
+    table.writes.clear()
+    assert fleet_counters.reconcile_fleet_counters("counters", statistics) == 0
+    assert table.writes == []
+
+def test_monitor_reconciles_once_per_interval(load_handler, monkeypatch):
+    monitor = load_handler("device_stats_monitor")
+    monitor.reconcile_fleet_counters = MagicMock(return_value=0)
+    now = [1000.0]
+    monkeypatch.setattr(monitor.time, "time", lambda: now[0])
+    
+    monitor.reconcile_counters({"registeredDevices": 1})
+    now[0] += monitor.COUNTER_RECONCILE_INTERVAL_SECONDS - 1
+    monitor.reconcile_counters({"registeredDevices": 1})
+    assert monitor.reconcile_fleet_counters.call_count == 1
+    
+    now[0] += 1
+    monitor.reconcile_counters({"registeredDevices": 1})
+    assert monitor.reconcile_fleet_counters.call_count == 2
@@ -0,0 +1,239 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Tests for the get-cloudwatch-metric-data resolver's series cache."""
+import datetime
+from typing import Any, Dict, List
+from unittest.mock import MagicMock
+
+import pytest
+
+HOUR = 3600
+CONNECTED = "iotconnectivitydashboard-connected-device-count"
+DISCONNECTED = "iotconnectivitydashboard-disconnected-device-count"
+ORIGIN = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+def at(hours: float) -> datetime.datetime:
+    return ORIGIN + datetime.timedelta(hours=hours)
+
+class FakeCloudWatch:
+    """get_metric_data over hourly series, a few data points per page."""
+    
+    page_size = 100
+    
+    def __init__(self, series: Dict[str, Dict[int, float]]):
+        self.series = series
+        self.calls: List[Dict[str, Any]] = []
+    
+    def get_metric_data(self, StartTime, EndTime, MetricDataQueries, NextToken=None):
+        self.calls.append({"StartTime": StartTime, "EndTime": EndTime})
+        points = [
+            (query["Label"], timestamp, value)
+            for query in MetricDataQueries
+            for timestamp, value in sorted(self.series[query["Label"]].items(), reverse=True)
+            if StartTime.timestamp() <= timestamp < EndTime.timestamp()
+        ]
+        start = int(NextToken or 0)
+        page = points[start:start + self.page_size]
+        results: Dict[str, Dict[str, list]] = {}
+        for label, timestamp, value in page:
+            result = results.setdefault(label, {"Label": label, "Timestamps": [], "Values": []})
+            result["Timestamps"].append(datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc))
+            result["Values"].append(value)
+        response: Dict[str, Any] = {"MetricDataResults": list(results.values())}
+        if start + self.page_size < len(points):
+            response["NextToken"] = str(start + self.page_size)
+        return response
+
+class FakeSeriesTable:
+    """Just enough of a DynamoDB Table for the series cache."""
+    
+    def __init__(self):
+        self.items: Dict[Any, Dict[str, Any]] = {}
+    
+    def query(self, KeyConditionExpression, ExclusiveStartKey=None):
+        series_condition, range_condition = KeyConditionExpression.get_expression()["values"]
+        series = series_condition.get_expression()["values"][1]
+        _, low, high = range_condition.get_expression()["values"]
+        items = [
+            item for (key, chunk_start), item in sorted(self.items.items())
+            if key == series and low <= chunk_start <= high
+        ]
+        return {"Items": items}
+    
+    def batch_writer(self):
+        table = self
+        
+        class Batch:
+            def __enter__(self):
+                return self
+            
+            def __exit__(self, *args):
+                return False
+            
+            def put_item(self, Item):
+                table.items[(Item["series"], Item["chunkStart"])] = Item
+        
+        return Batch()
+
+def make_series(hours: int) -> Dict[str, Dict[int, float]]:
+    start = int(ORIGIN.timestamp())
+    return {
+        CONNECTED: {start + hour * HOUR: float(hour % 17) for hour in range(hours)},
+        DISCONNECTED: {start + hour * HOUR: float(hour % 5) for hour in range(hours) if hour % 3}
+    }
+
+@pytest.fixture
+def table():
+    return FakeSeriesTable()
+
+@pytest.fixture
+def cloudwatch():
+    return FakeCloudWatch(make_series(24 * 90))
+
+@pytest.fixture
+def new_container(load_handler, table, cloudwatch):
+    def load():
+        module = load_handler("get_cloudwatch_metric_data")
+        module.METRIC_SERIES_CACHE_TABLE = "series"
+        module.CHUNK_BUCKETS = 100
+        module.dynamodb = MagicMock()
+        module.dynamodb.Table.return_value = table
+        module.cloudwatch_client = cloudwatch
+        return module
+    return load
+
+def expected_points(cloudwatch: FakeCloudWatch, start: datetime.datetime, end: datetime.datetime) -> List[Dict[str, Any]]:
+    return [
+        {
+            "metric": name,
+            "timestamp": datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat(),
+            "value": value
+        }
+        for name in (CONNECTED, DISCONNECTED)
+        for timestamp, value in sorted(cloudwatch.series[name].items(), reverse=True)
+        if start.timestamp() <= timestamp < end.timestamp()
+    ]
+
+def test_warm_container_fetches_only_the_open_tail(new_container, cloudwatch):
+    resolver = new_container()
+    
+    first = resolver.get_cached_series([CONNECTED, DISCONNECTED], HOUR, ORIGIN, at(24 * 60 + 0.5))
+    assert first == expected_points(cloudwatch, ORIGIN, at(24 * 60 + 0.5))
+    assert len(cloudwatch.calls) > 1
+    
+    cloudwatch.calls.clear()
+    second = resolver.get_cached_series([CONNECTED, DISCONNECTED], HOUR, ORIGIN, at(24 * 61 + 0.5))
+    
+    assert second == expected_points(cloudwatch, ORIGIN, at(24 * 61 + 0.5))
+    assert len(cloudwatch.calls) == 1
+    assert cloudwatch.calls[0]["StartTime"] == at(24 * 60)
+
+def test_new_container_reads_completed_buckets_from_table(new_container, cloudwatch):
+    new_container().get_cached_series([CONNECTED, DISCONNECTED], HOUR, ORIGIN, at(24 * 60 + 0.5))
+    cloudwatch.calls.clear()
+    
+    result = new_container().get_cached_series([CONNECTED, DISCONNECTED], HOUR, at(24 * 30), at(24 * 60 + 0.75))
+    
+    assert result == expected_points(cloudwatch, at(24 * 30), at(24 * 60 + 0.75))
+    assert [call["StartTime"] for call in cloudwatch.calls] == [at(24 * 60)]
+
+def test_earlier_start_fetches_only_the_uncached_head(new_container, cloudwatch):
+    resolver = new_container()
+    resolver.get_cached_series([CONNECTED], HOUR, at(24 * 40), at(24 * 60 + 0.5))
+    cloudwatch.calls.clear()
+    
+    result = resolver.get_cached_series([CONNECTED], HOUR, at(24 * 20), at(24 * 60 + 0.5))
+    
+    assert [point["timestamp"] for point in result] == [
+        point["timestamp"] for point in expected_points(cloudwatch, at(24 * 20), at(24 * 60 + 0.5))
+        if point["metric"] == CONNECTED
+    ]
+    assert {(call["StartTime"], call["EndTime"]) for call in cloudwatch.calls} <= {
+        (at(24 * 20), at(24 * 40)), (at(24 * 60), at(24 * 60 + 0.5))
+    }
+
+@pytest.mark.parametrize("days, max_points, period", [
+    (1, 2000, 60),
+    (1, 500, 300),
+    (7, 500, 1800),
+    (30, 3000, 900),
+    (90, 500, 6 * HOUR),
+    (90, 5000, HOUR),
+    (4 * 365, 500, 7 * 24 * HOUR),
+    (10 * 365, 100, 7 * 24 * HOUR),
+])
+def test_auto_period_is_smallest_that_fits(new_container, days, max_points, period):
+    resolver = new_container()
+    
+    assert resolver.choose_period(at(0), at(24 * days), max_points) == period
+
+def test_lttb_keeps_extremes_and_ends():
+    from shared_lib.downsampling import lttb
+    
+    xs = list(range(1000))
+    ys = [0.0] * 1000
+    ys[137], ys[612] = 50.0, -40.0
+    
+    kept = lttb(xs, ys, 20)
+    
+    assert len(kept) == 20
+    assert kept[0] == 0 and kept[-1] == 999
+    assert {137, 612} <= set(kept)
+    assert lttb(xs, ys, 2000) == xs
+
+def test_max_points_downsamples_each_metric(new_container, cloudwatch):
+    resolver = new_container()
+    cloudwatch.page_size = 10000
+    
+    event = {"arguments": {"type": "CONNECTED_DEVICES", "start": "2026-01-01T00:00:00Z", "period": HOUR, "maxPoints": 50}}
+    data = resolver.handler(event, MagicMock())["data"]
+    
+    for name in (CONNECTED, DISCONNECTED):
+        points = [point for point in data if point["metric"] == name]
+        assert len(points) == 50
+        assert points == sorted(points, key=lambda point: point["timestamp"], reverse=True)
+    
+    invalid = resolver.handler({"arguments": {"type": "CONNECTED_DEVICES", "maxPoints": 0}}, MagicMock())
+    assert invalid["errors"][0]["message"] == "maxPoints must be at least 1"
+
+def test_periods_must_be_whole_minutes(new_container):
+    resolver = new_container()
+    
+    for period in (0, 45, 90):
+        response = resolver.handler({"arguments": {"type": "CONNECTED_DEVICES", "period": period}}, MagicMock())
+        assert response["errors"][0]["message"] == "period must be a multiple of 60 seconds"
+    assert resolver._series_cache == {}
+
+def test_least_recently_used_series_are_evicted(new_container, cloudwatch):
+    resolver = new_container()
+    resolver.MAX_CACHED_SERIES = 3
+    
+    for period in (HOUR, 2 * HOUR, 3 * HOUR):
+        resolver.get_cached_series([CONNECTED], period, at(24 * 59), at(24 * 60 + 0.5))
+    resolver.get_cached_series([CONNECTED], HOUR, at(24 * 59), at(24 * 60 + 0.5))
+    resolver.get_cached_series([CONNECTED], 4 * HOUR, at(24 * 59), at(24 * 60 + 0.5))
+    
+    assert list(resolver._series_cache) == [f"{CONNECTED}#{period}" for period in (3 * HOUR, HOUR, 4 * HOUR)]
+    
+    # An evicted series is read back from the table, not CloudWatch
+    cloudwatch.calls.clear()
+    result = resolver.get_cached_series([CONNECTED], 2 * HOUR, at(24 * 59), at(24 * 60 + 0.5))
+    assert len(result) > 0
+    assert [call["StartTime"] for call in cloudwatch.calls] == [at(24 * 60)]
@@ -0,0 +1,181 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Tests for the get-device resolver's single-device and BatchInvoke paths."""
+from unittest.mock import MagicMock
+
+import pytest
+
+from shared_lib import iot_utils
+
+def make_iot_client(fleet):
+    client = MagicMock()
+    client.describe_index.return_value = {"indexStatus": "ACTIVE"}
+    client.exceptions.ResourceNotFoundException = type("ResourceNotFoundException", (Exception,), {})
+    client.describe_thing.side_effect = lambda thingName: {
+        "attributes": {"firmwareVersion": "1.0.0"},
+        "thingTypeName": fleet[thingName]["type"]
+    }
+    client.list_thing_groups_for_thing.side_effect = lambda thingName: {
+        "thingGroups": [{"groupName": group} for group in fleet[thingName]["groups"]]
+    }
+    
+    def search_index(indexName, queryString, maxResults=None, nextToken=None):
+        if queryString.startswith("thingName:("):
+            names = queryString[len("thingName:("):-1].split(" OR ")
+        else:
+            names = [queryString[len("thingName:"):]]
+        return {"things": [
+            {
+                "thingName": name,
+                "connectivity": {
+                    "connected": fleet[name]["connected"],
+                    "timestamp": 1700000000000,
+                    "disconnectReason": None if fleet[name]["connected"] else "CLIENT_INITIATED_DISCONNECT"
+                }
+            }
+            for name in names if name in fleet
+        ]}
+    
+    client.search_index.side_effect = search_index
+    return client
+
+@pytest.fixture
+def fleet():
+    return {
+        f"thing-{i}": {"type": "washer" if i % 2 else "dryer", "groups": [f"group-{i % 3}"], "connected": i % 3 == 0}
+        for i in range(8)
+    }
+
+@pytest.fixture
+def resolver(load_handler, fleet, monkeypatch):
+    monkeypatch.setattr(iot_utils, "iot_client", make_iot_client(fleet))
+    monkeypatch.setattr(iot_utils, "_index_status_cache", {})
+    module = load_handler("get_device")
+    module._fetch_shadow_state = MagicMock(return_value=None)
+    return module
+
+def nested_event(thing_name):
+    return {
+        "arguments": {},
+        "source": {"thingName": thing_name},
+        "info": {"selectionSetList": ["thingName", "connected", "deviceType", "deviceGroups"]}
+    }
+
+# Every Device field, as the details page selects them
+DEVICE_FIELDS = [
+    "thingName", "attributes", "deviceType", "connected", "disconnectReason",
+    "lastConnectedAt", "deviceGroups", "firmwareType", "firmwareVersion"
+]
+
+def single_event(thing_name, fields=None):
+    return {
+        "arguments": {"thingName": thing_name},
+        "info": {"selectionSetList": fields or list(DEVICE_FIELDS)}
+    }
+
+def test_single_device_calls_each_source_once(resolver):
+    resolver.handler(single_event("thing-4"), MagicMock())
+    
+    client = iot_utils.iot_client
+    client.describe_thing.assert_called_once_with(thingName="thing-4")
+    client.list_thing_groups_for_thing.assert_called_once_with(thingName="thing-4")
+    client.search_index.assert_called_once()
+    client.describe_index.assert_called_once()
+    resolver._fetch_shadow_state.assert_called_once_with("thing-4")
+
+def test_single_device_merges_sources(resolver):
+    response = resolver.handler(single_event("thing-4"), MagicMock())
+    
+    assert response["data"] == {
+        "thingName": "thing-4",
+        "attributes": {"firmwareVersion": "1.0.0"},
+        "deviceType": "dryer",
+        "connected": False,
+        "disconnectReason": "CLIENT_INITIATED_DISCONNECT",
+        "lastConnectedAt": 1700000000000,
+        "deviceGroups": ["group-1"],
+        "firmwareType": None,
+        "firmwareVersion": "1.0.0"
+    }
+
+def test_single_device_skips_unselected_sources(resolver):
+    response = resolver.handler(single_event("thing-3", ["thingName", "deviceGroups"]), MagicMock())
+    
+    assert response["data"]["deviceGroups"] == ["group-0"]
+    client = iot_utils.iot_client
+    client.describe_thing.assert_not_called()
+    client.search_index.assert_not_called()
+    resolver._fetch_shadow_state.assert_not_called()
+
+def test_single_device_resolves_when_index_fails(resolver):
+    iot_utils.iot_client.search_index.side_effect = Exception("search_index unavailable")
+    resolver._fetch_shadow_state.return_value = {"state": {"reported": {"connected": True}}}
+    
+    response = resolver.handler(single_event("thing-4"), MagicMock())
+    
+    data = response["data"]
+    assert data["connected"] is True
+    assert data["lastConnectedAt"] is None
+    assert data["deviceType"] == "dryer"
+    assert data["deviceGroups"] == ["group-1"]
+    assert data["firmwareVersion"] == "1.0.0"
+
+def test_single_device_resolves_when_describe_thing_fails(resolver):
+    iot_utils.iot_client.describe_thing.side_effect = Exception("describe_thing unavailable")
+    
+    response = resolver.handler(single_event("thing-3"), MagicMock())
+    
+    data = response["data"]
+    assert data["deviceType"] == "unknown"
+    assert data["attributes"] == {}
+    assert data["connected"] is True
+    assert data["lastConnectedAt"] == 1700000000000
+    assert data["deviceGroups"] == ["group-0"]
+
+def test_batch_returns_responses_in_request_order(resolver, fleet):
+    names = ["thing-3", "thing-1", "thing-3", "thing-6"]
+    
+    responses = resolver.handler([nested_event(name) for name in names], MagicMock())
+    
+    assert [response["data"]["thingName"] for response in responses] == names
+    for name, response in zip(names, responses):
+        assert response["data"]["connected"] == fleet[name]["connected"]
+        assert response["data"]["deviceType"] == fleet[name]["type"]
+        assert response["data"]["deviceGroups"] == fleet[name]["groups"]
+
+def test_batch_coalesces_calls(resolver):
+    names = ["thing-3", "thing-1", "thing-3", "thing-6"]
+    
+    resolver.handler([nested_event(name) for name in names], MagicMock())
+    
+    client = iot_utils.iot_client
+    client.search_index.assert_called_once()
+    assert client.search_index.call_args.kwargs["queryString"] == "thingName:(thing-3 OR thing-1 OR thing-6)"
+    assert sorted(call.kwargs["thingName"] for call in client.describe_thing.call_args_list) == ["thing-1", "thing-3", "thing-6"]
+    assert resolver._fetch_shadow_state.call_count == 3
+
+def test_batch_reports_per_item_errors(resolver):
+    events = [nested_event("thing-2"), {"arguments": {}, "source": {}}, {"arguments": {"thingName": "thing-4"}}]
+    
+    responses = resolver.handler(events, MagicMock())
+    
+    assert responses[0]["data"]["thingName"] == "thing-2"
+    assert responses[1]["errors"][0]["message"] == "Missing required argument: thingName"
+    assert responses[2]["data"]["thingName"] == "thing-4"
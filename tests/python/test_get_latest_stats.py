@@ -0,0 +1,217 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Tests for the get-latest-stats resolver."""
+import json
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import pytest
+from boto3.dynamodb.types import Binary
+
+from shared_lib.stats_records import decode_distribution, encode_distribution
+
+from test_device_stats_monitor import FakeStatsTable, make_fleet, make_iot_client
+
+@pytest.fixture
+def stats_table(monkeypatch):
+    monkeypatch.setenv("DEVICE_STATS_TABLE", "stats")
+    return FakeStatsTable()
+
+@pytest.fixture
+def monitor(load_handler, stats_table):
+    module = load_handler("device_stats_monitor")
+    module.dynamodb = MagicMock()
+    module.dynamodb.Table.return_value = stats_table
+    module.iot_client = make_iot_client(make_fleet(300))
+    return module
+
+@pytest.fixture
+def resolver(load_handler, stats_table):
+    module = load_handler("get_latest_stats")
+    module.dynamodb = MagicMock()
+    module.dynamodb.Table.return_value = stats_table
+    return module
+
+def test_latest_stats_come_from_pointer_item(monitor, resolver, stats_table):
+    first = monitor.get_device_stats()
+    monitor.save_device_stats_to_dynamodb(first)
+    second = dict(first, recordTime="2099-01-01T00:00:00", registeredDevices=301)
+    monitor.save_device_stats_to_dynamodb(second)
+    stats_table.query = MagicMock(side_effect=AssertionError("no query expected"))
+    
+    result = resolver.get_latest_stats()["data"]
+    
+    assert result["recordTime"] == "2099-01-01T00:00:00"
+    assert result["status"] == "LATEST"
+    assert result["registeredDevices"] == 301
+    assert result["countryDistribution"] == first["countryDistribution"]
+    # History rows stay where they are
+    assert {first["recordTime"], second["recordTime"]} <= set(stats_table.items)
+
+def test_pointer_never_moves_backwards(monitor, resolver, stats_table):
+    stats = monitor.get_device_stats()
+    monitor.save_device_stats_to_dynamodb(dict(stats, recordTime="2099-01-01T00:00:00"))
+    monitor.save_device_stats_to_dynamodb(dict(stats, recordTime="2098-01-01T00:00:00"))
+    
+    assert resolver.get_latest_stats()["data"]["recordTime"] == "2099-01-01T00:00:00"
+
+def test_falls_back_to_index_query_without_pointer(resolver, stats_table):
+    stats_table.query = MagicMock(return_value={"Items": [{
+        "status": "LATEST",
+        "recordTime": "2026-01-01T00:00:00",
+        "registeredDevices": 1,
+        "countryDistribution": "{\"US\": 1}"
+    }]})
+    
+    result = resolver.get_latest_stats()["data"]
+    
+    assert result["recordTime"] == "2026-01-01T00:00:00"
+    assert result["countryDistribution"] == {"US": 1}
+
+def test_warm_container_reuses_parsed_stats(monitor, resolver, stats_table, monkeypatch):
+    stats = monitor.get_device_stats()
+    monitor.save_device_stats_to_dynamodb(dict(stats, recordTime="2099-01-01T00:00:00"))
+    
+    first = resolver.get_latest_stats()["data"]
+    reads = stats_table.reads
+    with patch.object(resolver, "decode_distribution", side_effect=AssertionError("no decoding expected")):
+        assert resolver.get_latest_stats()["data"] == first
+        assert stats_table.reads == reads
+        
+        # Past the cache age only the pointer's record time is read
+        monkeypatch.setattr(resolver, "CACHE_MAX_AGE_SECONDS", 0)
+        assert resolver.get_latest_stats()["data"] == first
+        assert stats_table.reads == reads + 1
+    
+    monitor.save_device_stats_to_dynamodb(dict(stats, recordTime="2099-01-02T00:00:00"))
+    assert resolver.get_latest_stats()["data"]["recordTime"] == "2099-01-02T00:00:00"
+
+def test_known_record_time_returns_unchanged(monitor, resolver):
+    stats = monitor.get_device_stats()
+    monitor.save_device_stats_to_dynamodb(dict(stats, recordTime="2099-01-01T00:00:00"))
+    
+    result = resolver.handler({"arguments": {"knownRecordTime": "2099-01-01T00:00:00"}}, MagicMock())["data"]
+    
+    assert result["status"] == "UNCHANGED"
+    assert result["recordTime"] == "2099-01-01T00:00:00"
+    assert result["registeredDevices"] == stats["registeredDevices"]
+    assert result["countryDistribution"] == {}
+    
+    stale = resolver.handler({"arguments": {"knownRecordTime": "2098-01-01T00:00:00"}}, MagicMock())["data"]
+    assert stale["status"] == "LATEST"
+    assert stale["countryDistribution"] == stats["countryDistribution"]
+
+def test_distributions_are_stored_natively(monitor, stats_table, monkeypatch):
+    stats = monitor.get_device_stats()
+    wide_groups = {f"group-{i:05d}": i for i in range(1000)}
+    monitor.save_device_stats_to_dynamodb(dict(stats, groupDistribution=wide_groups))
+    
+    row = stats_table.items[stats["recordTime"]]
+    assert row["countryDistribution"] == stats["countryDistribution"]
+    assert isinstance(row["groupDistribution"], bytes)
+    assert decode_distribution(Binary(row["groupDistribution"])) == wide_groups
+    assert stats_table.items["LATEST_STATS"]["groupDistribution"] == row["groupDistribution"]
+
+def test_decode_distribution_reads_every_stored_form():
+    expected = {"Firmware": {"1.0.0": 3, "": 1}}
+    
+    assert decode_distribution({"Firmware": {"1.0.0": Decimal("3"), "": Decimal("1")}}) == expected
+    assert decode_distribution(json.dumps(expected)) == expected
+    assert decode_distribution(encode_distribution(expected)) == expected
+    with pytest.raises(ValueError):
+        decode_distribution(b"not compressed")
+
+def test_only_selected_distributions_are_read(monitor, resolver, stats_table):
+    stats = monitor.get_device_stats()
+    monitor.save_device_stats_to_dynamodb(stats)
+    stats_table.get_item = MagicMock(side_effect=stats_table.get_item)
+    
+    def query(*fields):
+        event = {"arguments": {}, "info": {"selectionSetList": ["recordTime", *fields]}}
+        return resolver.handler(event, MagicMock())["data"]
+    
+    assert query("countryDistribution")["countryDistribution"] == stats["countryDistribution"]
+    projection = stats_table.get_item.call_args.kwargs["ProjectionExpression"]
+    assert "countryDistribution" in projection and "groupDistribution" not in projection
+    
+    # A later query reads just the distributions the cache doesn't have yet
+    result = query("countryDistribution", "groupDistribution")
+    assert result["groupDistribution"] == stats["groupDistribution"]
+    projection = stats_table.get_item.call_args.kwargs["ProjectionExpression"]
+    assert "groupDistribution" in projection and "countryDistribution" not in projection
+
+def test_pointer_change_rereads_cached_distributions(monitor, resolver):
+    stats = monitor.get_device_stats()
+    monitor.save_device_stats_to_dynamodb(dict(stats, recordTime="2099-01-01T00:00:00"))
+    resolver.get_latest_stats(distributions=["countryDistribution"])
+    
+    newer = dict(stats, recordTime="2099-01-02T00:00:00", countryDistribution={"DE": 1})
+    monitor.save_device_stats_to_dynamodb(newer)
+    # The cache is still fresh, so only the missing distribution is read
+    # and the pointer turns out to have moved on
+    result = resolver.get_latest_stats(distributions=["countryDistribution", "groupDistribution"])["data"]
+    
+    assert result["recordTime"] == "2099-01-02T00:00:00"
+    assert result["countryDistribution"] == {"DE": 1}
+    assert result["groupDistribution"] == stats["groupDistribution"]
+
+@pytest.fixture
+def counters(resolver):
+    resolver.FLEET_COUNTERS_TABLE = "counters"
+    resolver.read_fleet_counters = MagicMock(return_value={
+        "registeredDevices": 302,
+        "connectedDevices": 200,
+        "disconnectedDevices": 102,
+        "countryDistribution": {"US": 302},
+        "versionDistribution": {"Firmware": {"1.0.0": 302}}
+    })
+    return resolver.read_fleet_counters
+
+def test_fleet_counters_are_cached_and_kept_out_of_unchanged(monitor, resolver, counters, monkeypatch):
+    monitor.save_device_stats_to_dynamodb(dict(monitor.get_device_stats(), recordTime="2099-01-01T00:00:00"))
+    
+    full = resolver.get_latest_stats()["data"]
+    unchanged = resolver.get_latest_stats("2099-01-01T00:00:00", ["groupDistribution"])["data"]
+    
+    assert full["registeredDevices"] == 302 and full["countryDistribution"] == {"US": 302}
+    assert unchanged["status"] == "UNCHANGED"
+    assert unchanged["registeredDevices"] == 302
+    assert unchanged["groupDistribution"] == {}
+    counters.assert_called_once()
+    
+    # Counter-backed distributions may have moved under the same recordTime
+    live = resolver.get_latest_stats("2099-01-01T00:00:00", ["countryDistribution"])["data"]
+    assert live["status"] == "LATEST"
+    assert live["countryDistribution"] == {"US": 302}
+    
+    monkeypatch.setattr(resolver, "CACHE_MAX_AGE_SECONDS", 0)
+    resolver.get_latest_stats()
+    assert counters.call_count == 2
+
+def test_fleet_counters_only_overlay_selected_distributions(monitor, resolver, counters):
+    stats = monitor.get_device_stats()
+    monitor.save_device_stats_to_dynamodb(stats)
+    
+    event = {"arguments": {}, "info": {"selectionSetList": ["recordTime", "registeredDevices", "countryDistribution"]}}
+    result = resolver.handler(event, MagicMock())["data"]
+    
+    assert result["registeredDevices"] == 302
+    assert result["countryDistribution"] == {"US": 302}
+    assert "groupDistribution" not in result and "versionDistribution" not in result
@@ -0,0 +1,144 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+"""Tests for the get-thing-list resolver's page cache and field projection."""
+from unittest.mock import MagicMock
+
+import pytest
+
+from shared_lib import cache_utils
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_utils.time, "monotonic", lambda: now[0])
+    return now
+
+@pytest.fixture
+def resolver(load_handler, clock):
+    module = load_handler("get_thing_list")
+    module.iot_client = MagicMock()
+    module.iot_client.search_index.side_effect = lambda **params: {"things": [
+        {"thingName": f"thing-{i}", "connectivity": {"connected": True}} for i in range(params["maxResults"])
+    ]}
+    module.get_device_connection_statuses = lambda names, things: {name: True for name in names}
+    module.metrics = MagicMock()
+    return module
+
+def metric_counts(resolver):
+    counts = {}
+    for call in resolver.metrics.add_metric.call_args_list:
+        counts[call.kwargs["name"]] = counts.get(call.kwargs["name"], 0) + call.kwargs["value"]
+    return counts
+
+COUNTRY_FILTER = {"filters": [{"fieldName": "attributes.country", "operator": "eq", "value": "US"}]}
+CONNECTED_FILTER = {"filters": [{"fieldName": "connectivity.connected", "operator": "eq", "value": "true"}]}
+
+def test_connectivity_queries_use_the_shorter_ttl(resolver):
+    assert resolver.get_page_cache_ttl("(connectivity.connected:true)") == resolver.PAGE_CACHE_CONNECTIVITY_TTL_SECONDS
+    assert resolver.get_page_cache_ttl("(attributes.country:US)") == resolver.PAGE_CACHE_TTL_SECONDS
+    assert resolver.PAGE_CACHE_CONNECTIVITY_TTL_SECONDS < resolver.PAGE_CACHE_TTL_SECONDS
+
+def test_pages_are_served_from_cache_until_expired(resolver, clock):
+    first = resolver.get_thing_list(COUNTRY_FILTER, 2, None)
+    assert resolver.get_thing_list(COUNTRY_FILTER, 2, None) == first
+    resolver.get_thing_list(CONNECTED_FILTER, 2, None)
+    resolver.get_thing_list(CONNECTED_FILTER, 2, None)
+    assert resolver.iot_client.search_index.call_count == 2
+    assert metric_counts(resolver) == {"ThingListCacheHit": 2, "ThingListCacheMiss": 2}
+    
+    # Past the connectivity TTL only the connectivity page is fetched again
+    clock[0] += resolver.PAGE_CACHE_CONNECTIVITY_TTL_SECONDS
+    resolver.get_thing_list(COUNTRY_FILTER, 2, None)
+    resolver.get_thing_list(CONNECTED_FILTER, 2, None)
+    assert resolver.iot_client.search_index.call_count == 3
+    
+    clock[0] += resolver.PAGE_CACHE_TTL_SECONDS
+    resolver.get_thing_list(COUNTRY_FILTER, 2, None)
+    assert resolver.iot_client.search_index.call_count == 4
+
+def test_page_size_and_token_are_part_of_the_key(resolver):
+    resolver.get_thing_list(COUNTRY_FILTER, 2, None)
+    resolver.get_thing_list(COUNTRY_FILTER, 3, None)
+    resolver.get_thing_list(COUNTRY_FILTER, 2, "token")
+    
+    assert resolver.iot_client.search_index.call_count == 3
+
+def test_evictions_are_reported(resolver):
+    page_size = len(cache_utils.json.dumps(resolver.get_thing_list(COUNTRY_FILTER, 2, None), default=str))
+    resolver.page_cache.clear()
+    resolver.page_cache.max_bytes = 2 * page_size
+    
+    resolver.get_thing_list(COUNTRY_FILTER, 2, None)
+    resolver.get_thing_list(COUNTRY_FILTER, 2, "page-2")
+    resolver.get_thing_list(COUNTRY_FILTER, 2, "page-3")
+    
+    assert metric_counts(resolver)["ThingListCacheEviction"] == 1
+    assert resolver.page_cache.stats["evictions"] == 1
+    assert len(resolver.page_cache) == 2
+
+def projected(resolver, *fields):
+    selection_set = ["nextToken", "items"] + [f"items/{field}" for field in fields]
+    return resolver.FieldProjection(selection_set, resolver.THING_SUMMARY_FIELD_DEPENDENCIES, prefix="items/")
+
+@pytest.fixture
+def tracked(resolver):
+    resolver.get_device_connection_statuses = MagicMock(side_effect=lambda names, things: {name: True for name in names})
+    resolver.extract_firmware_from_shadow = MagicMock(return_value=("app", "1.2.3"))
+    resolver.iot_client.search_index.side_effect = lambda **params: {"things": [
+        {"thingName": f"thing-{i}", "connectivity": {"connected": True}, "shadow": "{}"} for i in range(params["maxResults"])
+    ]}
+    return resolver
+
+def test_unselected_fields_skip_their_work(tracked):
+    page = tracked.get_thing_list(COUNTRY_FILTER, 2, None, projected(tracked, "thingName", "country"))
+    
+    assert [item["thingName"] for item in page["items"]] == ["thing-0", "thing-1"]
+    assert [item["connected"] for item in page["items"]] == [False, False]
+    assert [item["firmwareVersion"] for item in page["items"]] == [None, None]
+    tracked.get_device_connection_statuses.assert_not_called()
+    tracked.extract_firmware_from_shadow.assert_not_called()
+
+def test_selected_fields_run_their_work(tracked):
+    page = tracked.get_thing_list(COUNTRY_FILTER, 2, None, projected(tracked, "thingName", "connected", "firmwareVersion"))
+    
+    assert [item["connected"] for item in page["items"]] == [True, True]
+    assert [item["firmwareVersion"] for item in page["items"]] == ["1.2.3", "1.2.3"]
+    tracked.get_device_connection_statuses.assert_called_once()
+    assert tracked.extract_firmware_from_shadow.call_count == 2
+
+def test_required_work_is_part_of_the_key(tracked):
+    tracked.get_thing_list(COUNTRY_FILTER, 2, None, projected(tracked, "thingName"))
+    tracked.get_thing_list(COUNTRY_FILTER, 2, None, projected(tracked, "thingName", "connected"))
+    # Same work as the first request, so served from its cached page
+    tracked.get_thing_list(COUNTRY_FILTER, 2, None, projected(tracked, "thingName", "country"))
+    
+    assert tracked.iot_client.search_index.call_count == 2
+    assert metric_counts(tracked) == {"ThingListCacheHit": 1, "ThingListCacheMiss": 2}
+
+def test_handler_projects_the_selection_set(tracked):
+    event = {
+        "arguments": {"filter": COUNTRY_FILTER, "limit": 2},
+        "info": {"selectionSetList": ["items", "items/thingName", "nextToken"]}
+    }
+    
+    response = tracked.handler(event, MagicMock())
+    
+    assert [item["thingName"] for item in response["data"]["items"]] == ["thing-0", "thing-1"]
+    tracked.get_device_connection_statuses.assert_not_called()
+    tracked.extract_firmware_from_shadow.assert_not_called()
@@ -0,0 +1,110 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+"""Tests for the shared IoT helpers' index status cache and batched index search."""
+from unittest.mock import MagicMock
+
+import pytest
+
+from shared_lib import iot_utils
+
+ResourceNotFoundException = type("ResourceNotFoundException", (Exception,), {})
+
+@pytest.fixture
+def iot_client(monkeypatch):
+    client = MagicMock()
+    client.exceptions.ResourceNotFoundException = ResourceNotFoundException
+    monkeypatch.setattr(iot_utils, "iot_client", client)
+    monkeypatch.setattr(iot_utils, "_index_status_cache", {})
+    monkeypatch.setattr(iot_utils, "index_status_cache_stats", {"hits": 0, "misses": 0})
+    return client
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(iot_utils.time, "monotonic", lambda: now[0])
+    return now
+
+def test_index_status_is_cached_for_ttl(iot_client, clock):
+    iot_client.describe_index.return_value = {"indexStatus": "ACTIVE"}
+    
+    assert iot_utils.get_index_status() == "ACTIVE"
+    clock[0] += iot_utils.INDEX_STATUS_TTL_SECONDS - 1
+    assert iot_utils.get_index_status() == "ACTIVE"
+    assert iot_client.describe_index.call_count == 1
+    assert iot_utils.index_status_cache_stats == {"hits": 1, "misses": 1}
+    
+    # Expired entries are described again
+    iot_client.describe_index.return_value = {"indexStatus": "REBUILDING"}
+    clock[0] += 1
+    assert iot_utils.get_index_status() == "REBUILDING"
+    assert iot_client.describe_index.call_count == 2
+
+def test_missing_index_is_cached_as_not_enabled(iot_client, clock):
+    iot_client.describe_index.side_effect = ResourceNotFoundException()
+    
+    assert iot_utils.get_index_status() == iot_utils.INDEX_NOT_ENABLED
+    assert iot_utils.get_index_status() == iot_utils.INDEX_NOT_ENABLED
+    assert iot_client.describe_index.call_count == 1
+    assert iot_utils.get_fleet_index_details("thing-1") == {"connected": False}
+    iot_client.search_index.assert_not_called()
+
+def test_other_index_errors_are_not_cached(iot_client, clock):
+    iot_client.describe_index.side_effect = [RuntimeError("throttled"), {"indexStatus": "ACTIVE"}]
+    
+    with pytest.raises(RuntimeError):
+        iot_utils.get_index_status()
+    assert iot_utils.get_index_status() == "ACTIVE"
+    assert iot_client.describe_index.call_count == 2
+
+def test_search_thing_documents_queries_in_chunks(iot_client, monkeypatch):
+    monkeypatch.setattr(iot_utils, "CONNECTION_STATUS_CHUNK_SIZE", 3)
+    names = [f"thing-{i}" for i in range(7)]
+    
+    def search_index(indexName, queryString, maxResults, nextToken=None):
+        chunk = queryString[len("thingName:("):-1].split(" OR ")
+        # Each chunk is answered in two pages; thing-5 is not indexed
+        things = [{"thingName": name, "connectivity": {"connected": True}} for name in chunk if name != "thing-5"]
+        if nextToken is None and len(things) > 1:
+            return {"things": things[:1], "nextToken": queryString}
+        return {"things": things[1:] if nextToken else things}
+    
+    iot_client.search_index.side_effect = search_index
+    
+    documents = iot_utils.search_thing_documents(names + ["thing-0", ""])
+    
+    assert sorted(documents) == [name for name in names if name != "thing-5"]
+    first_pages = [call.kwargs for call in iot_client.search_index.call_args_list if "nextToken" not in call.kwargs]
+    assert [(call["queryString"], call["maxResults"]) for call in first_pages] == [
+        ("thingName:(thing-0 OR thing-1 OR thing-2)", 3),
+        ("thingName:(thing-3 OR thing-4 OR thing-5)", 3),
+        ("thingName:(thing-6)", 1)
+    ]
+    assert iot_client.search_index.call_count == 5
+
+def test_failing_chunk_is_left_out(iot_client, monkeypatch):
+    monkeypatch.setattr(iot_utils, "CONNECTION_STATUS_CHUNK_SIZE", 2)
+    
+    def search_index(indexName, queryString, maxResults, nextToken=None):
+        if "thing-2" in queryString:
+            raise RuntimeError("throttled")
+        return {"things": [{"thingName": name} for name in queryString[len("thingName:("):-1].split(" OR ")]}
+    
+    iot_client.search_index.side_effect = search_index
+    
+    assert sorted(iot_utils.search_thing_documents(["thing-0", "thing-1", "thing-2", "thing-3"])) == ["thing-0", "thing-1"]
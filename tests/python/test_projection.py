@@ -0,0 +1,77 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Tests for selection-set field projection."""
+from shared_lib.projection import FieldProjection
+
+DEPENDENCIES = {
+    "thingName": [],
+    "connected": ["connection_status", "shadow"],
+    "deviceGroups": ["thing_groups"],
+    "firmwareVersion": ["fleet_index", "describe_thing"]
+}
+
+def event(selection_set):
+    return {"arguments": {}, "info": {"selectionSetList": selection_set}}
+
+def test_from_event_keeps_top_level_fields():
+    projection = FieldProjection.from_event(event(["thingName", "deviceGroups", "deviceGroups/name"]), DEPENDENCIES)
+    
+    assert projection.fields == {"thingName", "deviceGroups"}
+    assert projection.required_work == {"thing_groups"}
+
+def test_from_event_strips_the_items_prefix():
+    selection_set = ["nextToken", "items", "items/thingName", "items/connected", "items/shadow/version"]
+    
+    projection = FieldProjection.from_event(event(selection_set), DEPENDENCIES, prefix="items/")
+    
+    assert projection.fields == {"thingName", "connected"}
+    assert projection.requested("connected")
+    assert not projection.requested("nextToken", "firmwareVersion")
+
+def test_needs_only_the_work_of_requested_fields():
+    projection = FieldProjection.from_event(event(["connected", "firmwareVersion"]), DEPENDENCIES)
+    
+    assert projection.needs("connection_status")
+    assert projection.needs("shadow")
+    assert projection.needs("fleet_index")
+    assert projection.needs("describe_thing")
+    assert not projection.needs("thing_groups")
+
+def test_unknown_fields_need_no_work():
+    projection = FieldProjection.from_event(event(["thingName", "__typename"]), DEPENDENCIES)
+    
+    assert projection.required_work == frozenset()
+    assert not projection.needs("describe_thing")
+
+def test_missing_selection_set_requests_everything():
+    for missing in ({"arguments": {}}, {"arguments": {}, "info": None}, {"arguments": {}, "info": {}}):
+        projection = FieldProjection.from_event(missing, DEPENDENCIES, prefix="items/")
+        
+        assert projection.fields is None
+        assert projection.requested("anything")
+        assert projection.required_work == {"connection_status", "shadow", "thing_groups", "fleet_index", "describe_thing"}
+
+def test_work_is_comparable_across_projections():
+    dependencies = {"firmwareType": ["firmware"], "firmwareVersion": ["firmware"]}
+    first = FieldProjection.from_event(event(["items/firmwareType"]), dependencies, prefix="items/")
+    second = FieldProjection.from_event(event(["items/firmwareVersion"]), dependencies, prefix="items/")
+    
+    assert first.fields != second.fields
+    assert first.required_work == second.required_work
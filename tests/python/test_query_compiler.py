@@ -0,0 +1,88 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+"""Tests for the filter normalization and compiled query cache."""
+import pytest
+
+from shared_lib import query_compiler
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    query_compiler._compile_normalized.cache_clear()
+
+def test_equivalent_filters_normalize_equal():
+    first = {
+        "operation": "or",
+        "filters": [
+            {"fieldName": "attributes.country", "operator": "eq", "value": "US"},
+            {"fieldName": "favorite", "operator": "eq", "value": "true"},
+            {"fieldName": "connectivity.connected", "operator": "eq", "value": "true"}
+        ],
+        "favoriteDevices": ["thing-2", "thing-1", "thing-2"]
+    }
+    second = {
+        "operation": "OR",
+        "filters": [
+            {"fieldName": "connectivity.connected", "operator": "eq", "value": "true"},
+            {"fieldName": "attributes.country", "operator": "eq", "value": "US"},
+            {"fieldName": "attributes.country", "operator": "eq", "value": "US"},
+            {"fieldName": "favorite", "operator": "eq", "value": "true"}
+        ],
+        "favoriteDevices": ["thing-1", "thing-2"]
+    }
+    
+    normalized = query_compiler.normalize_filter(first)
+    assert normalized == query_compiler.normalize_filter(second)
+    assert normalized == (
+        "or",
+        (("attributes.country", "eq", "US"), ("connectivity.connected", "eq", "true")),
+        ("thing-1", "thing-2")
+    )
+    assert query_compiler.compile_query(first) == (
+        "(thingName = (thing-1 OR thing-2)) OR (attributes.country:US) OR (connectivity.connected:true)"
+    )
+
+def test_favorites_are_ignored_without_favorite_filter():
+    assert query_compiler.normalize_filter({"filters": [], "favoriteDevices": ["thing-1"]}) is None
+    assert query_compiler.compile_query(None) == "*"
+
+def test_list_values_are_hashable():
+    between = {"filters": [{"fieldName": "attributes.size", "operator": "between", "value": [1, 5]}]}
+    nested = {"filters": [{"fieldName": "attributes.size", "operator": "eq", "value": [[1, 2], [3]]}]}
+    
+    assert query_compiler.normalize_filter(between) == ("and", (("attributes.size", "between", (1, 5)),), None)
+    assert query_compiler.normalize_filter(nested) == ("and", (("attributes.size", "eq", ((1, 2), (3,))),), None)
+    assert query_compiler.compile_query(between) == "(attributes.size : [1 TO 5])"
+    assert query_compiler.compile_query(between) == "(attributes.size : [1 TO 5])"
+    assert query_compiler.query_cache_info()["hits"] == 1
+
+def test_dict_values_are_rejected():
+    with pytest.raises(ValueError):
+        query_compiler.normalize_filter({"filters": [{"fieldName": "a", "operator": "eq", "value": {"b": 1}}]})
+
+def test_equivalent_filters_share_a_cache_entry():
+    query_compiler.compile_query({"filters": [
+        {"fieldName": "a", "operator": "eq", "value": "1"},
+        {"fieldName": "b", "operator": "ne", "value": "2"}
+    ]})
+    query_compiler.compile_query({"operation": "AND", "filters": [
+        {"fieldName": "b", "operator": "ne", "value": "2"},
+        {"fieldName": "a", "operator": "eq", "value": "1"}
+    ]})
+    
+    assert query_compiler.query_cache_info() == {"hits": 1, "misses": 1, "size": 1}
@@ -0,0 +1,60 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+"""Tests for firmware extraction from indexed shadow strings."""
+import json
+
+import pytest
+
+from shared_lib import shadow_utils
+
+PACKAGE = {"state": {"reported": {"appliance-fw": {"version": "1.2.0"}}}}
+
+def shadow(**named):
+    return json.dumps({"reported": {"connected": True}, "name": named})
+
+@pytest.mark.parametrize("text, expected", [
+    (shadow(state={"state": {"reported": {"mode": "eco"}}}, **{"$package": PACKAGE}), ("appliance-fw", "1.2.0")),
+    # The key inside a string value is escaped and must not be matched
+    (shadow(state={"state": {"reported": {"note": '"$package": {"state": {}}'}}}, **{"$package": PACKAGE}),
+     ("appliance-fw", "1.2.0")),
+    # A device-reported "$package" ahead of the named shadow
+    (json.dumps({"reported": {"$package": {"state": {"reported": {"other-fw": {"version": "9.9"}}}}},
+                 "name": {"$package": PACKAGE}}), ("appliance-fw", "1.2.0")),
+    (json.dumps({"reported": {"$package": {"state": {"reported": {"other-fw": {"version": "9.9"}}}}}}), (None, None)),
+    # The only "$package" text is a value, not a key
+    (json.dumps({"reported": {"kind": "$package"}}), (None, None)),
+    (shadow(**{"$package": {"state": None}}), (None, None)),
+    (shadow(**{"$package": {"state": {"reported": {}}}}), (None, None)),
+    (shadow(**{"$package": {"state": {"reported": {"appliance-fw": "1.2.0"}}}}), ("appliance-fw", None)),
+    (shadow(state={"state": {}}), (None, None)),
+    ('{"name": {"$package": {"state": {"reported": ', (None, None)),
+    ('{"name": {"$package": [1, 2', (None, None)),
+    ("", (None, None)),
+    (None, (None, None))
+])
+def test_fast_path_matches_full_parse(text, expected):
+    assert shadow_utils.extract_firmware_from_shadow(text) == expected
+    if text:
+        assert shadow_utils._parse_full_shadow(text) == expected
+
+def test_shadows_without_package_are_not_decoded(monkeypatch):
+    monkeypatch.setattr(shadow_utils, "_parse_full_shadow", None)
+    monkeypatch.setattr(shadow_utils, "_decoder", None)
+    
+    assert shadow_utils.extract_firmware_from_shadow(shadow(state={"state": {}})) == (None, None)
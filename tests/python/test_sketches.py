@@ -0,0 +1,66 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Tests for the bounded-size distribution summaries."""
+import random
+from collections import Counter
+
+from shared_lib.sketches import OTHER_BUCKET, SpaceSaving, top_k
+
+def zipf_stream(size: int, keys: int, seed: int = 1):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    return rng.choices([f"key-{rank}" for rank in range(keys)], weights=weights, k=size)
+
+def test_space_saving_bounds():
+    stream = zipf_stream(50000, 5000)
+    exact = Counter(stream)
+    sketch = SpaceSaving(200)
+    for key in stream:
+        sketch.add(key)
+    
+    assert len(sketch.counts) == 200
+    assert sum(sketch.counts.values()) == sketch.total == len(stream)
+    # Counts never underestimate
+    for key, count in sketch.counts.items():
+        assert count >= exact[key]
+    # Every key above total / capacity is tracked
+    for key, count in exact.items():
+        if count > len(stream) / 200:
+            assert key in sketch.counts
+
+def test_space_saving_finds_top_keys():
+    stream = zipf_stream(50000, 5000)
+    sketch = SpaceSaving(1000)
+    for key in stream:
+        sketch.add(key)
+    
+    exact_top = [key for key, _ in Counter(stream).most_common(10)]
+    sketch_top = sorted(sketch.counts, key=sketch.counts.get, reverse=True)[:10]
+    assert sketch_top == exact_top
+
+def test_top_k_folds_tail_into_other():
+    distribution = {f"v{i}": i for i in range(1, 101)}
+    distribution[OTHER_BUCKET] = 7
+    
+    bounded = top_k(distribution, 5)
+    
+    assert list(bounded) == ["v100", "v99", "v98", "v97", "v96", OTHER_BUCKET]
+    assert sum(bounded.values()) == sum(distribution.values())
+    assert top_k({"a": 1}, 5) == {"a": 1}
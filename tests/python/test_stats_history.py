@@ -0,0 +1,182 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+"""Tests for the stats history records and the get-stats-history resolver."""
+import datetime
+import json
+import random
+from typing import Any, Dict, List
+from unittest.mock import MagicMock
+
+import pytest
+
+from shared_lib.stats_history import apply_delta, downsample, encode_delta
+
+def make_snapshot(rng: random.Random, time: datetime.datetime, previous: Dict[str, Any]) -> Dict[str, Any]:
+    """Stats snapshot that drifts a little from the previous one."""
+    snapshot = json.loads(json.dumps(previous))
+    for name in ("countryDistribution", "disconnectDistribution", "groupDistribution"):
+        bucket = rng.choice(["US", "DE", "JP", "BR", "lab"])
+        snapshot[name][bucket] = max(0, snapshot[name].get(bucket, 0) + rng.randint(-3, 3))
+        if not snapshot[name][bucket]:
+            del snapshot[name][bucket]
+    firmware = snapshot["versionDistribution"]["Firmware"]
+    firmware[rng.choice(["1.0.0", "1.1.0"])] = rng.randint(1, 50)
+    snapshot["recordTime"] = time.isoformat()
+    snapshot["registeredDevices"] = rng.randint(90, 110)
+    snapshot["connectedDevices"] = rng.randint(40, 60)
+    snapshot["disconnectedDevices"] = snapshot["registeredDevices"] - snapshot["connectedDevices"]
+    return snapshot
+
+def initial_snapshot() -> Dict[str, Any]:
+    return {
+        "brandNameDistribution": {"Acme": 60, "Globex": 40},
+        "countryDistribution": {"US": 50, "DE": 50},
+        "productTypeDistribution": {"washer": 100},
+        "disconnectDistribution": {"Unknown": 3},
+        "groupDistribution": {},
+        "deviceTypeDistribution": {"gen1": 100},
+        "versionDistribution": {"Firmware": {}}
+    }
+
+class FakeHistoryTable:
+    def __init__(self):
+        self.items: List[Dict[str, Any]] = []
+    
+    def put_item(self, Item):
+        self.items.append(Item)
+    
+    def query(self, IndexName, KeyConditionExpression, ExclusiveStartKey=None):
+        low, high = KeyConditionExpression.get_expression()["values"][1].get_expression()["values"][1:]
+        matched = sorted(
+            (item for item in self.items if low <= item["recordTime"] <= high),
+            key=lambda item: item["recordTime"]
+        )
+        # Page through results like DynamoDB does
+        start = ExclusiveStartKey or 0
+        response = {"Items": matched[start:start + 100]}
+        if start + 100 < len(matched):
+            response["LastEvaluatedKey"] = start + 100
+        return response
+
+def test_delta_round_trip():
+    rng = random.Random(1)
+    previous = initial_snapshot()
+    for i in range(200):
+        current = make_snapshot(rng, datetime.datetime(2026, 1, 1) + datetime.timedelta(minutes=i), previous)
+        current_distributions = {key: value for key, value in current.items() if key.endswith("Distribution")}
+        previous_distributions = {key: value for key, value in previous.items() if key.endswith("Distribution")}
+        
+        delta = encode_delta(previous_distributions, current_distributions)
+        
+        assert apply_delta(previous_distributions, delta) == current_distributions
+        previous = current
+
+def test_downsample_keeps_ends():
+    points = list(range(1000))
+    
+    assert downsample(points, 10)[0] == 0
+    assert downsample(points, 10)[-1] == 999
+    assert len(downsample(points, 10)) == 10
+    assert downsample(points, 2000) == points
+
+@pytest.fixture
+def history(load_handler, monkeypatch):
+    monkeypatch.setenv("STATS_HISTORY_TABLE", "history")
+    monkeypatch.setenv("STATS_HISTORY_INDEX", "SeriesIndex")
+    table = FakeHistoryTable()
+    monitor = load_handler("device_stats_monitor")
+    monitor.STATS_HISTORY_TABLE = "history"
+    monitor.dynamodb = MagicMock()
+    monitor.dynamodb.Table.return_value = table
+    resolver = load_handler("get_stats_history")
+    resolver.dynamodb = MagicMock()
+    resolver.dynamodb.Table.return_value = table
+    return monitor, resolver, table
+
+def write_history(monitor, count: int, start: datetime.datetime, step: datetime.timedelta) -> List[Dict[str, Any]]:
+    rng = random.Random(2)
+    snapshots = []
+    previous = initial_snapshot()
+    for i in range(count):
+        snapshot = make_snapshot(rng, start + i * step, previous)
+        monitor.save_history_record(json.loads(json.dumps(snapshot)))
+        snapshots.append(snapshot)
+        previous = snapshot
+    return snapshots
+
+def test_range_query_decodes_snapshots(history):
+    monitor, resolver, table = history
+    snapshots = write_history(monitor, 600, datetime.datetime(2026, 3, 1, 20), datetime.timedelta(minutes=1))
+    
+    # Only the first record of each day carries full distributions
+    assert sum("distributions" in item for item in table.items) == 2
+    
+    points = resolver.get_stats_history("2026-03-01T22:00:00", "2026-03-02T02:00:00", 10000)
+    
+    expected = [snapshot for snapshot in snapshots if "2026-03-01T22:00:00" <= snapshot["recordTime"] <= "2026-03-02T02:00:00"]
+    assert [point["recordTime"] for point in points] == [snapshot["recordTime"] for snapshot in expected]
+    for point, snapshot in zip(points, expected):
+        for key, value in snapshot.items():
+            assert point[key] == value, key
+
+def test_resolver_downsamples_long_ranges(history):
+    monitor, resolver, table = history
+    write_history(monitor, 720, datetime.datetime(2026, 3, 1), datetime.timedelta(hours=1))
+    
+    response = resolver.handler({"arguments": {"start": "2026-03-01T00:00:00Z", "maxPoints": 50}}, MagicMock())
+    
+    assert len(response["data"]) == 50
+    assert response["data"][-1]["recordTime"] == "2026-03-30T23:00:00"
+
+def test_missing_base_waits_for_next_keyframe(history):
+    monitor, resolver, table = history
+    write_history(monitor, 30, datetime.datetime(2026, 3, 1, 23, 45), datetime.timedelta(minutes=1))
+    # Lose one delta record; its successors can't be decoded until the next day
+    table.items = [item for item in table.items if item["recordTime"] != "2026-03-01T23:50:00"]
+    
+    points = resolver.get_stats_history("2026-03-01T00:00:00", "2026-03-02T23:59:59", 1000)
+    
+    times = [point["recordTime"] for point in points]
+    assert times[-1] == "2026-03-02T00:14:00"
+    assert "2026-03-01T23:49:00" in times
+    assert not any("2026-03-01T23:50:00" <= time < "2026-03-02" for time in times)
+
+def test_interleaved_containers_decode_every_record(history, load_handler):
+    monitor, resolver, table = history
+    other = load_handler("device_stats_monitor")
+    other.STATS_HISTORY_TABLE = "history"
+    other.dynamodb = monitor.dynamodb
+    
+    rng = random.Random(3)
+    snapshots = []
+    previous = initial_snapshot()
+    for i in range(20):
+        snapshot = make_snapshot(rng, datetime.datetime(2026, 3, 1, 12) + i * datetime.timedelta(minutes=1), previous)
+        # Every fourth snapshot comes from a second container with its own chain
+        writer = other if i % 4 == 2 else monitor
+        writer.save_history_record(json.loads(json.dumps(snapshot)))
+        snapshots.append(snapshot)
+        previous = snapshot
+    
+    points = resolver.get_stats_history("2026-03-01T00:00:00", "2026-03-01T23:59:59", 1000)
+    
+    assert [point["recordTime"] for point in points] == [snapshot["recordTime"] for snapshot in snapshots]
+    for point, snapshot in zip(points, snapshots):
+        assert point["groupDistribution"] == snapshot["groupDistribution"]
@@ -69,6 +69,10 @@ const titleMapping: Record<string, string> = {
   'prod-devices': 'Devices'
 };
 
+// Points per series requested from the backend, which picks the period and
+// downsamples to fit; more than the chart can show only costs bandwidth
+const maxChartPoints = 500;
+
 export const CloudwatchChart: FunctionComponent<CloudwatchChartProps> = (
   props: CloudwatchChartProps
 ): ReactElement => {
@@ -93,7 +97,8 @@ export const CloudwatchChart: FunctionComponent<CloudwatchChartProps> = (
           query: GetCloudwatchMetricDataDocument,
           variables: {
             type: props.type,
-            period: 60 * 60,
+            period: null,
+            maxPoints: maxChartPoints,
             start: new Date(
               Date.now() - (props.days || 7) * 24 * 60 * 60 * 1000
             ).toISOString()